@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.db import models
-from django.db.models import Count, Avg, Max, Q
+from django.db.models import Count, Avg, Max, Q, Exists, F, Func, IntegerField, OuterRef
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 from django.urls import reverse
@@ -8,15 +8,163 @@ from django.http import HttpResponseRedirect
 from django.contrib import messages
 from django.utils import timezone
 from .models import (
-    APIKey, Dataset, Fact, Question, Link, SerpContent,
-    HtmlContent, HtmlContentUrl
+    APIKey, Dataset, DatasetRelease, Fact, Question, Link, SerpContent,
+    HtmlContent, HtmlContentUrl, Job
 )
+from .catalog import catalog
+from .coldstore import body
+from .counters import refresh_fact_counters
+from .jobs import enqueue
+from .paginators import EstimatedCountPaginator
+from .search import build_search_query
+from .serp_cache import serp_cache
+from .text import content_hash
 
 # Custom admin site configuration
 admin.site.site_header = "MockAPI Admin Dashboard"
 admin.site.site_title = "MockAPI Admin"
 admin.site.index_title = "Knowledge Graph Validation System"
 
+# List filters
+class InputFilter(admin.SimpleListFilter):
+    """Free-text exact-match filter, for columns with too many distinct
+    values to list (and too many rows to scan for them)"""
+    template = 'admin/input_filter.html'
+
+    def lookups(self, request, model_admin):
+        # A non-empty lookups() is required for the filter to be rendered
+        return (('', ''),)
+
+    def choices(self, changelist):
+        all_choice = next(super().choices(changelist))
+        all_choice['parameter_name'] = self.parameter_name
+        all_choice['value'] = self.value()
+        all_choice['query_parts'] = [
+            (name, value)
+            for name, values in changelist.filter_params.items()
+            if name != self.parameter_name
+            for value in values
+        ]
+        yield all_choice
+
+    def queryset(self, request, queryset):
+        value = (self.value() or '').strip()
+        if value:
+            return queryset.filter(**{self.parameter_name: value})
+        return queryset
+
+class DomainFilter(InputFilter):
+    title = 'domain'
+    parameter_name = 'domain'
+
+class LinkDomainFilter(InputFilter):
+    title = 'domain'
+    parameter_name = 'link__domain'
+
+class SiteNameFilter(InputFilter):
+    title = 'site name'
+    parameter_name = 'meta_site_name'
+
+class LanguageFilter(InputFilter):
+    title = 'language'
+    parameter_name = 'language'
+
+class RangeFilter(admin.SimpleListFilter):
+    """Filter on fixed numeric ranges instead of every distinct value"""
+    field_name = None
+    ranges = ()  # (label, low, high) with inclusive low and exclusive high, None for open
+
+    def lookups(self, request, model_admin):
+        return [(str(index), label) for index, (label, _, _) in enumerate(self.ranges)]
+
+    def queryset(self, request, queryset):
+        if self.value() is None:
+            return queryset
+        try:
+            _, low, high = self.ranges[int(self.value())]
+        except (ValueError, IndexError):
+            return queryset
+        if low is not None:
+            queryset = queryset.filter(**{f'{self.field_name}__gte': low})
+        if high is not None:
+            queryset = queryset.filter(**{f'{self.field_name}__lt': high})
+        return queryset
+
+class ScrapeCountFilter(RangeFilter):
+    title = 'scrape count'
+    parameter_name = 'scrape_count_range'
+    field_name = 'scrape_count'
+    ranges = (
+        ('Never', None, 1),
+        ('1 - 9', 1, 10),
+        ('10 - 99', 10, 100),
+        ('100+', 100, None),
+    )
+
+class RankFilter(RangeFilter):
+    title = 'rank'
+    parameter_name = 'rank_range'
+    field_name = 'rank'
+    ranges = (
+        ('Top 3', None, 3),
+        ('3 - 9', 3, 10),
+        ('10+', 10, None),
+    )
+
+class ScoreFilter(RangeFilter):
+    title = 'score'
+    parameter_name = 'score_range'
+    field_name = 'score'
+    ranges = (
+        ('Below 0.5', None, 0.5),
+        ('0.5 - 0.8', 0.5, 0.8),
+        ('0.8 and above', 0.8, None),
+    )
+
+def octet_length(field_name):
+    """Stored size of a text column, without fetching it into Python"""
+    return Func(F(field_name), function='octet_length', output_field=IntegerField())
+
+def format_size(size):
+    if size > 1024 * 1024:
+        return f"{size / (1024*1024):.1f} MB"
+    elif size > 1024:
+        return f"{size / 1024:.1f} KB"
+    else:
+        return f"{size} bytes"
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables with millions of rows.
+
+    Every changelist page runs a fixed number of queries: no full COUNT(*)
+    (the paginator estimates it), no facet counts, no date hierarchy and no
+    distinct-value filters. Columns listed in `changelist_defer` are left out
+    of the changelist query but still loaded on the change form.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    changelist_defer = ()
+
+    def is_changelist(self, request):
+        opts = self.model._meta
+        match = request.resolver_match
+        return bool(match) and match.url_name == f'{opts.app_label}_{opts.model_name}_changelist'
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if self.changelist_defer and self.is_changelist(request):
+            queryset = queryset.defer(*self.changelist_defer)
+        return queryset
+
+def message_job(model_admin, request, job):
+    """Tell the admin user where to follow a queued job"""
+    url = reverse('admin:api_job_change', args=[job.pk])
+    model_admin.message_user(request, format_html(
+        '{} queued as <a href="{}">job #{}</a>; run <code>manage.py run_jobs</code> if no worker is running.',
+        job.description, url, job.pk
+    ))
+
 # Inline classes
 class APIKeyInline(admin.TabularInline):
     model = APIKey
@@ -84,6 +232,10 @@ class APIKeyAdmin(admin.ModelAdmin):
         ('API Key Details', {
             'fields': ('key', 'is_active')
         }),
+        ('Rate Limits', {
+            'fields': ('rate_limit', 'burst_limit', 'max_in_flight'),
+            'description': 'Leave empty to use the server defaults.'
+        }),
         ('Usage Statistics', {
             'fields': ('usage_count', 'last_used'),
             'classes': ('collapse',)
@@ -141,10 +293,13 @@ class APIKeyAdmin(admin.ModelAdmin):
 
 @admin.register(Dataset)
 class DatasetAdmin(admin.ModelAdmin):
-    list_display = ['name', 'description_preview', 'facts_count', 'questions_count', 'is_active', 'created_at']
+    list_display = ['name', 'description_preview', 'facts_count', 'questions_count', 'fetchable_questions_count', 'serp_coverage', 'is_active', 'created_at']
     list_filter = ['is_active', 'created_at']
     search_fields = ['name', 'description']
-    readonly_fields = ['created_at', 'facts_count', 'questions_count']
+    readonly_fields = [
+        'created_at', 'facts_count', 'questions_count', 'fetchable_questions_count',
+        'html_contents_count', 'linked_urls_count', 'serp_urls_count', 'serp_coverage'
+    ]
     list_per_page = 25
     date_hierarchy = 'created_at'
 
@@ -153,7 +308,10 @@ class DatasetAdmin(admin.ModelAdmin):
             'fields': ('name', 'description', 'is_active')
         }),
         ('Statistics', {
-            'fields': ('facts_count', 'questions_count'),
+            'fields': (
+                'facts_count', 'questions_count', 'fetchable_questions_count',
+                'html_contents_count', 'linked_urls_count', 'serp_urls_count', 'serp_coverage'
+            ),
             'classes': ('collapse',)
         }),
         ('Timestamps', {
@@ -165,12 +323,6 @@ class DatasetAdmin(admin.ModelAdmin):
     inlines = [FactInline]
     actions = ['activate_datasets', 'deactivate_datasets']
 
-    def get_queryset(self, request):
-        return super().get_queryset(request).annotate(
-            facts_count=Count('facts'),
-            questions_count=Count('facts__questions')
-        )
-
     def description_preview(self, obj):
         """Show truncated description"""
         if obj.description:
@@ -178,34 +330,34 @@ class DatasetAdmin(admin.ModelAdmin):
         return "No description"
     description_preview.short_description = "Description"
 
-    def facts_count(self, obj):
-        """Show number of facts"""
-        return obj.facts_count
-    facts_count.short_description = "Facts"
-    facts_count.admin_order_field = 'facts_count'
-
-    def questions_count(self, obj):
-        """Show number of questions"""
-        return obj.questions_count
-    questions_count.short_description = "Questions"
-    questions_count.admin_order_field = 'questions_count'
+    def serp_coverage(self, obj):
+        """Show share of linked URLs with SERP content"""
+        if obj.serp_coverage is None:
+            return "No URLs"
+        return f"{obj.serp_coverage:.1%}"
+    serp_coverage.short_description = "SERP Coverage"
 
     def activate_datasets(self, request, queryset):
         updated = queryset.update(is_active=True)
+        catalog.invalidate()
         self.message_user(request, f'{updated} datasets activated.')
     activate_datasets.short_description = "Activate selected datasets"
 
     def deactivate_datasets(self, request, queryset):
         updated = queryset.update(is_active=False)
+        catalog.invalidate()
         self.message_user(request, f'{updated} datasets deactivated.')
     deactivate_datasets.short_description = "Deactivate selected datasets"
 
 @admin.register(Fact)
 class FactAdmin(admin.ModelAdmin):
-    list_display = ['dataset', 'fact_id', 'questions_count', 'fetchable_questions_count', 'avg_score', 'created_at']
+    list_display = ['dataset', 'fact_id', 'questions_count', 'fetchable_questions_count', 'avg_score', 'serp_coverage', 'created_at']
     list_filter = ['dataset', 'created_at']
     search_fields = ['fact_id', 'dataset__name']
-    readonly_fields = ['created_at', 'questions_count', 'fetchable_questions_count', 'avg_score']
+    readonly_fields = [
+        'created_at', 'questions_count', 'fetchable_questions_count', 'avg_score',
+        'html_contents_count', 'linked_urls_count', 'serp_urls_count', 'serp_coverage'
+    ]
     list_per_page = 50
     date_hierarchy = 'created_at'
 
@@ -214,7 +366,10 @@ class FactAdmin(admin.ModelAdmin):
             'fields': ('dataset', 'fact_id')
         }),
         ('Statistics', {
-            'fields': ('questions_count', 'fetchable_questions_count', 'avg_score'),
+            'fields': (
+                'questions_count', 'fetchable_questions_count', 'avg_score',
+                'html_contents_count', 'linked_urls_count', 'serp_urls_count', 'serp_coverage'
+            ),
             'classes': ('collapse',)
         }),
         ('Timestamps', {
@@ -227,21 +382,7 @@ class FactAdmin(admin.ModelAdmin):
     actions = ['export_facts']
 
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('dataset').annotate(
-            questions_count=Count('questions'),
-            fetchable_questions_count=Count('questions', filter=Q(questions__is_fetchable=True)),
-            avg_score=Avg('questions__score')
-        )
-
-    def questions_count(self, obj):
-        return obj.questions_count
-    questions_count.short_description = "Questions"
-    questions_count.admin_order_field = 'questions_count'
-
-    def fetchable_questions_count(self, obj):
-        return obj.fetchable_questions_count
-    fetchable_questions_count.short_description = "Fetchable"
-    fetchable_questions_count.admin_order_field = 'fetchable_questions_count'
+        return super().get_queryset(request).select_related('dataset')
 
     def avg_score(self, obj):
         if obj.avg_score:
@@ -250,18 +391,25 @@ class FactAdmin(admin.ModelAdmin):
     avg_score.short_description = "Avg Score"
     avg_score.admin_order_field = 'avg_score'
 
+    def serp_coverage(self, obj):
+        if obj.serp_coverage is None:
+            return "No URLs"
+        return f"{obj.serp_coverage:.1%}"
+    serp_coverage.short_description = "SERP Coverage"
+
     def export_facts(self, request, queryset):
-        # Implementation for exporting facts
-        self.message_user(request, f'Exported {queryset.count()} facts.')
-    export_facts.short_description = "Export selected facts"
+        job = enqueue('fact.export', queryset, user=request.user)
+        message_job(self, request, job)
+    export_facts.short_description = "Export selected facts (background job)"
 
 @admin.register(Question)
-class QuestionAdmin(admin.ModelAdmin):
+class QuestionAdmin(LargeTableAdmin):
     list_display = ['fact_dataset', 'fact_id', 'text_preview', 'score', 'is_fetchable', 'has_html_content']
-    list_filter = ['is_fetchable', 'fact__dataset', 'score']
+    list_filter = ['is_fetchable', 'fact__dataset', ScoreFilter]
     search_fields = ['text', 'fact__fact_id', 'fact__dataset__name']
     readonly_fields = ['fact_dataset', 'has_html_content']
     list_per_page = 50
+    autocomplete_fields = ['fact']
 
     fieldsets = (
         ('Question Information', {
@@ -276,7 +424,9 @@ class QuestionAdmin(admin.ModelAdmin):
     actions = ['mark_fetchable', 'mark_not_fetchable']
 
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('fact__dataset')
+        return super().get_queryset(request).select_related('fact__dataset').annotate(
+            has_html=Exists(HtmlContent.objects.filter(question=OuterRef('pk')))
+        )
 
     def fact_dataset(self, obj):
         return obj.fact.dataset.name
@@ -293,31 +443,32 @@ class QuestionAdmin(admin.ModelAdmin):
     text_preview.short_description = "Question Text"
 
     def has_html_content(self, obj):
-        try:
-            return bool(obj.html_content)
-        except HtmlContent.DoesNotExist:
-            return False
+        return obj.has_html
     has_html_content.short_description = "HTML Content"
     has_html_content.boolean = True
 
     def mark_fetchable(self, request, queryset):
+        fact_ids = set(queryset.values_list('fact_id', flat=True))
         updated = queryset.update(is_fetchable=True)
+        refresh_fact_counters(fact_ids)
         self.message_user(request, f'{updated} questions marked as fetchable.')
     mark_fetchable.short_description = "Mark as fetchable"
 
     def mark_not_fetchable(self, request, queryset):
+        fact_ids = set(queryset.values_list('fact_id', flat=True))
         updated = queryset.update(is_fetchable=False)
+        refresh_fact_counters(fact_ids)
         self.message_user(request, f'{updated} questions marked as not fetchable.')
     mark_not_fetchable.short_description = "Mark as not fetchable"
 
 @admin.register(Link)
-class LinkAdmin(admin.ModelAdmin):
+class LinkAdmin(LargeTableAdmin):
     list_display = ['domain', 'title_preview', 'url_preview', 'is_active', 'scrape_count', 'has_serp_content', 'last_scraped', 'created_at']
-    list_filter = ['is_active', 'domain', 'created_at', 'last_scraped']
+    list_filter = ['is_active', DomainFilter, ScrapeCountFilter, 'created_at', 'last_scraped']
     search_fields = ['url', 'title', 'domain', 'description']
     readonly_fields = ['domain', 'scrape_count', 'last_scraped', 'created_at', 'updated_at', 'has_serp_content']
     list_per_page = 50
-    date_hierarchy = 'created_at'
+    changelist_defer = ['description']
 
     fieldsets = (
         ('Link Information', {
@@ -341,7 +492,9 @@ class LinkAdmin(admin.ModelAdmin):
     actions = ['activate_links', 'deactivate_links', 'update_scrape_time']
 
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('serp_content')
+        return super().get_queryset(request).annotate(
+            has_serp=Exists(SerpContent.objects.filter(link=OuterRef('pk')))
+        )
 
     def title_preview(self, obj):
         if obj.title:
@@ -356,10 +509,7 @@ class LinkAdmin(admin.ModelAdmin):
     url_preview.short_description = "URL"
 
     def has_serp_content(self, obj):
-        try:
-            return bool(obj.serp_content)
-        except SerpContent.DoesNotExist:
-            return False
+        return obj.has_serp
     has_serp_content.short_description = "SERP Content"
     has_serp_content.boolean = True
 
@@ -370,29 +520,35 @@ class LinkAdmin(admin.ModelAdmin):
 
     def deactivate_links(self, request, queryset):
         updated = queryset.update(is_active=False)
+        serp_cache.invalidate()
         self.message_user(request, f'{updated} links deactivated.')
     deactivate_links.short_description = "Deactivate selected links"
 
     def update_scrape_time(self, request, queryset):
-        updated = queryset.update(last_scraped=timezone.now())
-        self.message_user(request, f'Updated scrape time for {updated} links.')
-    update_scrape_time.short_description = "Update scrape time"
+        job = enqueue('link.update_scrape_time', queryset, user=request.user, timestamp=timezone.now().isoformat())
+        message_job(self, request, job)
+    update_scrape_time.short_description = "Update scrape time (background job)"
 
 @admin.register(SerpContent)
-class SerpContentAdmin(admin.ModelAdmin):
+class SerpContentAdmin(LargeTableAdmin):
     list_display = ['title_preview', 'url_preview', 'language', 'meta_site_name', 'publish_date', 'word_count', 'scraped_at']
-    list_filter = ['language', 'meta_site_name', 'publish_date', 'scraped_at']
-    search_fields = ['title', 'url', 'text', 'summary', 'meta_description']
-    readonly_fields = ['scraped_at', 'created_at', 'updated_at', 'word_count', 'image_count']
+    list_filter = [LanguageFilter, SiteNameFilter, 'publish_date', 'scraped_at']
+    search_fields = ['=url']
+    search_help_text = "Full-text search over title, summary and text, or an exact URL"
+    readonly_fields = ['scraped_at', 'created_at', 'updated_at', 'word_count', 'text_chars', 'text_tokens', 'image_count']
     list_per_page = 50
-    date_hierarchy = 'scraped_at'
+    autocomplete_fields = ['link']
+    changelist_defer = [
+        'text', 'summary', 'search_vector', 'images', 'movies', 'keywords', 'tags',
+        'authors', 'meta_keywords', 'meta_description'
+    ]
 
     fieldsets = (
         ('Basic Information', {
             'fields': ('link', 'url', 'title', 'language', 'read_more_link')
         }),
         ('Content', {
-            'fields': ('text', 'summary', 'word_count')
+            'fields': ('text', 'summary', 'word_count', 'text_chars', 'text_tokens')
         }),
         ('Images', {
             'fields': ('top_image', 'meta_img', 'images', 'image_count'),
@@ -418,6 +574,22 @@ class SerpContentAdmin(admin.ModelAdmin):
 
     actions = ['update_scrape_time', 'clear_content']
 
+    def get_object(self, request, object_id, from_field=None):
+        # Text in the cold store is shown and, once saved, stored in the database again
+        obj = super().get_object(request, object_id, from_field)
+        if obj is not None:
+            obj.text = body(obj, 'text')
+        return obj
+
+    def get_search_results(self, request, queryset, search_term):
+        # Use the indexed search vector instead of icontains scans over text
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        return queryset.filter(
+            Q(search_vector=build_search_query(search_term)) | Q(url=search_term)
+        ), False
+
     def title_preview(self, obj):
         if obj.title:
             return obj.title[:60] + '...' if len(obj.title) > 60 else obj.title
@@ -431,10 +603,9 @@ class SerpContentAdmin(admin.ModelAdmin):
     url_preview.short_description = "URL"
 
     def word_count(self, obj):
-        if obj.text:
-            return len(obj.text.split())
-        return 0
+        return obj.text_words
     word_count.short_description = "Words"
+    word_count.admin_order_field = 'text_words'
 
     def image_count(self, obj):
         if obj.images:
@@ -444,21 +615,24 @@ class SerpContentAdmin(admin.ModelAdmin):
 
     def update_scrape_time(self, request, queryset):
         updated = queryset.update(scraped_at=timezone.now())
+        serp_cache.invalidate()
         self.message_user(request, f'Updated scrape time for {updated} content items.')
     update_scrape_time.short_description = "Update scrape time"
 
     def clear_content(self, request, queryset):
-        updated = queryset.update(text='', summary='')
-        self.message_user(request, f'Cleared content for {updated} items.')
-    clear_content.short_description = "Clear text content"
+        job = enqueue('serp_content.clear', queryset, user=request.user)
+        message_job(self, request, job)
+    clear_content.short_description = "Clear text content (background job)"
 
 @admin.register(HtmlContent)
-class HtmlContentAdmin(admin.ModelAdmin):
+class HtmlContentAdmin(LargeTableAdmin):
     list_display = ['question_preview', 'fact_info', 'dataset_name', 'urls_count', 'content_size']
     list_filter = ['question__fact__dataset', 'question__is_fetchable']
-    search_fields = ['question__text', 'question__fact__fact_id', 'content']
+    search_fields = ['question__text', 'question__fact__fact_id']
     readonly_fields = ['question_preview', 'fact_info', 'dataset_name', 'urls_count', 'content_size']
     list_per_page = 50
+    autocomplete_fields = ['question']
+    changelist_defer = ['content', 'structured']
 
     fieldsets = (
         ('Question Information', {
@@ -479,7 +653,17 @@ class HtmlContentAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         return super().get_queryset(request).select_related(
             'question__fact__dataset'
-        ).prefetch_related('urls')
+        ).annotate(
+            urls_total=Count('urls'),
+            content_bytes=octet_length('content')
+        )
+
+    def get_object(self, request, object_id, from_field=None):
+        # Content in the cold store is shown and, once saved, stored in the database again
+        obj = super().get_object(request, object_id, from_field)
+        if obj is not None:
+            obj.content = body(obj, 'content')
+        return obj
 
     def question_preview(self, obj):
         return obj.question.text[:100] + '...' if len(obj.question.text) > 100 else obj.question.text
@@ -494,30 +678,30 @@ class HtmlContentAdmin(admin.ModelAdmin):
     dataset_name.short_description = "Dataset"
 
     def urls_count(self, obj):
-        return obj.urls.count()
+        return obj.urls_total
     urls_count.short_description = "URLs"
+    urls_count.admin_order_field = 'urls_total'
 
     def content_size(self, obj):
-        if obj.content:
-            size = len(obj.content)
-            if size > 1024 * 1024:
-                return f"{size / (1024*1024):.1f} MB"
-            elif size > 1024:
-                return f"{size / 1024:.1f} KB"
-            else:
-                return f"{size} bytes"
+        if obj.cold_segment is not None:
+            return "In cold store"
+        if obj.content_bytes:
+            return format_size(obj.content_bytes)
         return "No content"
     content_size.short_description = "Content Size"
+    content_size.admin_order_field = 'content_bytes'
 
     def clear_html_content(self, request, queryset):
-        updated = queryset.update(content='')
+        updated = queryset.update(
+            content='', structured=None, cold_segment=None, cold_offset=None, content_hash=content_hash('')
+        )
         self.message_user(request, f'Cleared HTML content for {updated} items.')
     clear_html_content.short_description = "Clear HTML content"
 
 @admin.register(HtmlContentUrl)
-class HtmlContentUrlAdmin(admin.ModelAdmin):
+class HtmlContentUrlAdmin(LargeTableAdmin):
     list_display = ['html_content_preview', 'link_preview', 'rank', 'link_domain', 'link_active']
-    list_filter = ['rank', 'link__domain', 'link__is_active']
+    list_filter = [RankFilter, LinkDomainFilter, 'link__is_active']
     search_fields = ['html_content__question__text', 'link__url', 'link__title']
     readonly_fields = ['link_domain', 'link_active']
     list_per_page = 50
@@ -539,7 +723,7 @@ class HtmlContentUrlAdmin(admin.ModelAdmin):
         return super().get_queryset(request).select_related(
             'html_content__question',
             'link'
-        )
+        ).defer('html_content__content', 'html_content__structured', 'link__description')
 
     def html_content_preview(self, obj):
         return obj.html_content.question.text[:50] + '...' if len(obj.html_content.question.text) > 50 else obj.html_content.question.text
@@ -559,12 +743,89 @@ class HtmlContentUrlAdmin(admin.ModelAdmin):
     link_active.boolean = True
 
     def update_ranks(self, request, queryset):
-        # Implement logic to update ranks
-        self.message_user(request, f'Updated ranks for {queryset.count()} items.')
-    update_ranks.short_description = "Update ranks"
+        job = enqueue('html_content_url.update_ranks', queryset, user=request.user)
+        message_job(self, request, job)
+    update_ranks.short_description = "Renumber ranks of the selected URLs' pages (background job)"
 
     def activate_links(self, request, queryset):
         link_ids = queryset.values_list('link_id', flat=True)
         updated = Link.objects.filter(id__in=link_ids).update(is_active=True)
         self.message_user(request, f'Activated {updated} links.')
-    activate_links.short_description = "Activate associated links"
\ No newline at end of file
+    activate_links.short_description = "Activate associated links"
+
+@admin.register(DatasetRelease)
+class DatasetReleaseAdmin(admin.ModelAdmin):
+    list_display = ['dataset', 'version', 'facts_count', 'added_count', 'changed_count', 'removed_count', 'created_at']
+    list_filter = ['dataset']
+    readonly_fields = [
+        'dataset', 'version', 'digest', 'facts_count', 'added_count', 'changed_count', 'removed_count', 'created_at'
+    ]
+    list_per_page = 50
+
+    def has_add_permission(self, request):
+        # Releases are made by `manage.py release_dataset`
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('dataset').defer('manifest')
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'description', 'status', 'progress_display', 'attempts', 'created_by', 'created_at', 'finished_at']
+    list_filter = ['status', 'kind', 'created_at']
+    search_fields = ['description', 'kind']
+    readonly_fields = [
+        'kind', 'description', 'status', 'progress_display', 'progress', 'total', 'result',
+        'error', 'attempts', 'worker', 'created_by', 'created_at', 'started_at',
+        'heartbeat_at', 'finished_at'
+    ]
+    list_per_page = 50
+    date_hierarchy = 'created_at'
+
+    fieldsets = (
+        ('Job', {
+            'fields': ('kind', 'description', 'status', 'progress_display', 'result', 'error')
+        }),
+        ('Worker', {
+            'fields': ('worker', 'attempts', 'progress', 'total', 'heartbeat_at'),
+            'classes': ('collapse',)
+        }),
+        ('Timestamps', {
+            'fields': ('created_by', 'created_at', 'started_at', 'finished_at'),
+            'classes': ('collapse',)
+        })
+    )
+
+    actions = ['cancel_jobs', 'retry_jobs']
+
+    def has_add_permission(self, request):
+        # Jobs are queued by admin actions
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('created_by').defer('params', 'state')
+
+    def progress_display(self, obj):
+        if obj.percent is None:
+            return f"{obj.progress}"
+        return format_html(
+            '<progress value="{}" max="100" style="width: 8em;"></progress> {} / {} ({}%)',
+            f"{obj.percent:.0f}", obj.progress, obj.total, f"{obj.percent:.1f}"
+        )
+    progress_display.short_description = "Progress"
+
+    def cancel_jobs(self, request, queryset):
+        # Running jobs stop after their current chunk
+        updated = queryset.filter(status__in=[Job.PENDING, Job.RUNNING]).update(
+            status=Job.CANCELLED, finished_at=timezone.now()
+        )
+        self.message_user(request, f'{updated} jobs cancelled.')
+    cancel_jobs.short_description = "Cancel selected jobs"
+
+    def retry_jobs(self, request, queryset):
+        # Resumes from the last completed chunk
+        updated = queryset.filter(status__in=[Job.FAILED, Job.CANCELLED]).update(
+            status=Job.PENDING, error='', finished_at=None
+        )
+        self.message_user(request, f'{updated} jobs queued again.')
+    retry_jobs.short_description = "Retry selected jobs"
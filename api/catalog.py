@@ -0,0 +1,145 @@
+"""
+Per-worker catalog of dataset names and fact ids, so that the path
+parameters of fact-scoped endpoints resolve without a database query.
+
+Active datasets are held as a sorted array of names with a parallel array of
+ids, and each dataset's facts (loaded the first time one of them is asked
+for) as a sorted list of fact_ids with a parallel array of primary keys; both
+are searched with bisect. Resolved rows are returned as partial model
+instances (Model.from_db), whose other fields load on access.
+
+Saving or deleting a Dataset or Fact (api.signals), and the admin's dataset
+activation actions, bump a version counter in a small shared memory file,
+which every worker of the host checks on each lookup. Changes made on another host, or by bulk SQL, are picked up
+after CATALOG_TTL seconds at the latest. A fact_id missing from the catalog
+is looked up in the database before answering 404, so new facts are never
+hidden.
+"""
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.http import Http404
+
+from .models import Dataset, Fact
+
+_version = struct.Struct('<Q')
+
+
+class SharedVersion:
+    """A counter in a memory-mapped file shared by the workers of a host"""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else '/tmp', 'mockapi-catalog')
+        self._pid = None
+        self._map = None
+        self._lock = threading.Lock()
+
+    def _mapped(self):
+        # Opened lazily and re-opened after fork, like the rate limiter's file
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+                    try:
+                        if os.fstat(fd).st_size < _version.size:
+                            os.ftruncate(fd, _version.size)
+                        self._map = mmap.mmap(fd, _version.size)
+                    finally:
+                        os.close(fd)
+                    self._pid = os.getpid()
+        return self._map
+
+    def get(self):
+        return _version.unpack_from(self._mapped())[0]
+
+    def bump(self):
+        mapped = self._mapped()
+        with open(self.path, 'rb') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                _version.pack_into(mapped, 0, _version.unpack_from(mapped)[0] + 1)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class Catalog:
+    """Dataset and fact lookups of one worker, reloaded when the shared
+    version changes or after ttl seconds (default settings.CATALOG_TTL)"""
+
+    def __init__(self, version=None, ttl=None):
+        self.version = version or SharedVersion()
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._state = None
+
+    def _current(self):
+        """The loaded state, dropped when the version moved or it expired"""
+        version = self.version.get()
+        ttl = self.ttl if self.ttl is not None else settings.CATALOG_TTL
+        state = self._state
+        if state is None or state['version'] != version or time.monotonic() - state['loaded_at'] > ttl:
+            with self._lock:
+                state = self._state
+                if state is None or state['version'] != version or time.monotonic() - state['loaded_at'] > ttl:
+                    rows = sorted(Dataset.objects.filter(is_active=True).values_list('name', 'id'))
+                    state = self._state = {
+                        'version': version,
+                        'loaded_at': time.monotonic(),
+                        'names': [name for name, _ in rows],
+                        'ids': array('q', [dataset_id for _, dataset_id in rows]),
+                        'facts': {},
+                    }
+        return state
+
+    def dataset_id(self, name):
+        """Id of an active dataset, or None"""
+        state = self._current()
+        index = bisect_left(state['names'], name)
+        if index < len(state['names']) and state['names'][index] == name:
+            return state['ids'][index]
+        return None
+
+    def fact_pk(self, dataset_id, fact_id):
+        """Primary key of a fact of a dataset, or None"""
+        state = self._current()
+        facts = state['facts'].get(dataset_id)
+        if facts is None:
+            rows = sorted(Fact.objects.filter(dataset_id=dataset_id).values_list('fact_id', 'pk'))
+            facts = state['facts'][dataset_id] = (
+                [key for key, _ in rows], array('q', [pk for _, pk in rows])
+            )
+        keys, pks = facts
+        index = bisect_left(keys, fact_id)
+        if index < len(keys) and keys[index] == fact_id:
+            return pks[index]
+        # Possibly created since the facts were loaded
+        return Fact.objects.filter(dataset_id=dataset_id, fact_id=fact_id).values_list('pk', flat=True).first()
+
+    def get_dataset_or_404(self, name):
+        """The active dataset named name, with only id, name and is_active loaded"""
+        dataset_id = self.dataset_id(name)
+        if dataset_id is None:
+            raise Http404('No Dataset matches the given query.')
+        return Dataset.from_db(Dataset.objects.db, ['id', 'name', 'is_active'], [dataset_id, name, True])
+
+    def get_fact_or_404(self, dataset_name, fact_id):
+        """A fact of an active dataset, with only id, dataset_id and fact_id loaded"""
+        dataset_id = self.dataset_id(dataset_name)
+        pk = self.fact_pk(dataset_id, fact_id) if dataset_id is not None else None
+        if pk is None:
+            raise Http404('No Fact matches the given query.')
+        return Fact.from_db(Fact.objects.db, ['id', 'dataset_id', 'fact_id'], [pk, dataset_id, fact_id])
+
+    def invalidate(self):
+        """Make every worker of the host reload the catalog"""
+        self.version.bump()
+
+
+catalog = Catalog()
@@ -0,0 +1,305 @@
+"""
+Single-flight coalescing of identical concurrent read requests.
+
+Parallel benchmark workers often ask for the same question page or SERP
+document within milliseconds of each other. The read views run their lookup
+and rendering through `coalesce(key, render)`: the first request for a key
+renders the response, and requests for the same key that arrive while it
+runs wait for it and get a copy instead of repeating the queries. Only the
+rendering is shared: every request still checks its own API key and records
+its own usage and scrapes, from the link ids the rendering returns.
+
+Threads of a worker share the response in memory. With
+COALESCE_ACROSS_WORKERS, the workers of a host also coordinate through a
+table of slots in a memory-mapped file, like api.ratelimit's
+SharedMemoryBackend: the worker rendering a key holds the key's slot, and
+workers asking for the same key register as waiters and poll the slot.
+When waiters registered, the renderer leaves the response in a file next to
+the table before releasing the slot. A waiter that finds no response (the
+rendering failed or its worker died), or that waits longer than
+COALESCE_TIMEOUT, renders the response itself. Two keys hashing to the
+same slot are not coalesced across workers while both are in flight.
+"""
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.http import HttpResponse
+
+
+class SharedResponse:
+    """A rendered, non-streaming response (status, content type and body)
+    with JSON-serializable extra data such as the link ids served, rebuilt as
+    a new HttpResponse for every request that shares it"""
+
+    def __init__(self, response, **extra):
+        self.status_code = response.status_code
+        self.content_type = response['Content-Type']
+        self.content = response.content
+        self.extra = extra
+
+    def response(self):
+        return HttpResponse(self.content, status=self.status_code, content_type=self.content_type)
+
+    def dumps(self):
+        header = json.dumps({'status': self.status_code, 'content_type': self.content_type, 'extra': self.extra})
+        return header.encode('utf-8') + b'\n' + self.content
+
+    @classmethod
+    def loads(cls, data):
+        header, content = data.split(b'\n', 1)
+        header = json.loads(header)
+        response = HttpResponse(content, status=header['status'], content_type=header['content_type'])
+        return cls(response, **header['extra'])
+
+
+def request_key(request):
+    """Key of the requests whose responses are identical: the path and query
+    parameters, whatever their order, without the API key"""
+    params = sorted(
+        (name, value) for name, values in request.GET.lists() if name != 'api_key' for value in values
+    )
+    return json.dumps([request.method, request.path, params])
+
+
+class _Flight:
+    """A rendering in progress in this worker"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class SharedFlights:
+    """Slots of the keys being rendered by the workers of a host.
+
+    A slot holds the key hash, a generation number, the renderer's pid, when
+    it started and how many workers wait for it; the file is guarded by an
+    fcntl lock held for a few microseconds at a time. Responses for waiters
+    are left in `<key hash>-<generation>` files and removed after
+    2 * timeout.
+    """
+    slot = struct.Struct('<qqidi')  # key hash, generation, pid, started at, waiters
+    header = struct.Struct('<q')  # last generation
+
+    def __init__(self, path=None, slots=4096):
+        self.path = path or os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else '/tmp', 'mockapi-coalesce')
+        self.slots = slots
+        self._pid = None
+        self._map = None
+        self._fd = None
+        self._swept_at = 0.0
+        # fcntl locks are per process, so threads of one worker also need this
+        self._thread_lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        with self._thread_lock:
+            # Opened lazily and re-opened after fork, never shared across processes
+            if self._pid != os.getpid():
+                os.makedirs(self.path, mode=0o700, exist_ok=True)
+                size = self.header.size + self.slot.size * self.slots
+                self._fd = os.open(os.path.join(self.path, 'slots'), os.O_RDWR | os.O_CREAT, 0o600)
+                if os.fstat(self._fd).st_size < size:
+                    os.ftruncate(self._fd, size)
+                self._map = mmap.mmap(self._fd, size)
+                self._pid = os.getpid()
+
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                yield self._map
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+    def _offset(self, key_hash):
+        return self.header.size + (key_hash % self.slots) * self.slot.size
+
+    @staticmethod
+    def _alive(pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def join(self, key_hash, timeout):
+        """(renders, generation): whether the caller renders key_hash, or
+        waits for the rendering numbered generation (None: not coalesced)"""
+        now = time.time()
+        with self._locked() as table:
+            offset = self._offset(key_hash)
+            slot_key, generation, pid, started_at, waiters = self.slot.unpack_from(table, offset)
+            busy = slot_key and (now - started_at < timeout) and self._alive(pid)
+            if busy and slot_key == key_hash:
+                self.slot.pack_into(table, offset, slot_key, generation, pid, started_at, waiters + 1)
+                return False, generation
+            if busy:
+                # Another key holds the slot
+                return True, None
+            generation = self.header.unpack_from(table, 0)[0] + 1
+            self.header.pack_into(table, 0, generation)
+            self.slot.pack_into(table, offset, key_hash, generation, os.getpid(), now, 0)
+            return True, generation
+
+    def finish(self, key_hash, generation, result, timeout):
+        """Release the slot, first leaving result for the waiters if any"""
+        with self._locked() as table:
+            offset = self._offset(key_hash)
+            slot_key, slot_generation, _, _, waiters = self.slot.unpack_from(table, offset)
+            if (slot_key, slot_generation) != (key_hash, generation):
+                return
+            if waiters and result is not None:
+                path = self._result_path(key_hash, generation)
+                with open(f'{path}.tmp', 'wb') as f:
+                    f.write(result.dumps())
+                os.rename(f'{path}.tmp', path)
+            self.slot.pack_into(table, offset, 0, 0, 0, 0.0, 0)
+        if waiters:
+            self._sweep(timeout)
+
+    def wait(self, key_hash, generation, timeout):
+        """The response of the rendering numbered generation, or None when it
+        failed or took longer than timeout"""
+        deadline = time.monotonic() + timeout
+        delay = 0.001
+        while time.monotonic() < deadline:
+            time.sleep(delay)
+            delay = min(delay * 2, 0.005)
+            with self._locked() as table:
+                slot_key, slot_generation, pid, _, _ = self.slot.unpack_from(table, self._offset(key_hash))
+            if (slot_key, slot_generation) == (key_hash, generation) and self._alive(pid):
+                continue
+            try:
+                with open(self._result_path(key_hash, generation), 'rb') as f:
+                    return SharedResponse.loads(f.read())
+            except FileNotFoundError:
+                return None
+        return None
+
+    def _result_path(self, key_hash, generation):
+        return os.path.join(self.path, f'{key_hash & 0xffffffffffffffff:016x}-{generation}')
+
+    def _sweep(self, timeout):
+        """Remove the responses older than 2 * timeout, every timeout seconds"""
+        now = time.time()
+        if now - self._swept_at < timeout:
+            return
+        self._swept_at = now
+        for entry in os.scandir(self.path):
+            if entry.name != 'slots':
+                try:
+                    if now - entry.stat().st_mtime > 2 * timeout:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+
+class SingleFlight:
+    """Runs one rendering per key at a time and shares its response with the
+    requests for the same key that wait for it; counts how often"""
+    COUNTERS = ('requests', 'rendered', 'shared_in_worker', 'shared_across_workers', 'fallbacks')
+
+    def __init__(self, shared=None):
+        self.shared = shared or SharedFlights()
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.COUNTERS, 0)
+        self._waited = 0.0
+
+    def _count(self, counter, waited=0.0):
+        with self._lock:
+            self._counts[counter] += 1
+            self._waited += waited
+
+    def do(self, key, render):
+        """render() (an HttpResponse or SharedResponse) as a SharedResponse,
+        computed once for concurrent calls with the same key"""
+        timeout = settings.COALESCE_TIMEOUT
+        with self._lock:
+            self._counts['requests'] += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            started = time.monotonic()
+            if flight.done.wait(timeout) and flight.result is not None:
+                self._count('shared_in_worker', time.monotonic() - started)
+                return flight.result
+            # The rendering failed or is stuck: render without coalescing
+            self._count('fallbacks', time.monotonic() - started)
+            return self._render(render)
+
+        try:
+            flight.result = self._render_once(key, render, timeout)
+            return flight.result
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _render(self, render):
+        self._count('rendered')
+        result = render()
+        return result if isinstance(result, SharedResponse) else SharedResponse(result)
+
+    def _render_once(self, key, render, timeout):
+        """Render, or wait for another worker rendering the same key"""
+        if not settings.COALESCE_ACROSS_WORKERS:
+            return self._render(render)
+
+        # Zero marks a free slot
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+        key_hash = int.from_bytes(digest, 'little', signed=True) or 1
+        renders, generation = self.shared.join(key_hash, timeout)
+        if not renders:
+            started = time.monotonic()
+            result = self.shared.wait(key_hash, generation, timeout)
+            if result is not None:
+                self._count('shared_across_workers', time.monotonic() - started)
+                return result
+            self._count('fallbacks', time.monotonic() - started)
+            return self._render(render)
+
+        result = None
+        try:
+            result = self._render(render)
+            return result
+        finally:
+            if generation is not None:
+                self.shared.finish(key_hash, generation, result, timeout)
+
+    def stats(self):
+        """Counters since the worker started, with the share of requests
+        answered by another request's rendering"""
+        with self._lock:
+            counts = dict(self._counts)
+            waited = self._waited
+        shared = counts['shared_in_worker'] + counts['shared_across_workers']
+        return {
+            **counts,
+            'coalesced_rate': shared / counts['requests'] if counts['requests'] else None,
+            'waited_seconds': round(waited, 3),
+        }
+
+
+single_flight = SingleFlight()
+
+
+def coalesce(key, render):
+    """render() as a SharedResponse, shared with identical concurrent
+    requests (see the module docstring); call .response() for the response"""
+    if not settings.COALESCE_REQUESTS:
+        result = render()
+        return result if isinstance(result, SharedResponse) else SharedResponse(result)
+    return single_flight.do(key, render)
@@ -0,0 +1,156 @@
+"""
+Cold storage of document bodies (`SerpContent.text`, `HtmlContent.content`)
+in append-only segment files on local disk.
+
+`manage.py tier_documents` moves the bodies of rarely requested documents
+out of the database: each is appended to the current segment file under
+COLD_STORE_ROOT, and the row keeps the segment number and byte offset of the
+record (`cold_segment`, `cold_offset`) with its body column emptied (NULL
+text, empty content). Readers map the segment files into memory and decode
+the record at that offset. Saving the body through the model brings the
+document back into the database; the record it leaves behind is dead space
+in its segment.
+
+A record is a header (magic, table, row id, length and CRC-32 of the body)
+followed by the UTF-8 body. A segment is closed once it reaches
+COLD_SEGMENT_SIZE bytes. Segment files are never modified, so they can be
+copied or backed up while the API runs.
+"""
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+from django.conf import settings
+
+MAGIC = b'MKCB'
+RECORD = struct.Struct('<4sBqII')
+
+# Model label: (table code stored in records, body column)
+BODY_FIELDS = {
+    'api.serpcontent': (1, 'text'),
+    'api.htmlcontent': (2, 'content'),
+}
+COLD_COLUMNS = ('cold_segment', 'cold_offset')
+
+
+class ColdStoreError(Exception):
+    pass
+
+
+class SegmentStore:
+    """Segment files of a directory, appended to by one writer at a time
+    and read through per-process memory maps"""
+
+    def __init__(self, root=None, segment_size=None):
+        self._root = root
+        self._segment_size = segment_size
+        self._pid = None
+        self._maps = {}
+        self._lock = threading.Lock()
+
+    @property
+    def root(self):
+        return self._root or settings.COLD_STORE_ROOT
+
+    @property
+    def segment_size(self):
+        return self._segment_size or settings.COLD_SEGMENT_SIZE
+
+    def path(self, segment):
+        return os.path.join(self.root, f'segment-{segment:06d}.dat')
+
+    def segments(self):
+        """Numbers of the existing segments, in order"""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            int(name[8:14]) for name in os.listdir(self.root)
+            if name.startswith('segment-') and name.endswith('.dat')
+        )
+
+    def append(self, table, records):
+        """Append (row id, body) records of a table; returns their
+        (segment, offset), written to disk before returning"""
+        os.makedirs(self.root, exist_ok=True)
+        locations = []
+        with open(os.path.join(self.root, '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            segment = (self.segments() or [1])[-1]
+            f = open(self.path(segment), 'ab')
+            try:
+                for pk, body in records:
+                    offset = f.tell()
+                    if offset >= self.segment_size:
+                        f.flush()
+                        os.fsync(f.fileno())
+                        f.close()
+                        segment += 1
+                        f = open(self.path(segment), 'ab')
+                        offset = 0
+                    data = body.encode('utf-8')
+                    f.write(RECORD.pack(MAGIC, table, pk, len(data), zlib.crc32(data)))
+                    f.write(data)
+                    locations.append((segment, offset))
+                f.flush()
+                os.fsync(f.fileno())
+            finally:
+                f.close()
+        return locations
+
+    def _mapped(self, segment, end):
+        """Memory map of a segment covering at least end bytes"""
+        with self._lock:
+            if self._pid != os.getpid():
+                # Maps are not shared with forked workers
+                self._maps, self._pid = {}, os.getpid()
+            mapped = self._maps.get(segment)
+            if mapped is None or len(mapped) < end:
+                # The last segment grows while documents are moved
+                with open(self.path(segment), 'rb') as f:
+                    mapped = self._maps[segment] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return mapped
+
+    def read_bytes(self, segment, offset):
+        """UTF-8 body of the record at offset of segment"""
+        try:
+            mapped = self._mapped(segment, offset + RECORD.size)
+        except (FileNotFoundError, ValueError):
+            raise ColdStoreError(f'Segment {segment} is missing or empty')
+        magic, _, _, length, crc = RECORD.unpack_from(mapped, offset)
+        start = offset + RECORD.size
+        if magic != MAGIC:
+            raise ColdStoreError(f'No record at offset {offset} of segment {segment}')
+        if len(mapped) < start + length:
+            mapped = self._mapped(segment, start + length)
+        data = mapped[start:start + length]
+        if zlib.crc32(data) != crc:
+            raise ColdStoreError(f'Corrupt record at offset {offset} of segment {segment}')
+        return data
+
+    def read(self, segment, offset):
+        return self.read_bytes(segment, offset).decode('utf-8')
+
+
+cold_store = SegmentStore()
+
+
+def body(instance, field_name):
+    """The body of a SerpContent or HtmlContent, from the cold store when it
+    was moved there"""
+    if instance.cold_segment is not None:
+        return cold_store.read(instance.cold_segment, instance.cold_offset)
+    return getattr(instance, field_name)
+
+
+def thaw(instance, field_name):
+    """Before the body is saved: load it from the cold store unless it was
+    replaced, and forget its location. Returns whether the row was cold."""
+    if instance.cold_segment is None:
+        return False
+    if not getattr(instance, field_name):
+        setattr(instance, field_name, body(instance, field_name))
+    instance.cold_segment = instance.cold_offset = None
+    return True
@@ -0,0 +1,154 @@
+import threading
+from contextlib import contextmanager
+
+from django.db.models import Avg, Count, FloatField, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Dataset, Fact, Question, HtmlContent, HtmlContentUrl
+
+_local = threading.local()
+
+# Ids of changed rows resolved to their facts per query
+RESOLVE_BATCH_SIZE = 10000
+
+
+def _count(queryset, fact_path, distinct_field=None, output_field=IntegerField()):
+    """Correlated per-fact COUNT over a related table"""
+    total = Count(distinct_field, distinct=True) if distinct_field else Count('*')
+    rows = queryset.filter(**{fact_path: OuterRef('pk')}).order_by().values(fact_path)
+    return Coalesce(Subquery(rows.annotate(total=total).values('total'), output_field=output_field), 0)
+
+
+def _fact_sum(field):
+    """Correlated per-dataset SUM over a fact counter"""
+    rows = Fact.objects.filter(dataset=OuterRef('pk')).order_by().values('dataset')
+    return Coalesce(Subquery(rows.annotate(total=Sum(field)).values('total'), output_field=IntegerField()), 0)
+
+
+def refresh_fact_counters(fact_ids, refresh_datasets=True):
+    """Recompute the stored counters of the given facts (and their datasets)"""
+    fact_ids = list(fact_ids)
+    if not fact_ids:
+        return
+
+    scores = Question.objects.filter(fact=OuterRef('pk')).order_by().values('fact')
+    Fact.objects.filter(pk__in=fact_ids).update(
+        questions_count=_count(Question.objects.all(), 'fact'),
+        fetchable_questions_count=_count(Question.objects.filter(is_fetchable=True), 'fact'),
+        avg_score=Subquery(scores.annotate(avg=Avg('score')).values('avg'), output_field=FloatField()),
+        html_contents_count=_count(HtmlContent.objects.all(), 'question__fact'),
+        linked_urls_count=_count(
+            HtmlContentUrl.objects.all(), 'html_content__question__fact', 'link'
+        ),
+        serp_urls_count=_count(
+            HtmlContentUrl.objects.filter(link__serp_content__isnull=False),
+            'html_content__question__fact', 'link'
+        ),
+    )
+
+    if refresh_datasets:
+        dataset_ids = Fact.objects.filter(pk__in=fact_ids).values_list('dataset_id', flat=True).distinct()
+        refresh_dataset_counters(dataset_ids)
+
+
+def refresh_dataset_counters(dataset_ids):
+    """Recompute the stored counters of the given datasets from their facts"""
+    dataset_ids = list(dataset_ids)
+    if not dataset_ids:
+        return
+
+    Dataset.objects.filter(pk__in=dataset_ids).update(
+        facts_count=_count(Fact.objects.all(), 'dataset'),
+        questions_count=_fact_sum('questions_count'),
+        fetchable_questions_count=_fact_sum('fetchable_questions_count'),
+        html_contents_count=_fact_sum('html_contents_count'),
+        linked_urls_count=_fact_sum('linked_urls_count'),
+        serp_urls_count=_fact_sum('serp_urls_count'),
+    )
+
+
+def facts_changed(fact_ids):
+    """Refresh counters for changed facts, or queue them inside deferred_counters()"""
+    pending = getattr(_local, 'pending', None)
+    if pending is not None:
+        pending['facts'].update(fact_ids)
+    else:
+        refresh_fact_counters(fact_ids)
+
+
+def questions_changed(question_ids):
+    """Refresh counters for the facts of changed questions; inside
+    deferred_counters() the ids are only recorded and resolved on exit"""
+    pending = getattr(_local, 'pending', None)
+    if pending is not None:
+        pending['questions'].update(question_ids)
+    else:
+        refresh_fact_counters(_question_facts(question_ids))
+
+
+def html_contents_changed(html_content_ids):
+    """Refresh counters for the facts of changed HTML contents; inside
+    deferred_counters() the ids are only recorded and resolved on exit"""
+    pending = getattr(_local, 'pending', None)
+    if pending is not None:
+        pending['html_contents'].update(html_content_ids)
+    else:
+        refresh_fact_counters(_html_content_facts(html_content_ids))
+
+
+def _facts_of(queryset, fact_path, ids):
+    """Fact ids of the rows of queryset with the given ids, looked up
+    RESOLVE_BATCH_SIZE ids per query"""
+    ids = sorted(ids)
+    fact_ids = set()
+    for start in range(0, len(ids), RESOLVE_BATCH_SIZE):
+        fact_ids.update(
+            queryset.filter(pk__in=ids[start:start + RESOLVE_BATCH_SIZE]).order_by().values_list(
+                fact_path, flat=True
+            ).distinct()
+        )
+    return fact_ids
+
+
+def _question_facts(question_ids):
+    return _facts_of(Question.objects.all(), 'fact_id', question_ids)
+
+
+def _html_content_facts(html_content_ids):
+    return _facts_of(HtmlContent.objects.all(), 'question__fact_id', html_content_ids)
+
+
+def datasets_changed(dataset_ids):
+    """Refresh counters for changed datasets, or queue them inside deferred_counters()"""
+    pending = getattr(_local, 'pending', None)
+    if pending is not None:
+        pending['datasets'].update(dataset_ids)
+    else:
+        refresh_dataset_counters(dataset_ids)
+
+
+@contextmanager
+def deferred_counters():
+    """Collect counter refreshes triggered by model signals and run each one
+    once on exit, instead of once per saved row. Use around bulk ingest."""
+    if getattr(_local, 'pending', None) is not None:
+        # Nested use: the outermost block flushes
+        yield
+        return
+
+    _local.pending = pending = {'facts': set(), 'datasets': set(), 'questions': set(), 'html_contents': set()}
+    try:
+        yield
+    finally:
+        _local.pending = None
+
+    # Rows deleted in the block no longer resolve; their facts were
+    # recorded by the deletion of the row above them, or are gone too
+    pending['facts'].update(_question_facts(pending['questions']))
+    pending['facts'].update(_html_content_facts(pending['html_contents']))
+    refresh_fact_counters(pending['facts'], refresh_datasets=False)
+    dataset_ids = set(pending['datasets'])
+    dataset_ids.update(
+        Fact.objects.filter(pk__in=pending['facts']).values_list('dataset_id', flat=True).distinct()
+    )
+    refresh_dataset_counters(dataset_ids)
@@ -0,0 +1,151 @@
+"""
+Near-duplicate detection of SERP documents with MinHash and LSH.
+
+Each document's text is reduced to the set of its word 5-shingles and a
+signature of NUM_PERMUTATIONS minimum hash values, computed with numpy for
+all shingles at once. Documents whose signatures agree on every row of at
+least one LSH band become candidates; candidates whose signatures agree on
+at least DUPLICATE_THRESHOLD of the rows (the estimated Jaccard similarity
+of their shingle sets) are put in the same cluster. The database groups the
+documents by each band (see `cluster_duplicates`), so only the signatures
+of candidates are loaded, a batch at a time, and documents without
+near-duplicates never leave it.
+
+`manage.py cluster_duplicates` signs the documents that have no signature
+yet and recomputes the clusters; `collapse_duplicates` keeps the best-ranked
+member of each cluster in an evidence list.
+"""
+import zlib
+
+import numpy as np
+
+from .text import TOKEN_RE
+
+SHINGLE_WORDS = 5
+NUM_PERMUTATIONS = 128
+# 16 bands of 8 rows: pairs above ~0.7 similarity almost always share a band
+BANDS = 16
+BAND_BYTES = NUM_PERMUTATIONS // BANDS * 4
+DUPLICATE_THRESHOLD = 0.8
+# Shingles hashed per block, bounding memory to block x permutations values
+BLOCK_SIZE = 4096
+# Signature of a text without words: stored so that the document is not
+# signed again, never a member of a cluster
+EMPTY_SIGNATURE = b''
+# Candidate documents whose signatures are loaded at a time
+VERIFY_BATCH_SIZE = 10000
+SEED = 20240101
+
+_random = np.random.default_rng(SEED)
+# Multiply-shift hash functions h(x) = (a * x + b) >> 32 over 64-bit words
+_MULTIPLIERS = _random.integers(1, 2 ** 63, NUM_PERMUTATIONS, dtype=np.uint64) | np.uint64(1)
+_INCREMENTS = _random.integers(0, 2 ** 63, NUM_PERMUTATIONS, dtype=np.uint64)
+
+
+def shingle_hashes(text):
+    """Distinct 64-bit hashes of the word shingles of a text"""
+    tokens = TOKEN_RE.findall((text or '').lower())
+    if not tokens:
+        return np.empty(0, dtype=np.uint64)
+    words = np.fromiter((zlib.crc32(token.encode('utf-8')) for token in tokens), dtype=np.uint64, count=len(tokens))
+    width = min(SHINGLE_WORDS, len(words))
+    # Polynomial combination of each window of consecutive word hashes
+    hashes = np.zeros(len(words) - width + 1, dtype=np.uint64)
+    for offset in range(width):
+        hashes = hashes * np.uint64(1000003) + words[offset:len(words) - width + 1 + offset]
+    return np.unique(hashes)
+
+
+def signature(text):
+    """MinHash signature of a text as bytes (NUM_PERMUTATIONS uint32 values),
+    or EMPTY_SIGNATURE for a text without words"""
+    hashes = shingle_hashes(text)
+    if not len(hashes):
+        return EMPTY_SIGNATURE
+    minimum = np.full(NUM_PERMUTATIONS, np.iinfo(np.uint32).max, dtype=np.uint64)
+    for start in range(0, len(hashes), BLOCK_SIZE):
+        block = hashes[start:start + BLOCK_SIZE]
+        values = (_MULTIPLIERS[:, None] * block[None, :] + _INCREMENTS[:, None]) >> np.uint64(32)
+        np.minimum(minimum, values.min(axis=1), out=minimum)
+    return minimum.astype('<u4').tobytes()
+
+
+def signature_matrix(signatures):
+    """Stack signatures (bytes) into a documents x permutations array"""
+    return np.frombuffer(b''.join(signatures), dtype='<u4').reshape(len(signatures), NUM_PERMUTATIONS)
+
+
+def band_slice(band):
+    """(1-based offset, length) of an LSH band in a signature's bytes"""
+    return band * BAND_BYTES + 1, BAND_BYTES
+
+
+def _candidate_batches(buckets, batch_size):
+    """Buckets grouped into batches of about batch_size ids. A larger bucket
+    is split into parts that each start with its first member, which is the
+    one the others are compared with."""
+    batch, size = [], 0
+    for bucket in buckets:
+        first, others = bucket[0], bucket[1:]
+        for start in range(0, len(others), batch_size):
+            part = [first, *others[start:start + batch_size]]
+            batch.append(part)
+            size += len(part)
+            if size >= batch_size:
+                yield batch
+                batch, size = [], 0
+    if batch:
+        yield batch
+
+
+def find_clusters(buckets, load_signatures, batch_size=VERIFY_BATCH_SIZE):
+    """{id: cluster id} for the documents that have near-duplicates, given
+    the LSH buckets (lists of document ids in ascending order whose
+    signatures agree on a band) with more than one member. load_signatures
+    returns {id: signature} for a list of ids and is called for at most
+    about batch_size ids at a time. A cluster id is the smallest document id
+    of its cluster; documents left out are their own cluster."""
+    parent = {}
+
+    def root(node):
+        parent.setdefault(node, node)
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for batch in _candidate_batches(buckets, batch_size):
+        signatures = load_signatures(list({node for bucket in batch for node in bucket}))
+        for bucket in batch:
+            matrix = signature_matrix([signatures[node] for node in bucket])
+            # Verify candidates against the first member of the bucket
+            similarity = (matrix[1:] == matrix[0]).mean(axis=1)
+            for member, similar in zip(bucket[1:], similarity >= DUPLICATE_THRESHOLD):
+                if similar:
+                    first, other = root(bucket[0]), root(member)
+                    if other != first:
+                        parent[other] = first
+
+    cluster_ids = {}
+    for node in parent:
+        group = root(node)
+        cluster_ids[group] = min(cluster_ids.get(group, node), node)
+    return {node: cluster_ids[root(node)] for node in parent}
+
+
+def collapse_duplicates(items, cluster_of, url_of):
+    """Items (in rank order) without near-duplicates of an earlier item, each
+    with the URLs of the duplicates it stands for in 'duplicates'. Items
+    without a cluster (no SERP content or not clustered yet) are all kept."""
+    kept = []
+    by_cluster = {}
+    for item in items:
+        cluster = cluster_of(item)
+        if cluster is not None and cluster in by_cluster:
+            by_cluster[cluster]['duplicates'].append(url_of(item))
+            continue
+        entry = {'item': item, 'duplicates': []}
+        if cluster is not None:
+            by_cluster[cluster] = entry
+        kept.append(entry)
+    return [(entry['item'], entry['duplicates']) for entry in kept]
@@ -0,0 +1,143 @@
+from .coldstore import COLD_COLUMNS, body
+from .duplicates import collapse_duplicates
+from .models import HtmlContent, HtmlContentUrl, Question, SerpContent
+from .serp_parser import parse_serp
+
+LINK_FIELDS = ('link__url', 'link__domain', 'link__title', 'link__description')
+SERP_STAT_FIELDS = ('text_chars', 'text_words', 'text_tokens')
+
+
+def fetchable_questions(fact):
+    """Fetchable questions of a fact in rank order, as served by the question page"""
+    return list(
+        Question.objects.filter(fact=fact, dataset_id=fact.dataset_id, is_fetchable=True).order_by('-score').only(
+            'id', 'dataset_id', 'text', 'score', 'is_fetchable'
+        )
+    )
+
+
+def include_html_option(value):
+    """The include_html query parameter: True for the raw results page (the
+    default), 'structured' for the results extracted from it, False for none"""
+    value = (value or '1').lower()
+    if value == 'structured':
+        return 'structured'
+    return value not in ('0', 'false', 'no')
+
+
+def html_content_columns(include_html):
+    """HtmlContent columns needed to serve include_html"""
+    if include_html == 'structured':
+        return ['structured']
+    return ['content', *COLD_COLUMNS] if include_html else []
+
+
+def html_content_payload(html_content, include_html):
+    """The html_content object of a response"""
+    if include_html != 'structured':
+        return {'content': body(html_content, 'content')}
+    structured = html_content.structured
+    if structured is None:
+        # Stored before extraction existed and not backfilled yet
+        content = body(html_content, 'content')
+        structured = parse_serp(content) if content else None
+    return {'structured': structured}
+
+
+def serp_cluster(html_url):
+    """Near-duplicate cluster of a ranked link's SERP content, if any"""
+    try:
+        return html_url.link.serp_content.cluster_id
+    except SerpContent.DoesNotExist:
+        return None
+
+
+def build_evidence(questions, fields=None, include_html=True, collapse=False):
+    """Evidence bundles for (rank, question) pairs in a fixed number of queries.
+
+    HTML contents are loaded in one query (with only the column include_html
+    asks for, see include_html_option), and every ranked link with its SERP
+    content in a second one, reading only the requested SERP columns. With
+    collapse, near-duplicates of a better-ranked link are left out and listed
+    in its `duplicates`. Returns (bundles, ids of the links whose SERP
+    content is returned), whose scrapes the caller records.
+    """
+    question_ids = [question.id for _, question in questions]
+    # The partition keys of the questions' rows
+    dataset_ids = {question.dataset_id for _, question in questions}
+    selectable = SerpContent.SELECTABLE_FIELDS
+    selected_fields = [field for field in fields if field in selectable] if fields else list(selectable)
+
+    html_contents = HtmlContent.objects.filter(dataset_id__in=dataset_ids, question_id__in=question_ids)
+    html_contents = html_contents.only('id', 'question_id', *html_content_columns(include_html))
+    html_by_question = {html_content.question_id: html_content for html_content in html_contents}
+
+    html_content_urls = HtmlContentUrl.objects.filter(
+        dataset_id__in=dataset_ids,
+        html_content__in=[html_content.id for html_content in html_by_question.values()],
+        link__is_active=True
+    ).select_related('link', 'link__serp_content').only(
+        'id', 'html_content_id', 'rank', 'link_id', *LINK_FIELDS,
+        *(f'link__serp_content__{field}' for field in (*selected_fields, *SERP_STAT_FIELDS, 'cluster_id')),
+        # Where text moved to the cold store is read from
+        *(f'link__serp_content__{column}' for column in COLD_COLUMNS if 'text' in selected_fields)
+    ).order_by('html_content_id', 'rank', 'id')
+
+    urls_by_html_content = {}
+    for html_url in html_content_urls:
+        urls_by_html_content.setdefault(html_url.html_content_id, []).append(html_url)
+
+    served_link_ids = set()
+    bundles = []
+    for rank, question in questions:
+        html_content = html_by_question.get(question.id)
+        evidence = []
+        html_urls = urls_by_html_content.get(getattr(html_content, 'id', None), [])
+        if collapse:
+            html_urls = collapse_duplicates(html_urls, serp_cluster, lambda html_url: html_url.link.url)
+        else:
+            html_urls = [(html_url, None) for html_url in html_urls]
+        for html_url, duplicates in html_urls:
+            link = html_url.link
+            try:
+                serp_content = link.serp_content
+            except SerpContent.DoesNotExist:
+                serp_content = None
+            if serp_content is not None:
+                served_link_ids.add(link.id)
+
+            item = {
+                'url': link.url,
+                'domain': link.domain,
+                'title': link.title,
+                'description': link.description,
+                'rank': html_url.rank,
+                'has_serp_content': serp_content is not None,
+                'text_chars': serp_content.text_chars if serp_content else None,
+                'text_words': serp_content.text_words if serp_content else None,
+                'text_tokens': serp_content.text_tokens if serp_content else None,
+                # Unknown fields are ignored, as on the SERP content endpoints
+                'serp_content': (
+                    serp_content.get_selected_fields(selected_fields) if selected_fields else {}
+                ) if serp_content else None
+            }
+            if collapse:
+                item['duplicates'] = duplicates
+            evidence.append(item)
+
+        bundle = {
+            'question_rank': rank,
+            'question': {
+                'text': question.text,
+                'score': question.score,
+                'is_fetchable': question.is_fetchable
+            },
+            'has_html_content': html_content is not None,
+            'evidence': evidence,
+            'total_urls': len(evidence)
+        }
+        if include_html:
+            bundle['html_content'] = html_content_payload(html_content, include_html) if html_content else None
+        bundles.append(bundle)
+
+    return bundles, served_link_ids
@@ -0,0 +1,262 @@
+"""
+Background jobs: admin actions over large querysets and exports, queued as
+`Job` rows and run by `manage.py run_jobs`.
+
+A task processes the rows selected when the job was queued (the pickled
+queryset) `chunk_size` primary keys at a time. Each chunk commits together
+with the job's progress and resume point, so a job stopped or killed in the
+middle continues where it left off, and a job cancelled in the admin stops
+after the current chunk.
+"""
+import base64
+import json
+import os
+import pickle
+import socket
+import traceback
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Fact, HtmlContentUrl, Job, Link, PassageIndex, Question, SerpContent
+from .serp_cache import serp_cache
+
+TASKS = {}
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Task:
+    """A kind of job over the rows of `model`"""
+    model = None
+    chunk_size = 1000
+    description = ''
+
+    def process(self, job, pks):
+        """Handle one chunk of primary keys (in a transaction)"""
+        raise NotImplementedError
+
+    def finish(self, job):
+        """Result stored on the job once every chunk is done"""
+        return None
+
+
+def register(name):
+    def decorator(task_class):
+        TASKS[name] = task_class()
+        return task_class
+    return decorator
+
+
+def enqueue(kind, queryset, user=None, description='', **params):
+    """Queue a job over the rows of queryset"""
+    task = TASKS[kind]
+    if queryset.model is not task.model:
+        raise ValueError(f'{kind} runs over {task.model.__name__}, not {queryset.model.__name__}')
+    return Job.objects.create(
+        kind=kind,
+        description=description or task.description,
+        created_by=user if user is not None and user.is_authenticated else None,
+        params={**params, 'query': base64.b64encode(pickle.dumps(queryset.query)).decode('ascii')},
+    )
+
+
+def visible_jobs(user):
+    """Jobs the user may look up through the API: the ones they queued, or
+    every job for staff"""
+    jobs = Job.objects.all()
+    if not user.is_staff:
+        jobs = jobs.filter(created_by=user)
+    return jobs
+
+
+def job_queryset(job, task):
+    queryset = task.model._default_manager.all()
+    queryset.query = pickle.loads(base64.b64decode(job.params['query']))
+    return queryset
+
+
+def export_root():
+    return Path(settings.EXPORT_ROOT)
+
+
+def claim_job(worker, stale_after):
+    """Mark the oldest pending job (or a running job whose worker stopped
+    sending heartbeats) as running for this worker and return it"""
+    now = timezone.now()
+    with transaction.atomic():
+        job = Job.objects.select_for_update(skip_locked=True).filter(
+            Q(status=Job.PENDING) |
+            Q(status=Job.RUNNING, heartbeat_at__lt=now - timedelta(seconds=stale_after))
+        ).order_by('created_at', 'id').first()
+        if job is None:
+            return None
+        job.status = Job.RUNNING
+        job.worker = worker
+        job.attempts += 1
+        job.started_at = job.started_at or now
+        job.heartbeat_at = now
+        job.save(update_fields=['status', 'worker', 'attempts', 'started_at', 'heartbeat_at'])
+    return job
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def run_job(job, should_stop=lambda: False):
+    """Run a claimed job to the end, or until should_stop() returns True
+    between chunks (the job is then queued again)"""
+    task = TASKS.get(job.kind)
+    try:
+        if task is None:
+            raise ValueError(f'Unknown job kind: {job.kind}')
+        queryset = job_queryset(job, task)
+        if job.total is None:
+            job.total = queryset.count()
+            Job.objects.filter(pk=job.pk).update(total=job.total)
+
+        while True:
+            pks = queryset.order_by('pk')
+            if job.state.get('cursor') is not None:
+                pks = pks.filter(pk__gt=job.state['cursor'])
+            pks = list(pks.values_list('pk', flat=True)[:task.chunk_size])
+            if not pks:
+                break
+
+            with transaction.atomic():
+                task.process(job, pks)
+                job.state['cursor'] = pks[-1]
+                job.progress += len(pks)
+                updated = Job.objects.filter(pk=job.pk, status=Job.RUNNING).update(
+                    progress=job.progress, state=job.state, heartbeat_at=timezone.now()
+                )
+                if not updated:
+                    # Cancelled meanwhile: roll back this chunk
+                    raise JobCancelled
+
+            if should_stop():
+                Job.objects.filter(pk=job.pk, status=Job.RUNNING).update(status=Job.PENDING, worker='')
+                return Job.PENDING
+
+        result = task.finish(job)
+        Job.objects.filter(pk=job.pk, status=Job.RUNNING).update(
+            status=Job.SUCCEEDED, result=result, finished_at=timezone.now()
+        )
+        return Job.SUCCEEDED
+    except JobCancelled:
+        Job.objects.filter(pk=job.pk).update(finished_at=timezone.now())
+        return Job.CANCELLED
+    except Exception:
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.FAILED, error=traceback.format_exc(), finished_at=timezone.now()
+        )
+        return Job.FAILED
+
+
+@register('serp_content.clear')
+class ClearSerpContent(Task):
+    model = SerpContent
+    description = 'Clear SERP text content'
+
+    def process(self, job, pks):
+        SerpContent.objects.filter(pk__in=pks).update(
+            text='', summary='', text_chars=0, text_words=0, text_tokens=0, minhash=None, cluster_id=None,
+            cold_segment=None, cold_offset=None
+        )
+        contents = list(SerpContent.objects.filter(pk__in=pks))
+        for serp_content in contents:
+            serp_content.build_payload()
+        SerpContent.objects.bulk_update(contents, ['payload', 'content_hash'])
+        PassageIndex.objects.filter(serp_content_id__in=pks).delete()
+        transaction.on_commit(serp_cache.invalidate)
+
+
+@register('link.update_scrape_time')
+class UpdateLinkScrapeTime(Task):
+    model = Link
+    description = 'Update link scrape time'
+
+    def process(self, job, pks):
+        # The time the action was requested, not when each chunk runs
+        Link.objects.filter(pk__in=pks).update(last_scraped=parse_datetime(job.params['timestamp']))
+
+
+@register('html_content_url.update_ranks')
+class UpdateRanks(Task):
+    """Renumber the URLs of each affected HTML content 0, 1, 2, ... in their
+    current order, closing gaps and breaking ties by id"""
+    model = HtmlContentUrl
+    description = 'Update URL ranks'
+
+    def process(self, job, pks):
+        html_content_ids = set(
+            HtmlContentUrl.objects.filter(pk__in=pks).values_list('html_content_id', flat=True)
+        )
+        changed = []
+        current, rank = None, 0
+        for html_url in HtmlContentUrl.objects.filter(html_content_id__in=html_content_ids).order_by(
+            'html_content_id', 'rank', 'id'
+        ).only('id', 'html_content_id', 'rank'):
+            if html_url.html_content_id != current:
+                current, rank = html_url.html_content_id, 0
+            if html_url.rank != rank:
+                html_url.rank = rank
+                changed.append(html_url)
+            rank += 1
+        HtmlContentUrl.objects.bulk_update(changed, ['rank'], batch_size=1000)
+
+
+@register('fact.export')
+class ExportFacts(Task):
+    """JSON Lines file with one fact per line: its questions by score and the
+    ranked URLs of each question's SERP page"""
+    model = Fact
+    chunk_size = 500
+    description = 'Export facts'
+
+    def path(self, job):
+        return export_root() / f'job-{job.pk}-facts.jsonl'
+
+    def process(self, job, pks):
+        facts = list(Fact.objects.filter(pk__in=pks).order_by('pk').values_list('pk', 'dataset__name', 'fact_id'))
+        questions = {}
+        for question_id, fact_pk, text, score, is_fetchable in Question.objects.filter(
+            fact_id__in=pks
+        ).order_by('fact_id', '-score', 'id').values_list('id', 'fact_id', 'text', 'score', 'is_fetchable'):
+            questions.setdefault(fact_pk, []).append({
+                'id': question_id, 'text': text, 'score': score, 'is_fetchable': is_fetchable, 'urls': []
+            })
+        by_id = {question['id']: question for items in questions.values() for question in items}
+        for question_id, url, rank in HtmlContentUrl.objects.filter(
+            html_content__question__fact_id__in=pks
+        ).order_by('rank', 'id').values_list('html_content__question_id', 'link__url', 'rank'):
+            by_id[question_id]['urls'].append({'url': url, 'rank': rank})
+
+        path = self.path(job)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'ab') as f:
+            # Drop anything written by an attempt whose chunk never committed
+            f.truncate(job.state.get('offset', 0))
+            for fact_pk, dataset_name, fact_id in facts:
+                items = questions.get(fact_pk, [])
+                for question in items:
+                    del question['id']
+                line = {'dataset': dataset_name, 'fact_id': fact_id, 'questions': items}
+                f.write(json.dumps(line, ensure_ascii=False).encode('utf-8') + b'\n')
+            job.state['offset'] = f.tell()
+            job.state['rows'] = job.state.get('rows', 0) + len(facts)
+
+    def finish(self, job):
+        path = self.path(job)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.touch()
+        return {'file': path.name, 'rows': job.state.get('rows', 0), 'bytes': path.stat().st_size}
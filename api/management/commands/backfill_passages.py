@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, Max, Min, OuterRef, Q
+
+from api.coldstore import COLD_COLUMNS, cold_store
+from api.models import PassageIndex, SerpContent
+from api.text import PASSAGE_INDEX_VERSION, passage_index
+
+
+class Command(BaseCommand):
+    help = 'Build the passage indexes used to rank passages of SERP content ingested before they existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of ids loaded and indexed per batch'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Rebuild every index, not only missing or outdated ones'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        bounds = SerpContent.objects.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            self.stdout.write('No SERP content found.')
+            return
+
+        current = PassageIndex.objects.filter(serp_content=OuterRef('pk'), version=PASSAGE_INDEX_VERSION)
+        updated = 0
+        for start in range(bounds['low'], bounds['high'] + 1, batch_size):
+            queryset = SerpContent.objects.filter(id__gte=start, id__lt=start + batch_size)
+            if not options['all']:
+                queryset = queryset.filter(~Exists(current)).exclude(
+                    Q(text__isnull=True, cold_segment__isnull=True) | Q(text='')
+                )
+
+            indexes = []
+            for serp_content_id, text, segment, offset in queryset.values_list('id', 'text', *COLD_COLUMNS):
+                if segment is not None:
+                    text = cold_store.read(segment, offset)
+                passages, postings = passage_index(text)
+                indexes.append(PassageIndex(
+                    serp_content_id=serp_content_id, version=PASSAGE_INDEX_VERSION,
+                    passages=passages, postings=postings
+                ))
+            PassageIndex.objects.bulk_create(
+                indexes, update_conflicts=True, unique_fields=['serp_content'],
+                update_fields=['version', 'passages', 'postings']
+            )
+
+            updated += len(indexes)
+            self.stdout.write(f'Processed up to id {start + batch_size - 1} ({updated} rows indexed)')
+
+        self.stdout.write(self.style.SUCCESS(f'Passage indexes built for {updated} rows'))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+
+from api.models import SerpContent
+
+
+class Command(BaseCommand):
+    help = 'Build the stored JSON payloads of SERP content ingested before they existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of ids loaded and encoded per batch'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Rebuild every payload, not only missing ones'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        bounds = SerpContent.objects.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            self.stdout.write('No SERP content found.')
+            return
+
+        updated = 0
+        for start in range(bounds['low'], bounds['high'] + 1, batch_size):
+            # Documents in the cold store have no payload
+            queryset = SerpContent.objects.filter(id__gte=start, id__lt=start + batch_size, cold_segment__isnull=True)
+            if not options['all']:
+                queryset = queryset.filter(payload__isnull=True)
+
+            contents = list(queryset.only('id', *SerpContent.SELECTABLE_FIELDS))
+            for serp_content in contents:
+                serp_content.build_payload()
+            SerpContent.objects.bulk_update(contents, ['payload', 'content_hash'])
+
+            updated += len(contents)
+            self.stdout.write(f'Processed up to id {start + batch_size - 1} ({updated} rows encoded)')
+
+        self.stdout.write(self.style.SUCCESS(f'Payloads built for {updated} rows'))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min, Q
+
+from api.coldstore import COLD_COLUMNS, body
+from api.models import HtmlContent
+from api.serp_parser import PARSER_VERSION
+
+
+class Command(BaseCommand):
+    help = 'Extract structured results (organic results, featured snippet, knowledge panel) from stored SERP pages'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Number of ids loaded and updated per batch'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Re-extract every page, not only pages without results from the current parser version'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        bounds = HtmlContent.objects.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            self.stdout.write('No HTML content found.')
+            return
+
+        updated = 0
+        for start in range(bounds['low'], bounds['high'] + 1, batch_size):
+            queryset = HtmlContent.objects.filter(id__gte=start, id__lt=start + batch_size)
+            if not options['all']:
+                # Pages stored before extraction existed or by an older parser
+                queryset = queryset.filter(
+                    Q(structured__isnull=True) | Q(structured__version__lt=PARSER_VERSION)
+                ).exclude(content='', cold_segment__isnull=True)
+
+            contents = list(queryset.only('id', 'content', *COLD_COLUMNS))
+            for content in contents:
+                content.content = body(content, 'content')
+                content.update_structured()
+            HtmlContent.objects.bulk_update(contents, ['structured'])
+
+            updated += len(contents)
+            self.stdout.write(f'Processed up to id {start + batch_size - 1} ({updated} rows updated)')
+
+        self.stdout.write(self.style.SUCCESS(f'Structured results extracted for {updated} pages'))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min, Q
+
+from api.coldstore import COLD_COLUMNS, body
+from api.models import SerpContent
+
+
+class Command(BaseCommand):
+    help = 'Compute stored character, word and token counts for existing SERP content'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Number of ids loaded and updated per batch'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Recompute every row, not only rows without statistics'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        bounds = SerpContent.objects.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            self.stdout.write('No SERP content found.')
+            return
+
+        updated = 0
+        for start in range(bounds['low'], bounds['high'] + 1, batch_size):
+            queryset = SerpContent.objects.filter(id__gte=start, id__lt=start + batch_size)
+            if not options['all']:
+                # Rows that have text but were stored before statistics existed
+                queryset = queryset.filter(text_chars=0).exclude(
+                    Q(text__isnull=True, cold_segment__isnull=True) | Q(text='')
+                )
+
+            contents = list(queryset.only('id', 'text', *COLD_COLUMNS))
+            for content in contents:
+                content.text = body(content, 'text')
+                content.update_text_stats()
+            SerpContent.objects.bulk_update(contents, ['text_chars', 'text_words', 'text_tokens'])
+
+            updated += len(contents)
+            self.stdout.write(f'Processed up to id {start + batch_size - 1} ({updated} rows updated)')
+
+        self.stdout.write(self.style.SUCCESS(f'Text statistics updated for {updated} rows'))
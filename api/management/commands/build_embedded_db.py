@@ -0,0 +1,210 @@
+import os
+
+from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import PostgresIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.recorder import MigrationRecorder
+
+from api.coldstore import BODY_FIELDS, cold_store
+from api.models import (
+    APIKey, Dataset, DatasetRelease, Fact, Question, Link, SerpContent, PassageIndex,
+    HtmlContent, HtmlContentUrl, Job
+)
+from api.search import FTS_TABLE
+
+ALIAS = 'embedded'
+# Parents before children, so foreign keys always point at copied rows.
+# Jobs are not copied; the empty table keeps the job endpoints answering 404
+MODELS = [
+    User, APIKey, Dataset, DatasetRelease, Fact, Question, Link, SerpContent, PassageIndex, HtmlContent,
+    HtmlContentUrl, Job
+]
+
+
+class Command(BaseCommand):
+    help = 'Build a single-file SQLite database serving the read-only API (see mockapi.settings_embedded)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Path of the SQLite file to write')
+        parser.add_argument(
+            '--dataset',
+            action='append',
+            help='Only include this dataset and the links it references (can be repeated)'
+        )
+        parser.add_argument(
+            '--local-key',
+            help='API key to create for local use (default: a random key, printed at the end)'
+        )
+        parser.add_argument(
+            '--with-api-keys',
+            action='store_true',
+            help='Also copy all active API keys (without user passwords or emails)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Rows inserted per statement batch'
+        )
+
+    def handle(self, *args, **options):
+        output = os.path.abspath(options['output'])
+        staging = f'{output}.tmp'
+        if os.path.exists(staging):
+            os.remove(staging)
+
+        datasets = Dataset.objects.filter(is_active=True)
+        if options['dataset']:
+            datasets = datasets.filter(name__in=options['dataset'])
+            missing = set(options['dataset']) - set(datasets.values_list('name', flat=True))
+            if missing:
+                raise CommandError(f'Unknown datasets: {", ".join(sorted(missing))}')
+
+        connections.settings[ALIAS] = connections.configure_settings({
+            'default': {},
+            ALIAS: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': staging},
+        })[ALIAS]
+        target = connections[ALIAS]
+        self.batch_size = options['batch_size']
+
+        try:
+            self.create_schema(target)
+            with transaction.atomic(using=ALIAS):
+                for model, queryset in self.sources(datasets, options):
+                    copied = self.copy(queryset, model, target)
+                    self.stdout.write(f'{model._meta.db_table}: {copied} rows')
+                local_key = self.create_local_key(options['local_key'])
+                self.build_search_index(target)
+                self.record_migrations(target)
+
+            with target.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            with target.cursor() as cursor:
+                cursor.execute('VACUUM')
+        except BaseException:
+            target.close()
+            if os.path.exists(staging):
+                os.remove(staging)
+            raise
+        target.close()
+        os.replace(staging, output)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Embedded database written to {output} ({os.path.getsize(output) / 1024 / 1024:.1f} MB)\n'
+            f'Local API key: {local_key}\n'
+            f'Serve it with: DJANGO_SETTINGS_MODULE=mockapi.settings_embedded EMBEDDED_DB={output} '
+            f'python manage.py runserver'
+        ))
+
+    def create_schema(self, target):
+        """Tables and indexes of the copied models, minus the Postgres-only
+        ones (the full-text GIN index is replaced by an FTS5 table)"""
+        postgres_indexes = [
+            index.name for model in MODELS for index in model._meta.indexes
+            if isinstance(index, PostgresIndex)
+        ]
+        with target.schema_editor() as editor:
+            for model in MODELS:
+                editor.create_model(model)
+            editor.deferred_sql = [
+                sql for sql in editor.deferred_sql
+                if not any(name in str(sql) for name in postgres_indexes)
+            ]
+        MigrationRecorder(target).ensure_schema()
+
+    def sources(self, datasets, options):
+        """(model, queryset of rows to copy) in insertion order"""
+        if options['with_api_keys']:
+            api_keys = APIKey.objects.filter(is_active=True)
+            yield User, User.objects.filter(id__in=api_keys.values('user_id'))
+            yield APIKey, api_keys
+
+        html_content_urls = HtmlContentUrl.objects.filter(dataset__in=datasets)
+        links = Link.objects.all()
+        serp_contents = SerpContent.objects.all()
+        if options['dataset']:
+            links = links.filter(id__in=html_content_urls.values('link_id'))
+            serp_contents = serp_contents.filter(link_id__in=html_content_urls.values('link_id'))
+
+        yield Dataset, datasets
+        yield DatasetRelease, DatasetRelease.objects.filter(dataset__in=datasets)
+        yield Fact, Fact.objects.filter(dataset__in=datasets)
+        yield Question, Question.objects.filter(dataset__in=datasets)
+        yield Link, links
+        yield SerpContent, serp_contents
+        yield PassageIndex, PassageIndex.objects.filter(serp_content__in=serp_contents)
+        yield HtmlContent, HtmlContent.objects.filter(dataset__in=datasets)
+        yield HtmlContentUrl, html_content_urls
+
+    def copy(self, queryset, model, target):
+        fields = [
+            field for field in model._meta.concrete_fields
+            if not isinstance(field, SearchVectorField)
+        ]
+        overrides = {}
+        if model is User:
+            # Only usernames are needed to own API keys
+            overrides = {'password': '!', 'email': '', 'is_staff': False, 'is_superuser': False}
+
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            target.ops.quote_name(model._meta.db_table),
+            ', '.join(target.ops.quote_name(field.column) for field in fields),
+            ', '.join(['%s'] * len(fields))
+        )
+        columns = [field.attname for field in fields]
+        rows = queryset.order_by('pk').values_list(*columns)
+        # Bodies moved to the cold store are copied into the file
+        body_field = BODY_FIELDS.get(model._meta.label_lower, (None, None))[1]
+
+        copied = 0
+        batch = []
+        with target.cursor() as cursor:
+            for row in rows.iterator(chunk_size=self.batch_size):
+                if body_field is not None:
+                    row = self.thaw(row, columns, body_field)
+                batch.append([
+                    field.get_db_prep_save(overrides.get(field.attname, value), target)
+                    for field, value in zip(fields, row)
+                ])
+                if len(batch) >= self.batch_size:
+                    cursor.executemany(sql, batch)
+                    copied += len(batch)
+                    batch = []
+            if batch:
+                cursor.executemany(sql, batch)
+                copied += len(batch)
+        return copied
+
+    def thaw(self, row, columns, body_field):
+        values = dict(zip(columns, row))
+        if values['cold_segment'] is not None:
+            values[body_field] = cold_store.read(values['cold_segment'], values['cold_offset'])
+            values['cold_segment'] = values['cold_offset'] = None
+        return [values[column] for column in columns]
+
+    def create_local_key(self, key):
+        user, _ = User.objects.db_manager(ALIAS).get_or_create(username='embedded', defaults={'password': '!'})
+        api_key = APIKey(user=user, name='Embedded', key=key or '')
+        api_key.save(using=ALIAS)
+        return api_key.key
+
+    def build_search_index(self, target):
+        """FTS5 index over SERP content for api_search on SQLite, stemmed
+        like the English Postgres configuration"""
+        with target.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                f"title, summary, text, content='api_serpcontent', content_rowid='id', "
+                f"tokenize='porter unicode61')"
+            )
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+    def record_migrations(self, target):
+        # Mark the schema as current so the embedded profile does not warn
+        # about unapplied migrations on a file that can never be migrated
+        recorder = MigrationRecorder(target)
+        for app_label, name in MigrationLoader(None, ignore_no_migrations=True).graph.nodes:
+            recorder.record_applied(app_label, name)
@@ -0,0 +1,112 @@
+import time
+
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.core.management.base import BaseCommand
+from django.db.models import BinaryField, Count, Max, Min, Q
+from django.db.models.functions import Substr
+
+from api.coldstore import COLD_COLUMNS, body
+from api.duplicates import BANDS, EMPTY_SIGNATURE, band_slice, find_clusters, signature
+from api.models import SerpContent
+
+
+def signed_contents():
+    """SERP content with a signature of a text with words"""
+    return SerpContent.objects.filter(minhash__isnull=False).exclude(minhash=EMPTY_SIGNATURE)
+
+
+def band_buckets():
+    """Ids (ascending) of the documents sharing each band of their signature,
+    for bands shared by more than one document; grouped by the database"""
+    for band in range(BANDS):
+        offset, length = band_slice(band)
+        yield from signed_contents().annotate(
+            band_key=Substr('minhash', offset, length, output_field=BinaryField())
+        ).values('band_key').annotate(
+            ids=ArrayAgg('id', ordering='id'), size=Count('id')
+        ).filter(size__gt=1).values_list('ids', flat=True).iterator(chunk_size=1000)
+
+
+def load_signatures(ids):
+    return {
+        serp_content_id: bytes(minhash)
+        for serp_content_id, minhash in SerpContent.objects.filter(id__in=ids).values_list('id', 'minhash')
+    }
+
+
+class Command(BaseCommand):
+    help = 'Compute MinHash signatures of SERP content text and group near-duplicate documents into clusters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of ids loaded and signed per batch'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Recompute every signature, not only those of new or changed documents'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        signed = self.sign(options['batch_size'], options['all'])
+        self.stdout.write(f'Signed {signed} documents in {time.monotonic() - started:.1f}s')
+
+        started = time.monotonic()
+        # Only documents with near-duplicates are held in memory
+        clusters = find_clusters(band_buckets(), load_signatures)
+
+        # Other documents are their own cluster; only rows whose cluster
+        # changed are written
+        documents = updated = 0
+        changed = []
+        for serp_content_id, cluster_id in signed_contents().order_by('id').values_list(
+            'id', 'cluster_id'
+        ).iterator(chunk_size=10000):
+            documents += 1
+            expected = clusters.get(serp_content_id, serp_content_id)
+            if cluster_id != expected:
+                changed.append(SerpContent(id=serp_content_id, cluster_id=expected))
+            if len(changed) >= 1000:
+                updated += SerpContent.objects.bulk_update(changed, ['cluster_id'])
+                changed = []
+        updated += SerpContent.objects.bulk_update(changed, ['cluster_id'])
+        # Documents without words or a signature belong to no cluster
+        SerpContent.objects.filter(
+            Q(minhash__isnull=True) | Q(minhash=EMPTY_SIGNATURE), cluster_id__isnull=False
+        ).update(cluster_id=None)
+
+        sizes = {}
+        for cluster_id in clusters.values():
+            sizes[cluster_id] = sizes.get(cluster_id, 0) + 1
+        self.stdout.write(self.style.SUCCESS(
+            f'{documents} documents in {documents - len(clusters) + len(sizes)} clusters: {len(sizes)} clusters '
+            f'of near-duplicates covering {len(clusters)} documents ({updated} rows updated, '
+            f'{time.monotonic() - started:.1f}s)'
+        ))
+
+    def sign(self, batch_size, recompute):
+        bounds = SerpContent.objects.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            return 0
+
+        signed = 0
+        for start in range(bounds['low'], bounds['high'] + 1, batch_size):
+            queryset = SerpContent.objects.filter(id__gte=start, id__lt=start + batch_size)
+            if not recompute:
+                queryset = queryset.filter(minhash__isnull=True).exclude(
+                    Q(text__isnull=True, cold_segment__isnull=True) | Q(text='')
+                )
+
+            contents = list(queryset.only('id', 'text', *COLD_COLUMNS))
+            for content in contents:
+                content.minhash = signature(body(content, 'text'))
+            SerpContent.objects.bulk_update(contents, ['minhash'])
+
+            signed += len(contents)
+            if contents:
+                self.stdout.write(f'Processed up to id {start + batch_size - 1} ({signed} documents signed)')
+        return signed
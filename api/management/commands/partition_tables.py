@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import Dataset
+from api.partitions import (
+    PARTITIONED_MODELS, add_partitions, is_partitioned, is_supported, partition_table, partitions
+)
+
+
+class Command(BaseCommand):
+    help = 'Partition the question and HTML content tables by dataset, or add partitions for new datasets'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--status',
+            action='store_true',
+            help='Only list the partitions of each table with their estimated rows'
+        )
+
+    def handle(self, *args, **options):
+        if not is_supported():
+            raise CommandError('Partitioning requires PostgreSQL')
+
+        if options['status']:
+            for model in PARTITIONED_MODELS:
+                self.show(model)
+            return
+
+        dataset_ids = list(Dataset.objects.order_by('pk').values_list('pk', flat=True))
+        for model in PARTITIONED_MODELS:
+            table = model._meta.db_table
+            if is_partitioned(model):
+                created = add_partitions(model, dataset_ids)
+                self.stdout.write(f'{table}: {len(created)} partitions added')
+                continue
+
+            dropped = partition_table(model, dataset_ids)
+            self.stdout.write(f'{table}: partitioned into {len(dataset_ids)} dataset partitions and a default one')
+            for referencing, name in dropped:
+                self.stdout.write(self.style.WARNING(
+                    f'{referencing}: foreign key {name} dropped (no dataset_id column to reference the new key)'
+                ))
+
+        self.stdout.write(self.style.SUCCESS('Tables partitioned by dataset'))
+
+    def show(self, model):
+        table = model._meta.db_table
+        if not is_partitioned(model):
+            self.stdout.write(f'{table}: not partitioned')
+            return
+        names = dict(Dataset.objects.values_list('pk', 'name'))
+        self.stdout.write(f'{table}:')
+        for dataset_id, (name, rows) in sorted(partitions(model).items(), key=lambda item: (item[0] is None, item[0])):
+            label = names.get(dataset_id, '(deleted dataset)') if dataset_id is not None else '(default)'
+            self.stdout.write(f'  {name}: {label}, ~{rows} rows')
@@ -6,12 +6,18 @@ import re
 from datetime import datetime, timedelta
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
+from django.db import connection, transaction
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime
+from api.catalog import catalog
+from api.counters import deferred_counters
 from api.models import (
-    APIKey, Dataset, Fact, Question, Link, SerpContent,
-    HtmlContent, HtmlContentUrl
+    APIKey, Dataset, DatasetRelease, Fact, Question, Link, SerpContent,
+    HtmlContent, HtmlContentUrl, PassageIndex
 )
+from api.partitions import PARTITIONED_MODELS, add_partitions, clear_dataset, is_partitioned
+from api.releases import create_release
+from api.serp_cache import serp_cache
 
 DATASET_NAME_MAP = {
     'yago': 'YAGO',
@@ -19,6 +25,13 @@ DATASET_NAME_MAP = {
     'factbench': 'FactBench'
 }
 
+# Document folders of each dataset's facts
+DATASET_DIR_PREFIXES = {
+    'yago': ('yago_',),
+    'dbpedia': ('dbpedia_',),
+    'factbench': ('correct', 'wrong')
+}
+
 
 def load_dataset(dataset_name: str = "FactBench", dataset_file: str = "kg.json"):
     print('Load {} dataset.'.format(dataset_name))
@@ -115,11 +128,33 @@ class Command(BaseCommand):
             action='store_true',
             help='Clear existing data before populating'
         )
+        parser.add_argument(
+            '--dataset',
+            action='append',
+            choices=list(DATASET_NAME_MAP),
+            help='Only (re)load this dataset (can be repeated); with --clear, only its '
+                 'facts, questions and HTML contents are cleared'
+        )
 
     def handle(self, *args, **options):
+        # Dataset and fact counters are refreshed once at the end
+        with deferred_counters():
+            datasets = self.populate(options)
+
+        # Clients sync from the release manifests (api.releases)
+        for dataset in datasets:
+            release, created = create_release(dataset)
+            if created:
+                self.stdout.write(f'Release {release.version} of {dataset.name}: {release.facts_count} facts')
+
+    def populate(self, options):
         if options['clear']:
             self.stdout.write('Clearing existing data...')
-            self.clear_data()
+            if options['dataset']:
+                for dataset in Dataset.objects.filter(name__in=options['dataset']):
+                    clear_dataset(dataset)
+            else:
+                self.clear_data()
 
         self.stdout.write('Creating sample data...')
 
@@ -127,8 +162,12 @@ class Command(BaseCommand):
         users = self.create_users()
 
         # Create datasets
-        datasets = self.create_datasets()
+        datasets = self.create_datasets(options['dataset'])
         print(f'Datasets created: {[dataset.name for dataset in datasets]}')
+        # New datasets get their own partitions before any row is loaded
+        for model in PARTITIONED_MODELS:
+            if is_partitioned(model):
+                add_partitions(model, [dataset.id for dataset in datasets])
 
         # # Create facts for each dataset
         all_facts = []
@@ -148,7 +187,7 @@ class Command(BaseCommand):
             self.create_questions_main_query(dataset)
 
         # # Create links and SERP content
-        self.create_links_and_serp_content()
+        self.create_links_and_serp_content(datasets)
 
         self.stdout.write(
             self.style.SUCCESS(
@@ -160,17 +199,24 @@ class Command(BaseCommand):
                 f'- HTML content for fetchable questions'
             )
         )
+        return datasets
 
     def clear_data(self):
         """Clear existing data"""
-        HtmlContentUrl.objects.all().delete()
-        HtmlContent.objects.all().delete()
-        SerpContent.objects.all().delete()
-        Link.objects.all().delete()
-        Question.objects.all().delete()
-        Fact.objects.all().delete()
-        Dataset.objects.all().delete()
-        APIKey.objects.all().delete()
+        for dataset in Dataset.objects.all():
+            # A partition swap per dataset when the tables are partitioned
+            clear_dataset(dataset)
+        # One DELETE per table, referencing tables first: the ORM would load
+        # and signal every row of the cascade
+        quote = connection.ops.quote_name
+        with transaction.atomic(), connection.cursor() as cursor:
+            for model in [
+                HtmlContentUrl, HtmlContent, Question, PassageIndex, SerpContent, Link,
+                DatasetRelease, Fact, Dataset, APIKey
+            ]:
+                cursor.execute(f'DELETE FROM {quote(model._meta.db_table)}')
+        catalog.invalidate()
+        serp_cache.invalidate()
         # Don't delete users as they might be system users
 
     def create_users(self):
@@ -200,8 +246,8 @@ class Command(BaseCommand):
 
         return users
 
-    def create_datasets(self):
-        """Create sample datasets"""
+    def create_datasets(self, names=None):
+        """Create sample datasets (only the named ones when given)"""
         dataset_templates = [
             {
                 'name': 'yago',
@@ -219,6 +265,8 @@ class Command(BaseCommand):
 
         datasets = []
         for template in dataset_templates:
+            if names and template['name'] not in names:
+                continue
             dataset, created = Dataset.objects.get_or_create(
                 name=template['name'],
                 defaults={
@@ -275,13 +323,14 @@ class Command(BaseCommand):
                 is_fetchable=True
             )
 
-    def create_links_and_serp_content(self):
+    def create_links_and_serp_content(self, datasets):
         """Create sample links with SERP content"""
+        prefixes = tuple(prefix for dataset in datasets for prefix in DATASET_DIR_PREFIXES[dataset.name])
         # walk on the folder
         # and get all the files that start with yago_ or dbpedia_ or factbench_
         for _, dirs, _ in os.walk('/Users/farzad/Documents/Thesis/Project/docs'):
             for dir in dirs:
-                if dir.startswith(('yago_', 'dbpedia_', 'correct', 'wrong')):
+                if dir.startswith(prefixes):
                 # if dir.startswith(('yago_',)):
                     print(f'Processing directory: {dir}')
                     for _, _, files in os.walk(f'/Users/farzad/Documents/Thesis/Project/docs/{dir}/all_docs'):
@@ -300,9 +349,9 @@ class Command(BaseCommand):
                                     rank = data.get('rank', 0)
                                     data = data.get('data', {})
 
-                                    link, created = Link.objects.get_or_create(
-                                        url=data.get('url'),
+                                    link, created = Link.objects.for_url(data.get('url')).get_or_create(
                                         defaults={
+                                            'url': data.get('url'),
                                             'title': data.get('title', ''),
                                             'description': data.get('meta_description', '')
                                         }
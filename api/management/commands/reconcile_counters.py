@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.counters import refresh_dataset_counters, refresh_fact_counters
+from api.models import Dataset, Fact
+
+FACT_COUNTERS = (
+    'questions_count', 'fetchable_questions_count', 'avg_score',
+    'html_contents_count', 'linked_urls_count', 'serp_urls_count',
+)
+DATASET_COUNTERS = (
+    'facts_count', 'questions_count', 'fetchable_questions_count',
+    'html_contents_count', 'linked_urls_count', 'serp_urls_count',
+)
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored dataset and fact counters and report drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dataset',
+            action='append',
+            help='Only reconcile this dataset (can be repeated)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of facts recomputed per UPDATE statement'
+        )
+
+    def handle(self, *args, **options):
+        datasets = Dataset.objects.all()
+        if options['dataset']:
+            datasets = datasets.filter(name__in=options['dataset'])
+            missing = set(options['dataset']) - set(datasets.values_list('name', flat=True))
+            if missing:
+                raise CommandError(f'Unknown datasets: {", ".join(sorted(missing))}')
+
+        for dataset in datasets:
+            fact_ids = list(Fact.objects.filter(dataset=dataset).order_by('pk').values_list('pk', flat=True))
+            drifted = 0
+            for start in range(0, len(fact_ids), options['batch_size']):
+                batch = fact_ids[start:start + options['batch_size']]
+                before = self.snapshot(Fact.objects.filter(pk__in=batch), FACT_COUNTERS)
+                refresh_fact_counters(batch, refresh_datasets=False)
+                after = self.snapshot(Fact.objects.filter(pk__in=batch), FACT_COUNTERS)
+                drifted += sum(1 for pk, values in after.items() if before.get(pk) != values)
+
+            before = self.snapshot(Dataset.objects.filter(pk=dataset.pk), DATASET_COUNTERS)
+            refresh_dataset_counters([dataset.pk])
+            after = self.snapshot(Dataset.objects.filter(pk=dataset.pk), DATASET_COUNTERS)
+
+            status = 'repaired' if before != after else 'in sync'
+            self.stdout.write(
+                f'{dataset.name}: {len(fact_ids)} facts checked, {drifted} repaired; '
+                f'dataset counters {status}'
+            )
+
+        self.stdout.write(self.style.SUCCESS('Counters reconciled'))
+
+    def snapshot(self, queryset, fields):
+        return {row[0]: row[1:] for row in queryset.values_list('pk', *fields)}
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import Dataset
+from api.releases import BATCH_SIZE, create_release
+
+
+class Command(BaseCommand):
+    help = 'Record a release of a dataset: the content hash of each fact, for clients syncing changes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'dataset',
+            nargs='*',
+            help='Names of the datasets to release (default: all)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Number of facts hashed per batch'
+        )
+        parser.add_argument(
+            '--keep',
+            type=int,
+            help='Delete all but the newest N releases of each dataset afterwards'
+        )
+
+    def handle(self, *args, **options):
+        datasets = Dataset.objects.order_by('name')
+        if options['dataset']:
+            datasets = datasets.filter(name__in=options['dataset'])
+            missing = set(options['dataset']) - {dataset.name for dataset in datasets}
+            if missing:
+                raise CommandError(f'Unknown dataset: {", ".join(sorted(missing))}')
+
+        for dataset in datasets:
+            release, created = create_release(dataset, options['batch_size'])
+            if created:
+                self.stdout.write(
+                    f'{dataset.name}: release {release.version} with {release.facts_count} facts '
+                    f'({release.added_count} added, {release.changed_count} changed, '
+                    f'{release.removed_count} removed)'
+                )
+            else:
+                self.stdout.write(f'{dataset.name}: unchanged since release {release.version}')
+
+            if options['keep']:
+                old = dataset.releases.order_by('-version')[options['keep']:].values_list('id', flat=True)
+                deleted, _ = dataset.releases.filter(id__in=list(old)).delete()
+                if deleted:
+                    self.stdout.write(f'{dataset.name}: removed {deleted} old releases')
+
+        self.stdout.write(self.style.SUCCESS('Releases recorded'))
@@ -0,0 +1,58 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.jobs import claim_job, run_job, worker_name
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (admin actions over large querysets, exports)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the queue is empty instead of polling for new jobs'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=5.0,
+            help='Seconds to wait between polls of an empty queue'
+        )
+        parser.add_argument(
+            '--stale-after',
+            type=int,
+            default=300,
+            help='Take over running jobs whose worker sent no heartbeat for this many seconds'
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        # Finish the current chunk and requeue the job instead of dying mid-way
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        worker = worker_name()
+        self.stdout.write(f'Worker {worker} started')
+        while not self.stopping:
+            close_old_connections()
+            job = claim_job(worker, options['stale_after'])
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f'Running {job}')
+            started = time.monotonic()
+            status = run_job(job, should_stop=lambda: self.stopping)
+            style = self.style.SUCCESS if status == 'succeeded' else self.style.WARNING
+            self.stdout.write(style(f'Job #{job.pk} {status} after {time.monotonic() - started:.1f}s'))
+
+        self.stdout.write(f'Worker {worker} stopped')
+
+    def stop(self, signum, frame):
+        self.stopping = True
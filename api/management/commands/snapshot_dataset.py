@@ -0,0 +1,258 @@
+import hashlib
+import json
+import os
+import shutil
+from datetime import timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Subquery
+from django.utils import timezone
+
+from api.coldstore import COLD_COLUMNS, cold_store
+from api.models import Dataset, Fact, HtmlContentUrl, Link, Question, SerpContent
+from api.snapshots import LABEL_RE, MANIFEST_NAME, VERSION_FORMAT, dataset_snapshot_dir, list_versions
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+SNAPSHOT_FORMAT_VERSION = 1
+
+
+def serp_text(row):
+    """Text of a SERP content row ending with its cold store columns"""
+    segment, offset = row[-2:]
+    return cold_store.read(segment, offset) if segment is not None else row[5]
+
+
+def string_list(value):
+    """JSON list column value as a list of strings"""
+    if not value:
+        return None
+    if not isinstance(value, list):
+        value = [value]
+    return [str(item) for item in value]
+
+
+class Command(BaseCommand):
+    help = 'Write a versioned columnar (Arrow IPC or Parquet) snapshot of a dataset'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', help='Name of the dataset to snapshot')
+        parser.add_argument(
+            '--format',
+            choices=['arrow', 'parquet'],
+            default='arrow',
+            help='arrow: uncompressed IPC files that can be memory-mapped without '
+                 'copying; parquet: zstd-compressed, smaller downloads'
+        )
+        parser.add_argument(
+            '--rows-per-file',
+            type=int,
+            default=10000,
+            help='Rows per partition file'
+        )
+        parser.add_argument(
+            '--label',
+            help='Label appended to the version, the current UTC timestamp (letters, digits, ".", "_" and "-")'
+        )
+        parser.add_argument(
+            '--keep',
+            type=int,
+            help='Delete all but the newest N snapshots of the dataset afterwards'
+        )
+
+    def handle(self, *args, **options):
+        label = options['label']
+        if label is not None and not LABEL_RE.match(label):
+            raise CommandError('--label may only contain letters, digits, ".", "_" and "-", and cannot start with "."')
+        if pa is None:
+            raise CommandError('Snapshots require pyarrow (pip install pyarrow)')
+
+        try:
+            dataset = Dataset.objects.get(name=options['dataset'])
+        except Dataset.DoesNotExist:
+            raise CommandError(f'Unknown dataset: {options["dataset"]}')
+
+        version = timezone.now().astimezone(dt_timezone.utc).strftime(VERSION_FORMAT)
+        if label:
+            version = f'{version}-{label}'
+        target = dataset_snapshot_dir(dataset.name) / version
+        if target.exists():
+            raise CommandError(f'Snapshot {target} already exists')
+
+        # Written next to the target and renamed at the end, so readers and
+        # the API never see a partial snapshot (the name is not a version)
+        staging = target.with_name(f'.{version}.tmp')
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir(parents=True)
+
+        self.format = options['format']
+        self.rows_per_file = max(1, options['rows_per_file'])
+        try:
+            tables = {}
+            for name, schema, dictionary_columns, rows in self.tables(dataset):
+                tables[name] = self.write_table(staging, name, schema, dictionary_columns, rows)
+                self.stdout.write(f'{name}: {tables[name]["rows"]} rows in {len(tables[name]["files"])} files')
+
+            manifest = {
+                'snapshot_format': SNAPSHOT_FORMAT_VERSION,
+                'dataset': dataset.name,
+                'version': version,
+                'created_at': timezone.now().isoformat(),
+                'format': self.format,
+                'tables': tables,
+            }
+            with open(staging / MANIFEST_NAME, 'w') as f:
+                json.dump(manifest, f, indent=2)
+            os.rename(staging, target)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        if options['keep']:
+            for old in list_versions(dataset.name)[:-options['keep']]:
+                shutil.rmtree(dataset_snapshot_dir(dataset.name) / old)
+                self.stdout.write(f'Removed snapshot {old}')
+
+        self.stdout.write(self.style.SUCCESS(f'Snapshot written to {target}'))
+
+    def tables(self, dataset):
+        """(name, schema, dictionary-encoded columns, row iterator) per table"""
+        link_ids = HtmlContentUrl.objects.filter(dataset=dataset).values('link_id')
+
+        yield 'facts', pa.schema([
+            ('id', pa.int64()),
+            ('fact_id', pa.string()),
+            ('questions_count', pa.int32()),
+            ('fetchable_questions_count', pa.int32()),
+            ('avg_score', pa.float64()),
+        ]), (), Fact.objects.filter(dataset=dataset).order_by('fact_id').values_list(
+            'id', 'fact_id', 'questions_count', 'fetchable_questions_count', 'avg_score'
+        ).iterator(chunk_size=2000)
+
+        yield 'questions', pa.schema([
+            ('id', pa.int64()),
+            ('fact_id', pa.string()),
+            ('fetch_id', pa.int32()),
+            ('question_rank', pa.int32()),
+            ('text', pa.string()),
+            ('score', pa.float64()),
+            ('is_fetchable', pa.bool_()),
+        ]), ('fact_id',), self.question_rows(dataset)
+
+        yield 'question_links', pa.schema([
+            ('question_id', pa.int64()),
+            ('link_id', pa.int64()),
+            ('rank', pa.int32()),
+        ]), (), HtmlContentUrl.objects.filter(dataset=dataset).order_by('html_content__question_id', 'rank', 'id').values_list(
+            'html_content__question_id', 'link_id', 'rank'
+        ).iterator(chunk_size=5000)
+
+        yield 'links', pa.schema([
+            ('id', pa.int64()),
+            ('url', pa.string()),
+            ('domain', pa.string()),
+            ('title', pa.string()),
+            ('is_active', pa.bool_()),
+        ]), ('domain',), Link.objects.filter(id__in=Subquery(link_ids)).order_by('id').values_list(
+            'id', 'url', 'domain', 'title', 'is_active'
+        ).iterator(chunk_size=5000)
+
+        yield 'serp_content', pa.schema([
+            ('link_id', pa.int64()),
+            ('url', pa.string()),
+            ('language', pa.string()),
+            ('title', pa.string()),
+            ('summary', pa.string()),
+            ('text', pa.string()),
+            ('meta_site_name', pa.string()),
+            ('publish_date', pa.timestamp('us', tz='UTC')),
+            ('authors', pa.list_(pa.string())),
+            ('keywords', pa.list_(pa.string())),
+            ('text_chars', pa.int32()),
+            ('text_words', pa.int32()),
+            ('text_tokens', pa.int32()),
+        ]), ('language', 'meta_site_name'), (
+            row[:5] + (serp_text(row),) + row[6:8] + (string_list(row[8]), string_list(row[9])) + row[10:13]
+            for row in SerpContent.objects.filter(link_id__in=Subquery(link_ids)).order_by('link_id').values_list(
+                'link_id', 'url', 'language', 'title', 'summary', 'text', 'meta_site_name',
+                'publish_date', 'authors', 'keywords', 'text_chars', 'text_words', 'text_tokens', *COLD_COLUMNS
+            ).iterator(chunk_size=500)
+        )
+
+    def question_rows(self, dataset):
+        """Questions with the fetch_id of the questions endpoint and the
+        question_rank of the question page (fetchable questions only)"""
+        questions = Question.objects.filter(dataset=dataset).order_by(
+            'fact__fact_id', '-score', 'id'
+        ).values_list('id', 'fact__fact_id', 'text', 'score', 'is_fetchable')
+
+        current, fetch_id, question_rank = None, 0, 0
+        for question_id, fact_id, text, score, is_fetchable in questions.iterator(chunk_size=5000):
+            if fact_id != current:
+                current, fetch_id, question_rank = fact_id, 0, 0
+            yield (
+                question_id, fact_id, fetch_id, question_rank if is_fetchable else None,
+                text, score, is_fetchable
+            )
+            fetch_id += 1
+            if is_fetchable:
+                question_rank += 1
+
+    def write_table(self, directory, name, schema, dictionary_columns, rows):
+        files = []
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.rows_per_file:
+                files.append(self.write_part(directory, name, len(files), schema, dictionary_columns, batch))
+                batch = []
+        if batch or not files:
+            files.append(self.write_part(directory, name, len(files), schema, dictionary_columns, batch))
+
+        return {
+            'rows': sum(entry['rows'] for entry in files),
+            'columns': [field.name for field in schema],
+            'dictionary_columns': list(dictionary_columns),
+            'files': files,
+        }
+
+    def write_part(self, directory, name, index, schema, dictionary_columns, rows):
+        columns = list(zip(*rows)) if rows else [()] * len(schema)
+        arrays = []
+        fields = []
+        for field, values in zip(schema, columns):
+            array = pa.array(values, type=field.type)
+            # Repetitive text columns (fact ids, domains, languages) are
+            # stored once per partition and referenced by index
+            if field.name in dictionary_columns:
+                array = array.dictionary_encode()
+                field = field.with_type(array.type)
+            arrays.append(array)
+            fields.append(field)
+        table = pa.Table.from_arrays(arrays, schema=pa.schema(fields))
+
+        filename = f'{name}/part-{index:05d}.{self.format}'
+        path = directory / filename
+        path.parent.mkdir(exist_ok=True)
+        if self.format == 'arrow':
+            with pa.OSFile(str(path), 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+        else:
+            pq.write_table(table, path, compression='zstd', use_dictionary=list(dictionary_columns))
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+
+        return {
+            'name': filename,
+            'rows': len(rows),
+            'bytes': path.stat().st_size,
+            'sha256': digest.hexdigest(),
+        }
@@ -0,0 +1,159 @@
+import os
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, Max, Min, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from api.coldstore import BODY_FIELDS, COLD_COLUMNS, cold_store
+from api.models import HtmlContent, SerpContent
+
+KINDS = {'serp': SerpContent, 'html': HtmlContent}
+
+
+class Command(BaseCommand):
+    help = (
+        'Move the bodies of rarely requested SERP documents and question pages to the cold store '
+        'segment files, and bring requested ones back into the database'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--kind',
+            action='append',
+            choices=sorted(KINDS),
+            help='Only tier SERP text (serp) or question HTML (html); can be repeated (default: both)'
+        )
+        parser.add_argument(
+            '--max-scrapes',
+            type=int,
+            default=0,
+            help='A document is cold when its links were scraped at most this many times in all'
+        )
+        parser.add_argument(
+            '--idle-days',
+            type=int,
+            default=30,
+            metavar='DAYS',
+            help='... and not in the last DAYS days; other cold documents are brought back'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of ids examined per batch'
+        )
+        parser.add_argument(
+            '--status',
+            action='store_true',
+            help='Only report the documents in each tier and the segment files'
+        )
+
+    def handle(self, *args, **options):
+        models = [KINDS[kind] for kind in sorted(set(options['kind'] or KINDS))]
+        if options['status']:
+            self.show(models)
+            return
+        if options['max_scrapes'] < 0 or options['idle_days'] < 0:
+            raise CommandError('--max-scrapes and --idle-days must be >= 0')
+
+        cutoff = timezone.now() - timedelta(days=options['idle_days'])
+        for model in models:
+            frozen, thawed = self.tier(model, options['max_scrapes'], cutoff, options['batch_size'])
+            self.stdout.write(
+                f'{model._meta.verbose_name}: {frozen} moved to the cold store, {thawed} back to the database'
+            )
+        self.stdout.write(self.style.SUCCESS('Documents tiered'))
+
+    def popularity(self, model):
+        """(scrape count, last scrape) of each row's links, the access
+        statistics that decide its tier; question pages sum their links'"""
+        if model is SerpContent:
+            return {'scrapes': F('link__scrape_count'), 'scraped': F('link__last_scraped')}
+        return {
+            'scrapes': Coalesce(Sum('htmlcontenturl__link__scrape_count'), 0),
+            'scraped': Max('htmlcontenturl__link__last_scraped'),
+        }
+
+    def tier(self, model, max_scrapes, cutoff, batch_size):
+        _, field = BODY_FIELDS[model._meta.label_lower]
+        bounds = model.objects.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            return 0, 0
+
+        cold = Q(scrapes__lte=max_scrapes) & (Q(scraped__isnull=True) | Q(scraped__lt=cutoff))
+        frozen = thawed = 0
+        for start in range(bounds['low'], bounds['high'] + 1, batch_size):
+            rows = model.objects.filter(id__gte=start, id__lt=start + batch_size).values('id').annotate(
+                **self.popularity(model)
+            )
+            to_freeze = list(rows.filter(cold, cold_segment__isnull=True).values_list('id', flat=True))
+            to_thaw = list(rows.filter(~cold, cold_segment__isnull=False).values_list('id', flat=True))
+
+            batch_frozen = self.freeze(model, field, to_freeze) if to_freeze else 0
+            batch_thawed = self.thaw(model, field, to_thaw) if to_thaw else 0
+            frozen += batch_frozen
+            thawed += batch_thawed
+            if batch_frozen or batch_thawed:
+                self.stdout.write(
+                    f'Processed up to id {start + batch_size - 1} ({frozen} frozen, {thawed} thawed)'
+                )
+        return frozen, thawed
+
+    def freeze(self, model, field, ids):
+        """Append the bodies to the store, then empty them in the database;
+        returns how many were moved. The rows stay locked from the read to
+        the update, so that a save made meanwhile waits and is not lost."""
+        table, _ = BODY_FIELDS[model._meta.label_lower]
+        # NULL text, or empty content (the column is not nullable)
+        empty = None if model is SerpContent else ''
+        fields = [field, *COLD_COLUMNS]
+        if model is SerpContent:
+            # The payload holds the text too
+            fields.append('payload')
+        with transaction.atomic():
+            rows = list(model.objects.select_for_update().filter(id__in=ids, cold_segment__isnull=True).exclude(
+                Q(**{f'{field}__isnull': True}) | Q(**{field: ''})
+            ).order_by('id').values_list('id', field))
+            if not rows:
+                return 0
+            locations = cold_store.append(table, rows)
+            instances = [
+                model(id=pk, cold_segment=segment, cold_offset=offset, **{field: empty})
+                for (pk, _), (segment, offset) in zip(rows, locations)
+            ]
+            model.objects.bulk_update(instances, fields)
+        return len(instances)
+
+    def thaw(self, model, field, ids):
+        """Store the bodies in the database again and forget their records;
+        returns how many were brought back. Rows saved meanwhile are already
+        back and left alone."""
+        columns = ['id', field, *COLD_COLUMNS]
+        if model is SerpContent:
+            columns += SerpContent.SELECTABLE_FIELDS
+        fields = [field, *COLD_COLUMNS]
+        if model is SerpContent:
+            fields.append('payload')
+        with transaction.atomic():
+            instances = list(model.objects.select_for_update().filter(
+                id__in=ids, cold_segment__isnull=False
+            ).order_by('id').only(*columns))
+            for instance in instances:
+                setattr(instance, field, cold_store.read(instance.cold_segment, instance.cold_offset))
+                instance.cold_segment = instance.cold_offset = None
+                if model is SerpContent:
+                    instance.build_payload()
+            model.objects.bulk_update(instances, fields)
+        return len(instances)
+
+    def show(self, models):
+        for model in models:
+            cold = model.objects.filter(cold_segment__isnull=False).count()
+            total = model.objects.count()
+            self.stdout.write(f'{model._meta.verbose_name}: {total - cold} in the database, {cold} in the cold store')
+        segments = cold_store.segments()
+        size = sum(os.path.getsize(cold_store.path(segment)) for segment in segments)
+        self.stdout.write(f'{len(segments)} segment files in {cold_store.root}, {size / 1024 ** 2:.1f} MB')
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Func, Max, Min
+from django.contrib.postgres.search import SearchVectorField
+
+from api.models import SerpContent
+
+
+class Command(BaseCommand):
+    help = 'Backfill the full-text search vector of SERP content in id-range batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of ids covered by each UPDATE statement'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Recompute every row, not only rows without a search vector'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        bounds = SerpContent.objects.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            self.stdout.write('No SERP content to index.')
+            return
+
+        vector = Func(
+            F('language'), F('title'), F('summary'), F('text'),
+            function='api_serpcontent_search_vector',
+            output_field=SearchVectorField()
+        )
+
+        updated = 0
+        for start in range(bounds['low'], bounds['high'] + 1, batch_size):
+            # Documents in the cold store keep the vector computed from their text
+            queryset = SerpContent.objects.filter(id__gte=start, id__lt=start + batch_size, cold_segment__isnull=True)
+            if not options['all']:
+                queryset = queryset.filter(search_vector__isnull=True)
+            updated += queryset.update(search_vector=vector)
+            self.stdout.write(f'Indexed up to id {start + batch_size - 1} ({updated} rows updated)')
+
+        self.stdout.write(self.style.SUCCESS(f'Search vectors updated for {updated} rows'))
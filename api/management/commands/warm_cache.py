@@ -0,0 +1,119 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.models import Dataset
+from api.warmup import (
+    api_key_targets, buffer_stats, parse_size, question_targets, serp_targets,
+    warm_api_keys, warm_questions, warm_serp
+)
+
+
+class Command(BaseCommand):
+    help = 'Warm the database caches with the most requested question pages and SERP documents'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dataset',
+            action='append',
+            help='Only warm this dataset (can be repeated; default: all active datasets)'
+        )
+        parser.add_argument(
+            '--budget',
+            default='512MB',
+            help='Approximate amount of HTML and SERP payloads to read, e.g. 512MB or 2G. '
+                 'Keep it below shared_buffers plus the free OS page cache'
+        )
+        parser.add_argument(
+            '--serp-share',
+            type=float,
+            default=0.5,
+            help='Share of the budget for SERP documents; question pages get the rest '
+                 'and whatever one side leaves unused goes to the other'
+        )
+        parser.add_argument(
+            '--since',
+            type=int,
+            metavar='DAYS',
+            help='Warm links scraped in the last DAYS days before the rest'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Question pages or SERP documents read per query'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            budget = parse_size(options['budget'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if not 0 <= options['serp_share'] <= 1:
+            raise CommandError('--serp-share must be between 0 and 1')
+
+        datasets = Dataset.objects.filter(is_active=True)
+        if options['dataset']:
+            datasets = datasets.filter(name__in=options['dataset'])
+            missing = set(options['dataset']) - set(datasets.values_list('name', flat=True))
+            if missing:
+                raise CommandError(f'Unknown datasets: {", ".join(sorted(missing))}')
+        since = timezone.now() - timedelta(days=options['since']) if options['since'] else None
+        self.batch_size = max(1, options['batch_size'])
+
+        started = time.monotonic()
+        stats_before = buffer_stats()
+
+        keys = warm_api_keys(list(api_key_targets()))
+        self.stdout.write(f'API keys: {keys}')
+
+        serp_budget = int(budget * options['serp_share'])
+        question_count, question_bytes = self.warm(
+            'question pages', question_targets(datasets, since), warm_questions, budget - serp_budget
+        )
+        serp_count, serp_bytes = self.warm(
+            'SERP documents', serp_targets(None if not options['dataset'] else datasets, since),
+            warm_serp, budget - question_bytes
+        )
+
+        stats_after = buffer_stats()
+        if stats_before and stats_after:
+            read = stats_after[0] - stats_before[0]
+            hit = stats_after[1] - stats_before[1]
+            hit_rate = f'{hit / (read + hit):.1%}' if read + hit else 'n/a'
+            self.stdout.write(
+                f'Buffer hit rate during warm-up: {hit_rate} '
+                f'({read} blocks read from disk, {hit} already cached)'
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Warmed {question_count} question pages and {serp_count} SERP documents '
+            f'({(question_bytes + serp_bytes) / 1024 / 1024:.1f} MB) in {time.monotonic() - started:.1f}s'
+        ))
+
+    def warm(self, label, targets, warm_batch, budget):
+        """Warm targets batch by batch until the budget is spent; returns
+        (targets warmed, bytes read)"""
+        ids = list(targets)
+        warmed = spent = 0
+        reported = 0
+        for start in range(0, len(ids), self.batch_size):
+            if spent >= budget:
+                break
+            batch = ids[start:start + self.batch_size]
+            spent += warm_batch(batch)
+            warmed += len(batch)
+
+            # Report every tenth of the targets or of the budget
+            progress = int(10 * max(warmed / len(ids), spent / budget if budget else 1))
+            if progress > reported:
+                reported = progress
+                self.stdout.write(
+                    f'{label}: {warmed}/{len(ids)}, '
+                    f'{spent / 1024 / 1024:.1f}/{budget / 1024 / 1024:.1f} MB'
+                )
+
+        self.stdout.write(f'{label}: {warmed} of {len(ids)} warmed, {spent / 1024 / 1024:.1f} MB')
+        return warmed, spent
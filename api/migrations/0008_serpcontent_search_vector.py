@@ -0,0 +1,94 @@
+# Generated by Django 5.2.1 on 2026-10-19 04:54
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# Maps SerpContent.language (ISO 639-1, optionally with a region suffix) to a
+# PostgreSQL text search configuration. Unknown languages use 'simple'.
+SEARCH_FUNCTIONS_SQL = """
+CREATE OR REPLACE FUNCTION api_search_config(lang text) RETURNS regconfig AS $$
+    SELECT CASE lower(split_part(replace(coalesce(lang, ''), '_', '-'), '-', 1))
+        WHEN 'ar' THEN 'arabic'::regconfig
+        WHEN 'ca' THEN 'catalan'::regconfig
+        WHEN 'da' THEN 'danish'::regconfig
+        WHEN 'de' THEN 'german'::regconfig
+        WHEN 'el' THEN 'greek'::regconfig
+        WHEN 'en' THEN 'english'::regconfig
+        WHEN 'es' THEN 'spanish'::regconfig
+        WHEN 'eu' THEN 'basque'::regconfig
+        WHEN 'fi' THEN 'finnish'::regconfig
+        WHEN 'fr' THEN 'french'::regconfig
+        WHEN 'ga' THEN 'irish'::regconfig
+        WHEN 'hi' THEN 'hindi'::regconfig
+        WHEN 'hu' THEN 'hungarian'::regconfig
+        WHEN 'hy' THEN 'armenian'::regconfig
+        WHEN 'id' THEN 'indonesian'::regconfig
+        WHEN 'it' THEN 'italian'::regconfig
+        WHEN 'lt' THEN 'lithuanian'::regconfig
+        WHEN 'nb' THEN 'norwegian'::regconfig
+        WHEN 'ne' THEN 'nepali'::regconfig
+        WHEN 'nl' THEN 'dutch'::regconfig
+        WHEN 'nn' THEN 'norwegian'::regconfig
+        WHEN 'no' THEN 'norwegian'::regconfig
+        WHEN 'pt' THEN 'portuguese'::regconfig
+        WHEN 'ro' THEN 'romanian'::regconfig
+        WHEN 'ru' THEN 'russian'::regconfig
+        WHEN 'sr' THEN 'serbian'::regconfig
+        WHEN 'sv' THEN 'swedish'::regconfig
+        WHEN 'ta' THEN 'tamil'::regconfig
+        WHEN 'tr' THEN 'turkish'::regconfig
+        WHEN 'yi' THEN 'yiddish'::regconfig
+        ELSE 'simple'::regconfig
+    END
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+-- Text is capped so that very large documents cannot exceed the 1MB tsvector
+-- limit and fail the insert; word positions past 16383 are clamped anyway.
+CREATE OR REPLACE FUNCTION api_serpcontent_search_vector(
+    lang text, title text, summary text, body text
+) RETURNS tsvector AS $$
+    SELECT setweight(to_tsvector(api_search_config(lang), coalesce(title, '')), 'A')
+        || setweight(to_tsvector(api_search_config(lang), coalesce(summary, '')), 'B')
+        || setweight(to_tsvector(api_search_config(lang), left(coalesce(body, ''), 500000)), 'C')
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+CREATE OR REPLACE FUNCTION api_serpcontent_search_vector_trigger() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := api_serpcontent_search_vector(NEW.language, NEW.title, NEW.summary, NEW.text);
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER api_serpcontent_search_vector_update
+    BEFORE INSERT OR UPDATE OF language, title, summary, text ON api_serpcontent
+    FOR EACH ROW EXECUTE FUNCTION api_serpcontent_search_vector_trigger();
+"""
+
+DROP_SEARCH_FUNCTIONS_SQL = """
+DROP TRIGGER IF EXISTS api_serpcontent_search_vector_update ON api_serpcontent;
+DROP FUNCTION IF EXISTS api_serpcontent_search_vector_trigger();
+DROP FUNCTION IF EXISTS api_serpcontent_search_vector(text, text, text, text);
+DROP FUNCTION IF EXISTS api_search_config(text);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_alter_serpcontent_authors_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='serpcontent',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='serpcontent',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='api_serp_search_vector_gin'),
+        ),
+        migrations.RunSQL(SEARCH_FUNCTIONS_SQL, DROP_SEARCH_FUNCTIONS_SQL),
+    ]
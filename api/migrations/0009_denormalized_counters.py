@@ -0,0 +1,122 @@
+# Generated by Django 5.2.1 on 2026-10-19 04:58
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, FloatField, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 1000
+
+
+def _count(queryset, fact_path, distinct_field=None):
+    total = Count(distinct_field, distinct=True) if distinct_field else Count('*')
+    rows = queryset.filter(**{fact_path: OuterRef('pk')}).order_by().values(fact_path)
+    return Coalesce(Subquery(rows.annotate(total=total).values('total'), output_field=IntegerField()), 0)
+
+
+def backfill_counters(apps, schema_editor):
+    """What reconcile_counters does (api.counters), with the models of this migration"""
+    Dataset = apps.get_model('api', 'Dataset')
+    Fact = apps.get_model('api', 'Fact')
+    Question = apps.get_model('api', 'Question')
+    HtmlContent = apps.get_model('api', 'HtmlContent')
+    HtmlContentUrl = apps.get_model('api', 'HtmlContentUrl')
+
+    scores = Question.objects.filter(fact=OuterRef('pk')).order_by().values('fact')
+    fact_ids = list(Fact.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(fact_ids), BATCH_SIZE):
+        Fact.objects.filter(pk__in=fact_ids[start:start + BATCH_SIZE]).update(
+            questions_count=_count(Question.objects.all(), 'fact'),
+            fetchable_questions_count=_count(Question.objects.filter(is_fetchable=True), 'fact'),
+            avg_score=Subquery(scores.annotate(avg=Avg('score')).values('avg'), output_field=FloatField()),
+            html_contents_count=_count(HtmlContent.objects.all(), 'question__fact'),
+            linked_urls_count=_count(HtmlContentUrl.objects.all(), 'html_content__question__fact', 'link'),
+            serp_urls_count=_count(
+                HtmlContentUrl.objects.filter(link__serp_content__isnull=False),
+                'html_content__question__fact', 'link'
+            ),
+        )
+
+    def fact_sum(field):
+        rows = Fact.objects.filter(dataset=OuterRef('pk')).order_by().values('dataset')
+        return Coalesce(Subquery(rows.annotate(total=Sum(field)).values('total'), output_field=IntegerField()), 0)
+
+    Dataset.objects.update(
+        facts_count=_count(Fact.objects.all(), 'dataset'),
+        questions_count=fact_sum('questions_count'),
+        fetchable_questions_count=fact_sum('fetchable_questions_count'),
+        html_contents_count=fact_sum('html_contents_count'),
+        linked_urls_count=fact_sum('linked_urls_count'),
+        serp_urls_count=fact_sum('serp_urls_count'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_serpcontent_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='facts_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='fetchable_questions_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='html_contents_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='linked_urls_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='questions_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='serp_urls_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='fact',
+            name='avg_score',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='fact',
+            name='fetchable_questions_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='fact',
+            name='html_contents_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='fact',
+            name='linked_urls_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='fact',
+            name='questions_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='fact',
+            name='serp_urls_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        # Existing rows start with the counts, not zeros
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
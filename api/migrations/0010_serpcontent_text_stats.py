@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-19 05:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_denormalized_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='serpcontent',
+            name='text_chars',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='serpcontent',
+            name='text_tokens',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='serpcontent',
+            name='text_words',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+    ]
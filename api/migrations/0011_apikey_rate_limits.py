@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-19 05:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_serpcontent_text_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apikey',
+            name='burst_limit',
+            field=models.PositiveIntegerField(blank=True, help_text='Requests that may be made at once before the rate applies', null=True),
+        ),
+        migrations.AddField(
+            model_name='apikey',
+            name='max_in_flight',
+            field=models.PositiveIntegerField(blank=True, help_text='Concurrent requests allowed (0 for unlimited)', null=True),
+        ),
+        migrations.AddField(
+            model_name='apikey',
+            name='rate_limit',
+            field=models.FloatField(blank=True, help_text='Sustained requests per second (0 for unlimited)', null=True),
+        ),
+    ]
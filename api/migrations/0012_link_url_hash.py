@@ -0,0 +1,72 @@
+# Generated by Django 5.2.1 on 2026-10-19 06:10
+
+from django.db import migrations, models
+
+from api.normalize import url_hash
+
+BATCH_SIZE = 5000
+
+
+def backfill_url_hashes(apps, schema_editor):
+    Link = apps.get_model('api', 'Link')
+    table = schema_editor.quote_name(Link._meta.db_table)
+
+    def flush(rows):
+        values = ', '.join(['(%s, %s)'] * len(rows))
+        params = [value for row in rows for value in row]
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} SET url_hash = v.url_hash '
+                f'FROM (VALUES {values}) AS v(id, url_hash) WHERE {table}.id = v.id',
+                params
+            )
+
+    rows = []
+    for link_id, url in Link.objects.values_list('id', 'url').iterator(chunk_size=BATCH_SIZE):
+        rows.append((link_id, url_hash(url)))
+        if len(rows) >= BATCH_SIZE:
+            flush(rows)
+            rows = []
+    if rows:
+        flush(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_apikey_rate_limits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='link',
+            name='url_hash',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_url_hashes, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='link',
+            name='url_hash',
+            field=models.BigIntegerField(db_index=True, editable=False),
+        ),
+        # Lookups go through url_hash; drop the three btree indexes on url
+        # (unique, its varchar_pattern_ops twin and Meta.indexes) and the
+        # duplicate indexes on domain and SerpContent.url
+        migrations.RemoveIndex(
+            model_name='link',
+            name='api_link_url_2d21a9_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='link',
+            name='api_link_domain_642ef8_idx',
+        ),
+        migrations.AlterField(
+            model_name='link',
+            name='url',
+            field=models.URLField(max_length=2000),
+        ),
+        migrations.RemoveIndex(
+            model_name='serpcontent',
+            name='api_serpcon_url_084629_idx',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-19 05:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='htmlcontent',
+            name='structured',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-19 05:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_htmlcontent_structured'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PassageIndex',
+            fields=[
+                ('serp_content', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='passage_index', serialize=False, to='api.serpcontent')),
+                ('version', models.IntegerField(default=1)),
+                ('passages', models.JSONField(default=list)),
+                ('postings', models.JSONField(default=dict)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-19 05:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_passageindex'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='serpcontent',
+            name='cluster_id',
+            field=models.IntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='serpcontent',
+            name='minhash',
+            field=models.BinaryField(null=True),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.1 on 2026-10-19 09:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_datasets(apps, schema_editor):
+    Fact = apps.get_model('api', 'Fact')
+    Question = apps.get_model('api', 'Question')
+    HtmlContent = apps.get_model('api', 'HtmlContent')
+    HtmlContentUrl = apps.get_model('api', 'HtmlContentUrl')
+
+    # One UPDATE per table, each copying from the table above it
+    Question.objects.update(dataset_id=Subquery(
+        Fact.objects.filter(pk=OuterRef('fact_id')).values('dataset_id')
+    ))
+    HtmlContent.objects.update(dataset_id=Subquery(
+        Question.objects.filter(pk=OuterRef('question_id')).values('dataset_id')
+    ))
+    HtmlContentUrl.objects.update(dataset_id=Subquery(
+        HtmlContent.objects.filter(pk=OuterRef('html_content_id')).values('dataset_id')
+    ))
+
+
+def dataset_field(null):
+    return models.ForeignKey(
+        db_index=False, editable=False, null=null, on_delete=django.db.models.deletion.CASCADE,
+        related_name='+', to='api.dataset'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_serpcontent_minhash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='dataset',
+            field=dataset_field(null=True),
+        ),
+        migrations.AddField(
+            model_name='htmlcontent',
+            name='dataset',
+            field=dataset_field(null=True),
+        ),
+        migrations.AddField(
+            model_name='htmlcontenturl',
+            name='dataset',
+            field=dataset_field(null=True),
+        ),
+        migrations.RunPython(backfill_datasets, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='question',
+            name='dataset',
+            field=dataset_field(null=False),
+        ),
+        migrations.AlterField(
+            model_name='htmlcontent',
+            name='dataset',
+            field=dataset_field(null=False),
+        ),
+        migrations.AlterField(
+            model_name='htmlcontenturl',
+            name='dataset',
+            field=dataset_field(null=False),
+        ),
+    ]
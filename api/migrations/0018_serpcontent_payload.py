@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-19 06:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_dataset_partition_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='serpcontent',
+            name='payload',
+            field=models.BinaryField(null=True),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.1 on 2026-10-19 07:04
+
+from django.db import migrations, models
+
+# Moving the text of a document to the cold store (text set to NULL with a
+# cold_segment) keeps its search vector, so cold documents stay searchable.
+SEARCH_TRIGGER_SQL = """
+CREATE OR REPLACE FUNCTION api_serpcontent_search_vector_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND NEW.text IS NULL AND NEW.cold_segment IS NOT NULL
+            AND NEW.language IS NOT DISTINCT FROM OLD.language
+            AND NEW.title IS NOT DISTINCT FROM OLD.title
+            AND NEW.summary IS NOT DISTINCT FROM OLD.summary THEN
+        RETURN NEW;
+    END IF;
+    NEW.search_vector := api_serpcontent_search_vector(NEW.language, NEW.title, NEW.summary, NEW.text);
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+PREVIOUS_SEARCH_TRIGGER_SQL = """
+CREATE OR REPLACE FUNCTION api_serpcontent_search_vector_trigger() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := api_serpcontent_search_vector(NEW.language, NEW.title, NEW.summary, NEW.text);
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_serpcontent_payload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='htmlcontent',
+            name='cold_offset',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='htmlcontent',
+            name='cold_segment',
+            field=models.IntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='serpcontent',
+            name='cold_offset',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='serpcontent',
+            name='cold_segment',
+            field=models.IntegerField(editable=False, null=True),
+        ),
+        migrations.RunSQL(SEARCH_TRIGGER_SQL, PREVIOUS_SEARCH_TRIGGER_SQL),
+    ]
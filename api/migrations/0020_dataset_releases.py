@@ -0,0 +1,42 @@
+# Generated by Django 5.2.1 on 2026-10-19 07:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_cold_store'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='htmlcontent',
+            name='content_hash',
+            field=models.CharField(editable=False, max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='serpcontent',
+            name='content_hash',
+            field=models.CharField(editable=False, max_length=32, null=True),
+        ),
+        migrations.CreateModel(
+            name='DatasetRelease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('digest', models.CharField(max_length=32)),
+                ('facts_count', models.IntegerField(default=0)),
+                ('added_count', models.IntegerField(default=0)),
+                ('changed_count', models.IntegerField(default=0)),
+                ('removed_count', models.IntegerField(default=0)),
+                ('manifest', models.BinaryField()),
+                ('dataset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='releases', to='api.dataset')),
+            ],
+            options={
+                'unique_together': {('dataset', 'version')},
+            },
+        ),
+    ]
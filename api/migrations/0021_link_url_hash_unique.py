@@ -0,0 +1,99 @@
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+from api.normalize import normalize_url, url_hash
+
+BATCH_SIZE = 5000
+
+
+def rehash_links(apps, schema_editor):
+    """Hash every link with the current normalize_url, which keeps escaped
+    delimiters (%2F, %3F, %23) encoded"""
+    Link = apps.get_model('api', 'Link')
+    table = schema_editor.quote_name(Link._meta.db_table)
+
+    def flush(rows):
+        values = ', '.join(['(%s, %s)'] * len(rows))
+        params = [value for row in rows for value in row]
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} SET url_hash = v.url_hash '
+                f'FROM (VALUES {values}) AS v(id, url_hash) WHERE {table}.id = v.id',
+                params
+            )
+
+    rows = []
+    for link_id, url, old_hash in Link.objects.values_list('id', 'url', 'url_hash').iterator(chunk_size=BATCH_SIZE):
+        new_hash = url_hash(url)
+        if new_hash != old_hash:
+            rows.append((link_id, new_hash))
+        if len(rows) >= BATCH_SIZE:
+            flush(rows)
+            rows = []
+    if rows:
+        flush(rows)
+
+
+def merge_duplicate_links(apps, schema_editor):
+    """Merge the links of each normalized URL into one: the one with SERP
+    content, else the oldest. It takes over the others' question page URLs
+    and scrape statistics, and the others are deleted."""
+    Link = apps.get_model('api', 'Link')
+    HtmlContentUrl = apps.get_model('api', 'HtmlContentUrl')
+    SerpContent = apps.get_model('api', 'SerpContent')
+
+    duplicated = list(
+        Link.objects.values('url_hash').annotate(links=Count('id')).filter(links__gt=1).values_list('url_hash', flat=True)
+    )
+    for duplicated_hash in duplicated:
+        links = list(Link.objects.filter(url_hash=duplicated_hash).order_by('id'))
+        if len({normalize_url(link.url) for link in links}) > 1:
+            raise RuntimeError(
+                f'Different URLs share the hash {duplicated_hash}: {", ".join(link.url for link in links)}'
+            )
+        with_serp = set(SerpContent.objects.filter(link__in=links).values_list('link_id', flat=True))
+        keeper = next((link for link in links if link.id in with_serp), links[0])
+        others = [link.id for link in links if link.id != keeper.id]
+
+        totals = Link.objects.filter(url_hash=duplicated_hash).aggregate(
+            scrapes=Sum('scrape_count'), scraped=Max('last_scraped')
+        )
+        Link.objects.filter(pk=keeper.pk).update(
+            scrape_count=totals['scrapes'],
+            last_scraped=totals['scraped'],
+            is_active=any(link.is_active for link in links),
+        )
+        HtmlContentUrl.objects.filter(link_id__in=others).update(link_id=keeper.id)
+        # A page that listed two variants keeps its best-ranked entry
+        pages = HtmlContentUrl.objects.filter(link_id=keeper.id).values('html_content_id').annotate(
+            entries=Count('id')
+        ).filter(entries__gt=1)
+        for page in pages:
+            best = HtmlContentUrl.objects.filter(
+                link_id=keeper.id, html_content_id=page['html_content_id']
+            ).order_by('rank', 'id').first()
+            HtmlContentUrl.objects.filter(
+                link_id=keeper.id, html_content_id=page['html_content_id']
+            ).exclude(pk=best.pk).delete()
+        # Cascades to the SERP content of the variants, if any
+        Link.objects.filter(id__in=others).delete()
+
+
+class Migration(migrations.Migration):
+    # The data steps commit on their own: Postgres cannot alter a table with
+    # foreign key checks still pending from the same transaction
+    atomic = False
+
+    dependencies = [
+        ('api', '0020_dataset_releases'),
+    ]
+
+    operations = [
+        migrations.RunPython(rehash_links, migrations.RunPython.noop, atomic=True),
+        migrations.RunPython(merge_duplicate_links, migrations.RunPython.noop, atomic=True),
+        migrations.AlterField(
+            model_name='link',
+            name='url_hash',
+            field=models.BigIntegerField(editable=False, unique=True),
+        ),
+    ]
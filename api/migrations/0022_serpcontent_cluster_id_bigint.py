@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-19 07:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_link_url_hash_unique'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='serpcontent',
+            name='cluster_id',
+            field=models.BigIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+    ]
@@ -1,6 +1,18 @@
+import json
 import uuid
+import zlib
+from datetime import timezone as dt_timezone
+
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.utils import timezone
+
+from .coldstore import body, thaw
+from .normalize import normalize_url, url_hash
+from .text import PASSAGE_INDEX_VERSION, content_hash, passage_index, text_statistics
 
 class APIKey(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='api_keys')
@@ -11,6 +23,17 @@ class APIKey(models.Model):
     last_used = models.DateTimeField(null=True, blank=True)
     usage_count = models.IntegerField(default=0)
 
+    # Per-key limits enforced by api.ratelimit; empty values use settings.RATE_LIMIT
+    rate_limit = models.FloatField(
+        null=True, blank=True, help_text='Sustained requests per second (0 for unlimited)'
+    )
+    burst_limit = models.PositiveIntegerField(
+        null=True, blank=True, help_text='Requests that may be made at once before the rate applies'
+    )
+    max_in_flight = models.PositiveIntegerField(
+        null=True, blank=True, help_text='Concurrent requests allowed (0 for unlimited)'
+    )
+
     def save(self, *args, **kwargs):
         if not self.key:
             self.key = str(uuid.uuid4()).replace('-', '')
@@ -25,6 +48,22 @@ class Dataset(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
 
+    # Denormalized counters, kept current by api.counters; the URL counters
+    # are sums of the per-fact distinct counts
+    facts_count = models.IntegerField(default=0, editable=False)
+    questions_count = models.IntegerField(default=0, editable=False)
+    fetchable_questions_count = models.IntegerField(default=0, editable=False)
+    html_contents_count = models.IntegerField(default=0, editable=False)
+    linked_urls_count = models.IntegerField(default=0, editable=False)
+    serp_urls_count = models.IntegerField(default=0, editable=False)
+
+    @property
+    def serp_coverage(self):
+        """Share of linked URLs that have SERP content"""
+        if not self.linked_urls_count:
+            return None
+        return self.serp_urls_count / self.linked_urls_count
+
     def __str__(self):
         return self.name
 
@@ -33,27 +72,65 @@ class Fact(models.Model):
     fact_id = models.CharField(max_length=50)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Denormalized counters, kept current by api.counters
+    questions_count = models.IntegerField(default=0, editable=False)
+    fetchable_questions_count = models.IntegerField(default=0, editable=False)
+    avg_score = models.FloatField(null=True, blank=True, editable=False)
+    html_contents_count = models.IntegerField(default=0, editable=False)
+    linked_urls_count = models.IntegerField(default=0, editable=False)
+    serp_urls_count = models.IntegerField(default=0, editable=False)
+
     class Meta:
         unique_together = ['dataset', 'fact_id']
 
+    @property
+    def serp_coverage(self):
+        """Share of linked URLs that have SERP content"""
+        if not self.linked_urls_count:
+            return None
+        return self.serp_urls_count / self.linked_urls_count
+
     def __str__(self):
         return f"{self.dataset.name} - {self.fact_id}"
 
 
 class Question(models.Model):
     fact = models.ForeignKey(Fact, on_delete=models.CASCADE, related_name='questions')
+    # The fact's dataset, the partition key of the table (see api.partitions)
+    dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, related_name='+', editable=False, db_index=False)
     text = models.TextField()
     score = models.FloatField()
     is_fetchable = models.BooleanField(default=False)
 
+    def save(self, *args, **kwargs):
+        self.dataset_id = self.fact.dataset_id
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.fact} - {self.text}"
 
 
 
+class LinkQuerySet(models.QuerySet):
+    def for_url(self, url):
+        """Links whose normalized URL hashes like url (a single index probe)"""
+        return self.filter(url_hash=url_hash(url))
+
+    def lookup(self, url):
+        """Get the link for any variant of url (url_hash is unique)"""
+        link = self.for_url(url).first()
+        # Guard against the (unlikely) 64-bit hash collision
+        if link is None or normalize_url(link.url) != normalize_url(url):
+            raise self.model.DoesNotExist(f'No link matches {url}')
+        return link
+
+
 class Link(models.Model):
     """Model to index and manage URLs"""
-    url = models.URLField(max_length=2000, unique=True, db_index=True)
+    url = models.URLField(max_length=2000)
+    # Hash of the normalized URL, the lookup key for every URL variant; one
+    # link per normalized URL
+    url_hash = models.BigIntegerField(unique=True, editable=False)
     domain = models.CharField(max_length=255, db_index=True)
     title = models.CharField(max_length=500, blank=True)
     description = models.TextField(blank=True)
@@ -63,10 +140,10 @@ class Link(models.Model):
     last_scraped = models.DateTimeField(null=True, blank=True)
     scrape_count = models.IntegerField(default=0)
 
+    objects = LinkQuerySet.as_manager()
+
     class Meta:
         indexes = [
-            models.Index(fields=['url']),
-            models.Index(fields=['domain']),
             models.Index(fields=['is_active', 'created_at']),
         ]
 
@@ -75,6 +152,7 @@ class Link(models.Model):
             from urllib.parse import urlparse
             parsed = urlparse(self.url)
             self.domain = parsed.netloc
+            self.url_hash = url_hash(self.url)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -83,7 +161,17 @@ class Link(models.Model):
 
 class HtmlContent(models.Model):
     question = models.OneToOneField(Question, on_delete=models.CASCADE, related_name='html_content')
+    # The question's dataset, the partition key of the table
+    dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, related_name='+', editable=False, db_index=False)
     content = models.TextField()
+    # Results extracted from content by api.serp_parser when it is saved
+    structured = models.JSONField(null=True, blank=True, editable=False)
+    # Record of content in the cold store (api.coldstore) while it is moved
+    # out of the database by `manage.py tier_documents` (content is empty)
+    cold_segment = models.IntegerField(null=True, editable=False)
+    cold_offset = models.BigIntegerField(null=True, editable=False)
+    # Hash of content, written on save (api.releases fills in missing ones)
+    content_hash = models.CharField(max_length=32, null=True, editable=False)
 
     urls = models.ManyToManyField(
         Link,
@@ -92,6 +180,23 @@ class HtmlContent(models.Model):
         blank=True
     )
 
+    def save(self, *args, **kwargs):
+        self.dataset_id = self.question.dataset_id
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'content' in update_fields:
+            # Saving the content brings it back from the cold store
+            thaw(self, 'content')
+            self.content_hash = content_hash(self.content)
+        self.update_structured()
+        if update_fields is not None and 'content' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'structured', 'cold_segment', 'cold_offset', 'content_hash'}
+        super().save(*args, **kwargs)
+
+    def update_structured(self):
+        """Re-extract the organic results, featured snippet and knowledge panel"""
+        from .serp_parser import parse_serp
+        self.structured = parse_serp(self.content) if self.content else None
+
     def get_available_urls(self):
         """Get all fetchable URLs for this HTML content"""
         return self.urls.filter(
@@ -101,7 +206,7 @@ class HtmlContent(models.Model):
     def add_url(self, url_string, rank=0):
         """Add a URL to this HTML content"""
         # Create or get Link
-        link = Link.objects.get(url=url_string)
+        link = Link.objects.lookup(url_string)
 
         # Create or update relationship
         html_content_url, created = HtmlContentUrl.objects.get_or_create(
@@ -119,18 +224,32 @@ class HtmlContentUrl(models.Model):
     """Through model to manage relationship between HtmlContent and URLs"""
     html_content = models.ForeignKey(HtmlContent, on_delete=models.CASCADE)
     link = models.ForeignKey(Link, on_delete=models.CASCADE)
+    # The HTML content's dataset, the partition key of the table
+    dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, related_name='+', editable=False, db_index=False)
 
     rank = models.IntegerField(default=0)  # Lower number = higher priority
 
     class Meta:
         indexes = [models.Index(fields=['link'])]
 
+    def save(self, *args, **kwargs):
+        self.dataset_id = self.html_content.dataset_id
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.html_content.question.text[:30]} -> {self.link.url[:50]} | rank: {self.rank}"
 
 
 class SerpContent(models.Model):
     """Model to store scraped web content data"""
+    # Fields that API clients can request, in response order
+    SELECTABLE_FIELDS = (
+        'url', 'read_more_link', 'language', 'title', 'top_image', 'meta_img',
+        'images', 'movies', 'keywords', 'meta_keywords', 'tags', 'authors',
+        'publish_date', 'summary', 'meta_description', 'meta_lang', 'meta_favicon',
+        'meta_site_name', 'canonical_link', 'text',
+    )
+
     link = models.OneToOneField(Link, on_delete=models.CASCADE, related_name='serp_content')
 
     # Basic content fields
@@ -168,14 +287,66 @@ class SerpContent(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     scraped_at = models.DateTimeField(auto_now=True)
 
+    # Text statistics, computed on save so clients can plan context budgets
+    text_chars = models.IntegerField(default=0, editable=False)
+    text_words = models.IntegerField(default=0, editable=False)
+    text_tokens = models.IntegerField(default=0, editable=False)
+
+    # Full-text search document over title, summary and text, maintained by a
+    # database trigger using the text search config for `language`
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    # MinHash signature of text and near-duplicate cluster (the smallest id
+    # among its near-duplicates), computed by `manage.py cluster_duplicates`
+    minhash = models.BinaryField(null=True, editable=False)
+    cluster_id = models.BigIntegerField(null=True, blank=True, editable=False, db_index=True)
+
+    # Record of text in the cold store (api.coldstore) while it is moved out
+    # of the database by `manage.py tier_documents` (text is NULL)
+    cold_segment = models.IntegerField(null=True, editable=False)
+    cold_offset = models.BigIntegerField(null=True, editable=False)
+
+    # get_selected_fields() of every field as zlib-compressed JSON, written
+    # on save so that full documents are sent without encoding them again
+    # (empty until saved or built by `manage.py backfill_serp_payloads`)
+    payload = models.BinaryField(null=True, editable=False)
+    # Hash of the payload JSON, also kept for cold documents (see
+    # build_payload; api.releases fills in missing ones)
+    content_hash = models.CharField(max_length=32, null=True, editable=False)
+
     class Meta:
         indexes = [
-            models.Index(fields=['url']),
             models.Index(fields=['language']),
             models.Index(fields=['publish_date']),
             models.Index(fields=['created_at']),
+            GinIndex(fields=['search_vector'], name='api_serp_search_vector_gin'),
         ]
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'text' in update_fields:
+            # Saving the text brings it back from the cold store
+            thaw(self, 'text')
+        self.update_text_stats()
+        if update_fields is not None and 'text' in update_fields:
+            kwargs['update_fields'] = {
+                *update_fields, 'text_chars', 'text_words', 'text_tokens', 'minhash', 'cold_segment', 'cold_offset'
+            }
+        if update_fields is None or 'text' in update_fields:
+            # Signed again by the next cluster_duplicates run
+            self.minhash = None
+        if update_fields is None or not set(update_fields).isdisjoint(self.SELECTABLE_FIELDS):
+            self.build_payload()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'payload', 'content_hash'}
+        super().save(*args, **kwargs)
+        if update_fields is None or 'text' in update_fields:
+            PassageIndex.build(self)
+
+    def update_text_stats(self):
+        """Recompute character, word and approximate token counts of text"""
+        self.text_chars, self.text_words, self.text_tokens = text_statistics(self.text)
+
     def __str__(self):
         return f"{self.title or self.url} ({self.language})"
 
@@ -183,56 +354,145 @@ class SerpContent(models.Model):
         """Get only selected fields from the content"""
         if not fields:
             # Return all fields if none specified
-            return {
-                'url': self.url,
-                'read_more_link': self.read_more_link,
-                'language': self.language,
-                'title': self.title,
-                'top_image': self.top_image,
-                'meta_img': self.meta_img,
-                'images': self.images,
-                'movies': self.movies,
-                'keywords': self.keywords,
-                'meta_keywords': self.meta_keywords,
-                'tags': self.tags,
-                'authors': self.authors,
-                'publish_date': self.publish_date.isoformat() if self.publish_date else None,
-                'summary': self.summary,
-                'meta_description': self.meta_description,
-                'meta_lang': self.meta_lang,
-                'meta_favicon': self.meta_favicon,
-                'meta_site_name': self.meta_site_name,
-                'canonical_link': self.canonical_link,
-                'text': self.text,
-            }
+            fields = self.SELECTABLE_FIELDS
 
-        # Return only requested fields
+        # Only requested attributes are read, so deferred columns stay unloaded
         result = {}
-        field_mapping = {
-            'url': self.url,
-            'read_more_link': self.read_more_link,
-            'language': self.language,
-            'title': self.title,
-            'top_image': self.top_image,
-            'meta_img': self.meta_img,
-            'images': self.images,
-            'movies': self.movies,
-            'keywords': self.keywords,
-            'meta_keywords': self.meta_keywords,
-            'tags': self.tags,
-            'authors': self.authors,
-            'publish_date': self.publish_date.isoformat() if self.publish_date else None,
-            'summary': self.summary,
-            'meta_description': self.meta_description,
-            'meta_lang': self.meta_lang,
-            'meta_favicon': self.meta_favicon,
-            'meta_site_name': self.meta_site_name,
-            'canonical_link': self.canonical_link,
-            'text': self.text,
-        }
-
         for field in fields:
-            if field in field_mapping:
-                result[field] = field_mapping[field]
+            if field in self.SELECTABLE_FIELDS:
+                value = getattr(self, field)
+                if field == 'text' and value is None:
+                    value = body(self, 'text')
+                elif field == 'publish_date':
+                    value = value.isoformat() if value else None
+                result[field] = value
 
         return result
+
+    def document_json(self):
+        """The JSON of all selectable fields, as the payload stores it"""
+        data = self.get_selected_fields()
+        if self.publish_date:
+            # As it reads back from the database: aware, in UTC
+            publish_date = self.publish_date
+            if timezone.is_naive(publish_date):
+                publish_date = timezone.make_aware(publish_date)
+            data['publish_date'] = publish_date.astimezone(dt_timezone.utc).isoformat()
+        return json.dumps(data, cls=DjangoJSONEncoder).encode('ascii')
+
+    def build_payload(self):
+        """Store the JSON of all selectable fields in payload and its hash in
+        content_hash; cold documents have no payload, their text is read
+        when requested"""
+        document = self.document_json()
+        self.content_hash = content_hash(document)
+        self.payload = zlib.compress(document) if self.cold_segment is None else None
+
+    def payload_json(self):
+        """The JSON bytes stored by build_payload, or None when not built"""
+        return zlib.decompress(self.payload) if self.payload is not None else None
+
+
+class PassageIndex(models.Model):
+    """Passages of a SERP document's text with their term frequencies, kept
+    next to SerpContent so that ranking passages for a question (api.passages)
+    reads a few postings instead of whole documents"""
+    serp_content = models.OneToOneField(
+        SerpContent, on_delete=models.CASCADE, primary_key=True, related_name='passage_index'
+    )
+    version = models.IntegerField(default=PASSAGE_INDEX_VERSION)
+    # [start, end, tokens]: character span and token count of each passage
+    passages = models.JSONField(default=list)
+    # term -> passages it occurs in, see api.text.passage_index
+    postings = models.JSONField(default=dict)
+
+    @classmethod
+    def build(cls, serp_content):
+        """Create or replace the index of serp_content from its current text"""
+        passages, postings = passage_index(serp_content.text)
+        cls.objects.update_or_create(serp_content=serp_content, defaults={
+            'version': PASSAGE_INDEX_VERSION, 'passages': passages, 'postings': postings
+        })
+
+    def __str__(self):
+        return f"Passages of SERP content {self.serp_content_id}"
+
+
+class DatasetRelease(models.Model):
+    """A version of a dataset: the content hash of each of its facts when it
+    was ingested (api.releases), so clients can sync only what changed"""
+    dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, related_name='releases')
+    version = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Hash over all fact hashes: a release is only made when it changes
+    digest = models.CharField(max_length=32)
+    facts_count = models.IntegerField(default=0)
+    # Changes since the previous release
+    added_count = models.IntegerField(default=0)
+    changed_count = models.IntegerField(default=0)
+    removed_count = models.IntegerField(default=0)
+    # {fact_id: hash} as zlib-compressed JSON, sent as is by the manifest endpoint
+    manifest = models.BinaryField(editable=False)
+
+    class Meta:
+        unique_together = ['dataset', 'version']
+
+    def manifest_json(self):
+        return zlib.decompress(self.manifest)
+
+    def fact_hashes(self):
+        return json.loads(self.manifest_json())
+
+    def __str__(self):
+        return f"{self.dataset.name} release {self.version}"
+
+
+class Job(models.Model):
+    """Background job queued by the admin and run by `manage.py run_jobs`.
+
+    `state` holds the task's resume point (the last processed primary key
+    and any task data), saved after every chunk together with `progress`.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+        (CANCELLED, 'Cancelled'),
+    ]
+
+    kind = models.CharField(max_length=100)
+    description = models.CharField(max_length=255, blank=True)
+    params = models.JSONField(default=dict, blank=True)
+    state = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    progress = models.BigIntegerField(default=0)
+    total = models.BigIntegerField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.IntegerField(default=0)
+    worker = models.CharField(max_length=255, blank=True)
+    created_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    @property
+    def percent(self):
+        if self.status == self.SUCCEEDED:
+            return 100.0
+        if not self.total:
+            return None
+        return min(100.0, 100.0 * self.progress / self.total)
+
+    def __str__(self):
+        return f"#{self.pk} {self.description or self.kind} ({self.status})"
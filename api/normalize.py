@@ -0,0 +1,65 @@
+import hashlib
+import re
+import string
+from urllib.parse import quote, unquote, urlsplit, urlunsplit
+
+DEFAULT_PORTS = {'http': '80', 'https': '443'}
+
+# Characters that never need percent-encoding (RFC 3986 "unreserved")
+UNRESERVED = frozenset(string.ascii_letters + string.digits + '-._~')
+# Characters a path or a query may hold unencoded besides those
+PATH_SAFE = "/:@!$&'()*+,;="
+QUERY_SAFE = PATH_SAFE + '?'
+
+_ESCAPE = re.compile('%([0-9A-Fa-f]{2})')
+_STRAY_PERCENT = re.compile('%(?![0-9A-Fa-f]{2})')
+
+
+def _decode_unreserved(match):
+    char = chr(int(match.group(1), 16))
+    return char if char in UNRESERVED else f'%{match.group(1).upper()}'
+
+
+def normalize_component(component, safe):
+    """A path or query with one spelling per character: characters that need
+    it are percent-encoded (UTF-8), escapes of unreserved characters are
+    decoded, and other escapes are kept in upper case. Encoded delimiters
+    such as %2F, %3F or %23 are data, so they stay encoded."""
+    component = _STRAY_PERCENT.sub('%25', component)
+    return _ESCAPE.sub(_decode_unreserved, quote(component, safe=safe + '%'))
+
+
+def normalize_url(url):
+    """Canonical form of a URL used as its lookup key.
+
+    Variants that clients send for the same document normalize to the same
+    string: percent-encoded or not, with or without a trailing slash or
+    fragment, and with any case or default port in the scheme and host. The
+    URL is split before anything is decoded, so escaped delimiters do not
+    change its structure; a URL that was encoded as a whole is decoded once.
+    """
+    url = url.strip()
+    if '://' not in url and '://' in unquote(url):
+        url = unquote(url)
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').rstrip('.')
+    if ':' in host:
+        host = f'[{host}]'
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and str(port) != DEFAULT_PORTS.get(scheme):
+        host = f'{host}:{port}'
+    if parts.username:
+        host = f'{parts.username}@{host}'
+    path = normalize_component(parts.path, PATH_SAFE).rstrip('/') or '/'
+    query = normalize_component(parts.query, QUERY_SAFE)
+    return urlunsplit((scheme, host, path, query, ''))
+
+
+def url_hash(url):
+    """Signed 64-bit hash of the normalized URL, stored in Link.url_hash"""
+    digest = hashlib.blake2b(normalize_url(url).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
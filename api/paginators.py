@@ -0,0 +1,57 @@
+import json
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models.query import QuerySet
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that avoids COUNT(*) on very large tables.
+
+    Unfiltered querysets use the planner's row estimate for the table
+    (pg_class.reltuples), filtered ones the row estimate of EXPLAIN. Only when
+    the estimate is below `exact_count_threshold` is an exact COUNT run, so
+    small result sets still paginate precisely.
+    """
+    exact_count_threshold = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return super().count
+
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return super().count
+
+        if queryset.query.where:
+            estimate = self._explain_estimate(queryset, connection)
+        else:
+            estimate = self._table_estimate(queryset, connection)
+
+        if estimate is None or estimate < self.exact_count_threshold:
+            return super().count
+        return estimate
+
+    def _table_estimate(self, queryset, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [connection.ops.quote_name(queryset.model._meta.db_table)]
+            )
+            row = cursor.fetchone()
+        # reltuples is -1 (or 0) for tables that were never analyzed
+        if not row or row[0] <= 0:
+            return None
+        return int(row[0])
+
+    def _explain_estimate(self, queryset, connection):
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
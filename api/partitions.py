@@ -0,0 +1,239 @@
+"""
+Postgres list partitioning of the per-dataset tables by dataset.
+
+`Question`, `HtmlContent` and `HtmlContentUrl` carry their dataset
+(`dataset_id`, copied from the fact when a row is saved). After
+`manage.py partition_tables` each of them is a partitioned table with one
+partition per dataset and a default partition for datasets created since, so:
+
+- queries filtered on dataset_id read a single partition;
+- a dataset is cleared by swapping its three partitions for empty ones
+  instead of deleting row by row through the ORM cascade.
+
+Postgres requires the partition key in every unique constraint, so the
+primary keys become (id, dataset_id), the one-to-one constraint on
+HtmlContent.question_id becomes (question_id, dataset_id) and the foreign
+keys between the three tables reference (id, dataset_id). Django still
+treats `id` as the primary key; ids stay unique as they come from one
+identity sequence per table.
+
+Other databases (the embedded SQLite build) and unconverted tables keep
+working unchanged, without the pruning.
+"""
+from django.db import connection, transaction
+
+from .counters import datasets_changed, deferred_counters
+from .models import Fact, HtmlContent, HtmlContentUrl, Question
+
+# Referenced tables first
+PARTITIONED_MODELS = (Question, HtmlContent, HtmlContentUrl)
+PARTITION_KEY = 'dataset_id'
+
+
+def is_supported():
+    return connection.vendor == 'postgresql'
+
+
+def is_partitioned(model):
+    """Whether the model's table is a partitioned table"""
+    if not is_supported():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)', [model._meta.db_table]
+        )
+        return cursor.fetchone() is not None
+
+
+def partition_name(model, dataset_id=None):
+    """Partition of a dataset, or the default partition"""
+    suffix = f'dataset_{dataset_id}' if dataset_id is not None else 'default'
+    return f'{model._meta.db_table}_{suffix}'
+
+
+def partitions(model):
+    """{dataset id (None for the default partition): (partition, rows)} of a
+    partitioned table, with the row counts estimated by the planner"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname, c.reltuples FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = to_regclass(%s)', [model._meta.db_table]
+        )
+        rows = cursor.fetchall()
+    prefix = f'{model._meta.db_table}_dataset_'
+    return {
+        int(name[len(prefix):]) if name.startswith(prefix) else None: (name, max(int(count), 0))
+        for name, count in rows
+    }
+
+
+def _constraints(cursor, table):
+    """(name, type, definition) of the unique and foreign key constraints of a
+    table, leaving out the ones Postgres derives for each referenced partition"""
+    cursor.execute(
+        "SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype IN ('u', 'f') AND conparentid = 0 ORDER BY conname", [table]
+    )
+    return cursor.fetchall()
+
+
+def _references(cursor, table):
+    """(table, constraint, column) of the single-column foreign keys to a table"""
+    cursor.execute(
+        "SELECT c.conrelid::regclass::text, c.conname, a.attname FROM pg_constraint c "
+        "JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = c.conkey[1] "
+        "WHERE c.confrelid = %s::regclass AND c.contype = 'f' AND c.conparentid = 0 "
+        "AND array_length(c.conkey, 1) = 1",
+        [table]
+    )
+    return cursor.fetchall()
+
+
+def _indexes(cursor, table):
+    """Definitions of the indexes of a table that do not back a constraint"""
+    cursor.execute(
+        "SELECT pg_get_indexdef(i.indexrelid) FROM pg_index i WHERE i.indrelid = %s::regclass "
+        "AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)", [table]
+    )
+    return [definition for definition, in cursor.fetchall()]
+
+
+def _has_column(cursor, table, column):
+    cursor.execute(
+        'SELECT 1 FROM pg_attribute WHERE attrelid = %s::regclass AND attname = %s AND NOT attisdropped',
+        [table, column]
+    )
+    return cursor.fetchone() is not None
+
+
+def partition_table(model, dataset_ids):
+    """Turn the model's table into a table partitioned by dataset, with a
+    partition for each of dataset_ids and a default one. Rows are copied and
+    the indexes and constraints rebuilt (see the module docstring); returns
+    the foreign keys to the table that could not be kept, as
+    (table, constraint)."""
+    quote = connection.ops.quote_name
+    table = model._meta.db_table
+    old = f'{table}_unpartitioned'
+    pk = model._meta.pk.column
+    dropped = []
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        constraints = _constraints(cursor, table)
+        references = _references(cursor, table)
+        indexes = _indexes(cursor, table)
+
+        for referencing, name, _ in references:
+            cursor.execute(f'ALTER TABLE {referencing} DROP CONSTRAINT {quote(name)}')
+        cursor.execute(f'ALTER TABLE {quote(table)} RENAME TO {quote(old)}')
+        cursor.execute(
+            f'CREATE TABLE {quote(table)} (LIKE {quote(old)} INCLUDING DEFAULTS INCLUDING IDENTITY '
+            f'INCLUDING CONSTRAINTS) PARTITION BY LIST ({quote(PARTITION_KEY)})'
+        )
+        cursor.execute(f'CREATE TABLE {quote(partition_name(model))} PARTITION OF {quote(table)} DEFAULT')
+        for dataset_id in dataset_ids:
+            cursor.execute(
+                f'CREATE TABLE {quote(partition_name(model, dataset_id))} PARTITION OF {quote(table)} '
+                f'FOR VALUES IN (%s)', [dataset_id]
+            )
+        cursor.execute(f'INSERT INTO {quote(table)} SELECT * FROM {quote(old)}')
+        cursor.execute(f'DROP TABLE {quote(old)}')
+
+        # Continue the ids where the old sequence stopped, under its name
+        cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [table, pk])
+        sequence, = cursor.fetchone()
+        cursor.execute(
+            f'SELECT setval(%s, COALESCE((SELECT MAX({quote(pk)}) FROM {quote(table)}), 0) + 1, false)',
+            [sequence]
+        )
+        cursor.execute(f'ALTER SEQUENCE {sequence} RENAME TO {quote(f"{table}_{pk}_seq")}')
+
+        cursor.execute(
+            f'ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(f"{table}_pkey")} '
+            f'PRIMARY KEY ({quote(pk)}, {quote(PARTITION_KEY)})'
+        )
+        for name, kind, definition in constraints:
+            if kind == 'u':
+                # UNIQUE (question_id) -> UNIQUE (question_id, dataset_id)
+                definition = f'{definition.rstrip(")")}, {quote(PARTITION_KEY)})'
+            cursor.execute(f'ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} {definition}')
+        for definition in indexes:
+            cursor.execute(definition)
+
+        for referencing, name, column in references:
+            if not _has_column(cursor, referencing, PARTITION_KEY):
+                dropped.append((referencing, name))
+                continue
+            cursor.execute(
+                f'ALTER TABLE {referencing} ADD CONSTRAINT {quote(name)} '
+                f'FOREIGN KEY ({quote(column)}, {quote(PARTITION_KEY)}) '
+                f'REFERENCES {quote(table)} ({quote(pk)}, {quote(PARTITION_KEY)}) DEFERRABLE INITIALLY DEFERRED'
+            )
+    return dropped
+
+
+def add_partitions(model, dataset_ids):
+    """Create the missing partitions of datasets, moving their rows out of
+    the default partition; returns the partitions created"""
+    quote = connection.ops.quote_name
+    table = model._meta.db_table
+    default = partition_name(model)
+    existing = partitions(model)
+    created = []
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        for dataset_id in dataset_ids:
+            if dataset_id in existing:
+                continue
+            name = partition_name(model, dataset_id)
+            # Attaching checks that the default partition has no rows of the
+            # dataset left, so they are moved into the new table first (the
+            # foreign keys to the moved rows are checked at commit)
+            cursor.execute(
+                f'CREATE TABLE {quote(name)} (LIKE {quote(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+            )
+            cursor.execute(
+                f'WITH moved AS (DELETE FROM {quote(default)} WHERE {quote(PARTITION_KEY)} = %s RETURNING *) '
+                f'INSERT INTO {quote(name)} SELECT * FROM moved', [dataset_id]
+            )
+            cursor.execute(
+                f'ALTER TABLE {quote(table)} ATTACH PARTITION {quote(name)} FOR VALUES IN (%s)', [dataset_id]
+            )
+            created.append(name)
+    return created
+
+
+def clear_dataset(dataset):
+    """Delete the facts of a dataset with their questions, HTML contents and
+    links to URLs.
+
+    When the tables are partitioned, the dataset's partitions are swapped for
+    empty ones: each is detached and dropped (TRUNCATE is not allowed on a
+    partition that the next table's foreign key references), referencing
+    tables first, and then created again. Otherwise each table's rows of the
+    dataset are removed with one DELETE, without the ORM's per-row cascade
+    and signals. The counters of the dataset are refreshed once.
+    """
+    quote = connection.ops.quote_name
+    swap = all(is_partitioned(model) and dataset.id in partitions(model) for model in PARTITIONED_MODELS)
+
+    with deferred_counters(), transaction.atomic():
+        if swap:
+            with connection.cursor() as cursor:
+                for model in reversed(PARTITIONED_MODELS):
+                    name = quote(partition_name(model, dataset.id))
+                    cursor.execute(f'ALTER TABLE {quote(model._meta.db_table)} DETACH PARTITION {name}')
+                    cursor.execute(f'DROP TABLE {name}')
+                for model in PARTITIONED_MODELS:
+                    cursor.execute(
+                        f'CREATE TABLE {quote(partition_name(model, dataset.id))} '
+                        f'PARTITION OF {quote(model._meta.db_table)} FOR VALUES IN (%s)', [dataset.id]
+                    )
+        else:
+            with connection.cursor() as cursor:
+                for model in reversed(PARTITIONED_MODELS):
+                    cursor.execute(
+                        f'DELETE FROM {quote(model._meta.db_table)} WHERE {quote(PARTITION_KEY)} = %s', [dataset.id]
+                    )
+        Fact.objects.filter(dataset=dataset).delete()
+        datasets_changed([dataset.id])
@@ -0,0 +1,207 @@
+"""
+BM25 ranking of the passages of a question's evidence documents.
+
+The documents are the SERP contents linked from the question's results page.
+Their passages and term frequencies are precomputed (`PassageIndex`), so a
+ranking reads only the postings of the question's terms, scores every passage
+at once with numpy and fetches the text of the selected passages alone.
+Document frequencies and the average passage length are taken over the
+question's own passages.
+"""
+import math
+
+import numpy as np
+from django.db.models import Case, F, Func, TextField, When
+from django.db.models.functions import Substr
+
+from .coldstore import COLD_COLUMNS, cold_store
+from .duplicates import collapse_duplicates
+from .models import HtmlContentUrl, PassageIndex, SerpContent
+from .text import CHARS_PER_TOKEN, PASSAGE_INDEX_VERSION, parse_postings, passage_index
+
+DEFAULT_TOP_K = 10
+MAX_TOP_K = 100
+# Usual BM25 parameters
+K1 = 1.2
+B = 0.75
+
+
+class TermPostings(Func):
+    """Postings string of one term in PassageIndex.postings. Unlike
+    KeyTextTransform, numeric terms (years, counts) are looked up as object
+    keys rather than array indexes."""
+    output_field = TextField()
+
+    def __init__(self, term):
+        super().__init__(F('postings'))
+        self.term = term
+
+    def as_sql(self, compiler, connection, **extra_context):
+        postings, params = compiler.compile(self.source_expressions[0])
+        return f'({postings} ->> %s::text)', (*params, self.term)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        postings, params = compiler.compile(self.source_expressions[0])
+        # Terms are word characters only, so they can be quoted in the path
+        return f'json_extract({postings}, %s)', (*params, f'$."{self.term}"')
+
+
+def question_documents(question, collapse=False):
+    """Active links of a question's results page that have SERP content, in
+    rank order and annotated with serp_content_id, each document once (and
+    with collapse, only the best-ranked of near-duplicate documents)"""
+    html_urls = HtmlContentUrl.objects.filter(
+        dataset_id=question.dataset_id, html_content__question=question,
+        link__is_active=True, link__serp_content__isnull=False
+    ).select_related('link').only(
+        'id', 'rank', 'link__id', 'link__url', 'link__domain', 'link__title'
+    ).annotate(
+        serp_content_id=F('link__serp_content__id'),
+        cluster_id=F('link__serp_content__cluster_id')
+    ).order_by('rank', 'id')
+
+    documents = {}
+    for html_url in html_urls:
+        documents.setdefault(html_url.serp_content_id, html_url)
+    if collapse:
+        return [
+            html_url for html_url, _ in collapse_duplicates(
+                documents.values(), lambda html_url: html_url.cluster_id, lambda html_url: html_url.link.url
+            )
+        ]
+    return list(documents.values())
+
+
+def load_postings(serp_content_ids, terms):
+    """{serp_content_id: (passages, (passage, frequency) pairs of each term)}.
+    Only the postings of the given terms are read from the indexes; documents
+    without a current index are indexed on the fly (not saved, see
+    backfill_passages)."""
+    columns = {f'term_{number}': TermPostings(term) for number, term in enumerate(terms)}
+    indexes = PassageIndex.objects.filter(
+        serp_content_id__in=serp_content_ids, version=PASSAGE_INDEX_VERSION
+    ).annotate(**columns).values('serp_content_id', 'passages', *columns)
+    loaded = {
+        row['serp_content_id']: (row['passages'], [parse_postings(row[name]) for name in columns])
+        for row in indexes
+    }
+
+    missing = [serp_content_id for serp_content_id in serp_content_ids if serp_content_id not in loaded]
+    for serp_content_id, text, segment, offset in SerpContent.objects.filter(id__in=missing).values_list(
+        'id', 'text', *COLD_COLUMNS
+    ):
+        if segment is not None:
+            text = cold_store.read(segment, offset)
+        passages, postings = passage_index(text)
+        loaded[serp_content_id] = (passages, [parse_postings(postings.get(term)) for term in terms])
+    return loaded
+
+
+def bm25_scores(frequencies, lengths):
+    """BM25 score of each row of a passages x terms frequency matrix"""
+    count = len(lengths)
+    document_frequencies = np.count_nonzero(frequencies, axis=0)
+    idf = np.log1p((count - document_frequencies + 0.5) / (document_frequencies + 0.5))
+    average = lengths.mean() or 1.0
+    norms = K1 * (1 - B + B * lengths / average)
+    return (idf * frequencies * (K1 + 1) / (frequencies + norms[:, None])).sum(axis=1)
+
+
+def rank_passages(documents, terms, top_k=DEFAULT_TOP_K, max_chars=None, max_tokens=None):
+    """The top_k passages of documents (from question_documents) for the
+    query terms, best first, that fit together within max_chars characters
+    and max_tokens approximate tokens. Returns (passages, passages considered).
+
+    Each passage carries the `link_id` of its document, for the caller to
+    record the scrape and remove, as for evidence bundles.
+    """
+    loaded = load_postings([document.serp_content_id for document in documents], terms)
+
+    # One entry per passage of every document: its document, number and span
+    owners, numbers, spans = [], [], []
+    rows = []
+    for document in documents:
+        passages, term_postings = loaded.get(document.serp_content_id, ([], []))
+        offset = len(spans)
+        owners.extend([document] * len(passages))
+        numbers.extend(range(len(passages)))
+        spans.extend(passages)
+        for column, postings in enumerate(term_postings):
+            rows.extend((offset + number, column, frequency) for number, frequency in postings)
+    if not spans or not terms:
+        return [], len(spans)
+
+    frequencies = np.zeros((len(spans), len(terms)), dtype=np.float64)
+    if rows:
+        row_index, column_index, values = np.array(rows, dtype=np.int64).T
+        frequencies[row_index, column_index] = values
+    lengths = np.array([tokens for _, _, tokens in spans], dtype=np.float64)
+    scores = bm25_scores(frequencies, lengths)
+
+    selected = []
+    chars_left = max_chars if max_chars is not None else math.inf
+    tokens_left = max_tokens if max_tokens is not None else math.inf
+    for index in np.argsort(-scores, kind='stable'):
+        if len(selected) >= top_k or scores[index] <= 0:
+            break
+        start, end, _ = spans[index]
+        chars = end - start
+        tokens = math.ceil(chars / CHARS_PER_TOKEN)
+        if chars > chars_left or tokens > tokens_left:
+            # A shorter passage further down may still fit
+            continue
+        chars_left -= chars
+        tokens_left -= tokens
+        document = owners[index]
+        selected.append({
+            'serp_content_id': document.serp_content_id,
+            'url': document.link.url,
+            'domain': document.link.domain,
+            'title': document.link.title,
+            'link_id': document.link.id,
+            'rank': document.rank,
+            'passage': numbers[index],
+            'start': start,
+            'end': end,
+            'score': round(float(scores[index]), 4),
+            'chars': chars,
+            'tokens': tokens,
+        })
+
+    texts = passage_texts(selected)
+    for number, passage in enumerate(selected):
+        passage['text'] = texts.get(number, '')
+        del passage['serp_content_id']
+    return selected, len(spans)
+
+
+def passage_texts(passages):
+    """{position in passages: text}, sliced from the documents by the
+    database so that only the passages are transferred (or from the cold
+    store for documents moved there)"""
+    if not passages:
+        return {}
+    columns = {
+        f'passage_{number}': Case(
+            When(
+                id=passage['serp_content_id'],
+                then=Substr('text', passage['start'] + 1, passage['end'] - passage['start'])
+            ),
+            output_field=TextField()
+        )
+        for number, passage in enumerate(passages)
+    }
+    texts = {}
+    for row in SerpContent.objects.filter(
+        id__in={passage['serp_content_id'] for passage in passages}
+    ).annotate(**columns).values('id', *COLD_COLUMNS, *columns):
+        if row['cold_segment'] is not None:
+            text = cold_store.read(row['cold_segment'], row['cold_offset'])
+            for number, passage in enumerate(passages):
+                if passage['serp_content_id'] == row['id']:
+                    texts[number] = text[passage['start']:passage['end']]
+            continue
+        for name in columns:
+            if row[name] is not None:
+                texts[int(name.rsplit('_', 1)[1])] = row[name]
+    return texts
@@ -0,0 +1,185 @@
+"""
+The question page response (`api_fact_question_page`) built by Postgres.
+
+One query selects the question, its results page and the ranked links with
+their SERP statistics and renders the JSON document as text, which is sent
+as is: no model instances and no dicts are made for the links. The text
+matches JsonResponse's output byte for byte:
+
+- keys in the same order with the `", "` and `": "` separators of json.dumps;
+- strings escaped by to_json, with the non-ASCII characters that json.dumps
+  escapes (ensure_ascii) converted afterwards by encode_basestring_ascii;
+- floats as Python prints them (1.0 rather than Postgres' 1);
+- datetimes as datetime.isoformat() in UTC.
+
+Pages that this cannot serve (another database, an invalid rank, a question
+without HTML, structured results not extracted yet, HTML moved to the cold
+store) return None, and the view builds them with the ORM as before.
+"""
+import re
+from json.encoder import encode_basestring_ascii
+
+from django.conf import settings
+from django.db import connection
+
+from .models import HtmlContent, HtmlContentUrl, Link, Question, SerpContent
+
+# What json.dumps escapes and to_json leaves as is: DEL and non-ASCII
+UNESCAPED_RE = re.compile('[\x7f-\U0010ffff]+')
+
+
+def _string(expression):
+    return f"COALESCE(to_json({expression})::text, 'null')"
+
+
+def _number(expression):
+    return f"COALESCE(({expression})::text, 'null')"
+
+
+def _float(expression):
+    # Python prints integral floats with '.0'; NaN and Infinity are spelled
+    # the same (scores between 1e15 and 1e16 would print differently)
+    return (
+        f"COALESCE(CASE WHEN ({expression})::text ~ '^-?[0-9]+$' THEN ({expression})::text || '.0' "
+        f"ELSE ({expression})::text END, 'null')"
+    )
+
+
+def _boolean(expression):
+    return f"COALESCE(CASE WHEN {expression} THEN 'true' ELSE 'false' END, 'null')"
+
+
+def _datetime(expression):
+    # isoformat() leaves out zero microseconds
+    utc = f"({expression} AT TIME ZONE 'UTC')"
+    return (
+        f"COALESCE('\"' || to_char({utc}, 'YYYY-MM-DD\"T\"HH24:MI:SS') || "
+        f"CASE WHEN to_char({utc}, 'US') = '000000' THEN '' ELSE '.' || to_char({utc}, 'US') END || "
+        f"'+00:00\"', 'null')"
+    )
+
+
+def _object(*pairs):
+    """SQL concatenation rendering a JSON object from (key, SQL value) pairs"""
+    parts = []
+    for number, (key, value) in enumerate(pairs):
+        prefix = ('{' if number == 0 else ', ') + f'"{key}": '
+        parts.append(f"'{prefix}' || {value}")
+    return ' || '.join(parts) + " || '}'"
+
+
+def ascii_json(document):
+    """document (text from Postgres) as the bytes json.dumps would write"""
+    if document.isascii() and '\x7f' not in document:
+        return document.encode('ascii')
+    return UNESCAPED_RE.sub(lambda match: encode_basestring_ascii(match.group())[1:-1], document).encode('ascii')
+
+
+def question_page_sql(include_html, collapse):
+    quote = connection.ops.quote_name
+    tables = {
+        name: quote(model._meta.db_table)
+        for name, model in [
+            ('question', Question), ('html_content', HtmlContent), ('html_content_url', HtmlContentUrl),
+            ('link', Link), ('serp_content', SerpContent),
+        ]
+    }
+
+    # Whether the page needs the ORM path: the content is in the cold store
+    # (api.coldstore) or results are to be extracted from it
+    if include_html == 'structured':
+        html = "'{\"structured\": ' || COALESCE(page.structured::text, 'null') || '}'"
+        fallback = 'page.structured IS NULL AND (octet_length(page.content) > 0 OR page.cold_segment IS NOT NULL)'
+    elif include_html:
+        html = f"'{{\"content\": ' || {_string('page.content')} || '}}'"
+        fallback = 'page.cold_segment IS NOT NULL'
+    else:
+        html = "'null'"
+        fallback = 'FALSE'
+
+    url_fields = [
+        ('url', _string('u.url')),
+        ('domain', _string('u.domain')),
+        ('title', _string('u.title')),
+        ('description', _string('u.description')),
+        ('rank', _number('u.rank')),
+        ('scrape_count', _number('u.scrape_count')),
+        ('last_scraped', _datetime('u.last_scraped')),
+        ('has_serp_content', _boolean('u.serp_content_id IS NOT NULL')),
+        ('text_chars', _number('u.text_chars')),
+        ('text_words', _number('u.text_words')),
+        ('text_tokens', _number('u.text_tokens')),
+    ]
+    kept = 'TRUE'
+    if collapse:
+        # Near-duplicates of a better-ranked link are listed in its entry
+        # (api.duplicates.collapse_duplicates)
+        url_fields.append(('duplicates', (
+            "'[' || COALESCE((SELECT string_agg(to_json(d.url)::text, ', ' ORDER BY d.rank, d.id) "
+            "FROM urls d WHERE d.cluster_id = u.cluster_id AND d.position > 1), '') || ']'"
+        )))
+        kept = 'u.cluster_id IS NULL OR u.position = 1'
+
+    document = _object(
+        ('success', "'true'"),
+        ('dataset', _string('%(dataset_name)s::text')),
+        ('fact_id', _string('%(fact_id)s::text')),
+        ('question_rank', _number('%(rank)s::integer')),
+        ('question', _object(
+            ('text', _string('question.text')),
+            ('score', _float('question.score')),
+            ('is_fetchable', _boolean('question.is_fetchable')),
+        )),
+        ('html_content', html),
+        ('available_urls', "'[' || COALESCE(items.urls, '') || ']'"),
+        ('total_urls', _number('items.total')),
+    )
+
+    return f"""
+        WITH question AS (
+            SELECT id, text, score, is_fetchable FROM {tables['question']}
+            WHERE fact_id = %(fact)s AND dataset_id = %(dataset)s AND is_fetchable
+            ORDER BY score DESC
+            LIMIT 1 OFFSET %(rank)s
+        ), page AS (
+            SELECT h.id, h.content, h.structured, h.cold_segment FROM {tables['html_content']} h
+            JOIN question ON h.question_id = question.id
+            WHERE h.dataset_id = %(dataset)s
+        ), urls AS (
+            SELECT hu.id, hu.rank, l.url, l.domain, l.title, l.description, l.scrape_count, l.last_scraped,
+                   s.id AS serp_content_id, s.text_chars, s.text_words, s.text_tokens, s.cluster_id,
+                   row_number() OVER (PARTITION BY s.cluster_id ORDER BY hu.rank, hu.id) AS position
+            FROM {tables['html_content_url']} hu
+            JOIN page ON hu.html_content_id = page.id
+            JOIN {tables['link']} l ON l.id = hu.link_id
+            LEFT JOIN {tables['serp_content']} s ON s.link_id = l.id
+            WHERE hu.dataset_id = %(dataset)s AND l.is_active
+        ), items AS (
+            SELECT string_agg({_object(*url_fields)}, ', ' ORDER BY u.rank, u.id) AS urls, count(*) AS total
+            FROM urls u WHERE {kept}
+        )
+        SELECT {fallback}, {document}
+        FROM question JOIN page ON TRUE CROSS JOIN items
+    """
+
+
+def question_page_json(fact, dataset_name, fact_id, question_rank, include_html, collapse):
+    """The question page response body, or None when the ORM path must
+    build it (see the module docstring)"""
+    if connection.vendor != 'postgresql' or not settings.QUESTION_PAGE_JSON_IN_DB or question_rank < 0:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(question_page_sql(include_html, collapse), {
+            'fact': fact.pk,
+            'dataset': fact.dataset_id,
+            'dataset_name': dataset_name,
+            'fact_id': fact_id,
+            'rank': question_rank,
+        })
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    fallback, document = row
+    if fallback:
+        return None
+    return ascii_json(document)
@@ -0,0 +1,141 @@
+import json
+
+from django.db.models import FilteredRelation, Q
+
+from .models import Fact
+
+DEFAULT_QUESTIONS_LIMIT = 5000
+MAX_QUESTIONS_LIMIT = 100000
+MAX_FACT_IDS = 5000
+# Responses allowed to hold more questions than this are streamed
+STREAM_QUESTIONS_THRESHOLD = 5000
+
+
+def fact_question_rows(dataset, fact_ids=None, prefix=None, after=None):
+    """Questions of many facts from a single query, grouped by fact_id and
+    ranked by score. Facts without questions appear as one row of NULLs."""
+    facts = Fact.objects.filter(dataset=dataset)
+    if fact_ids is not None:
+        facts = facts.filter(fact_id__in=fact_ids)
+    if prefix:
+        facts = facts.filter(fact_id__startswith=prefix)
+    if after:
+        facts = facts.filter(fact_id__gt=after)
+
+    # The dataset in the join condition limits it to the dataset's partition
+    facts = facts.annotate(
+        dataset_questions=FilteredRelation('questions', condition=Q(questions__dataset=dataset))
+    )
+    return facts.order_by('fact_id', '-dataset_questions__score', 'dataset_questions__id').values_list(
+        'fact_id', 'dataset_questions__id', 'dataset_questions__text', 'dataset_questions__score',
+        'dataset_questions__is_fetchable'
+    )
+
+
+class FactQuestionGroups:
+    """Iterate (fact_id, questions) pairs from fact_question_rows, reading at
+    most `limit` question rows.
+
+    Only complete facts are yielded; when the limit cuts a fact short it is
+    left out and `truncated` is set, so `last_fact_id` can be passed back as
+    `after` to continue. A first fact with more questions than the limit is
+    read again on its own with `fact_rows(fact_id)` and yielded whole, so
+    paging always moves forward without dropping questions; only a fact
+    with more than MAX_QUESTIONS_LIMIT questions is cut short, with
+    `partial` set.
+    """
+
+    def __init__(self, rows, limit, stream=False, fact_rows=None):
+        self.rows = rows
+        self.limit = limit
+        self.stream = stream
+        self.fact_rows = fact_rows
+        self.truncated = False
+        self.partial = False
+        self.last_fact_id = None
+        self.facts_count = 0
+        self.questions_count = 0
+        self.seen_fact_ids = set()
+
+    def _read(self, rows):
+        return rows.iterator(chunk_size=2000) if self.stream else rows
+
+    def __iter__(self):
+        rows = self._read(self.rows[:self.limit + 1])
+        current, questions = None, []
+        for index, (fact_id, question_id, text, score, is_fetchable) in enumerate(rows):
+            if index == self.limit:
+                self.truncated = True
+                # The current fact is complete if the extra row starts a new one
+                if fact_id == current and self.facts_count:
+                    current = None
+                elif fact_id == current:
+                    questions = self._whole_fact(current)
+                break
+
+            if fact_id != current:
+                if current is not None:
+                    yield self._emit(current, questions)
+                current, questions = fact_id, []
+            if question_id is not None:
+                questions.append(self._question(len(questions), text, score, is_fetchable))
+
+        if current is not None:
+            yield self._emit(current, questions)
+
+    def _whole_fact(self, fact_id):
+        """Questions of a fact that is over the limit on its own, at most
+        MAX_QUESTIONS_LIMIT of them"""
+        questions = []
+        for _, _, text, score, is_fetchable in self._read(self.fact_rows(fact_id)[:MAX_QUESTIONS_LIMIT + 1]):
+            if len(questions) == MAX_QUESTIONS_LIMIT:
+                self.partial = True
+                break
+            questions.append(self._question(len(questions), text, score, is_fetchable))
+        return questions
+
+    @staticmethod
+    def _question(fetch_id, text, score, is_fetchable):
+        return {
+            'fetch_id': fetch_id,
+            'text': text,
+            'score': score,
+            'is_fetchable': is_fetchable
+        }
+
+    def _emit(self, fact_id, questions):
+        self.facts_count += 1
+        self.questions_count += len(questions)
+        self.last_fact_id = fact_id
+        self.seen_fact_ids.add(fact_id)
+        return fact_id, questions
+
+
+def render_fact_questions(dataset_name, groups, fact_ids=None, after=None):
+    """Encode the bulk questions response as JSON text chunks, one per fact,
+    so large responses can be streamed without building them in memory.
+
+    Requested fact_ids that do not exist are listed under `missing` only
+    when the whole selection fits in one response (no `after`, not truncated).
+    """
+    yield json.dumps({'success': True, 'dataset': dataset_name})[:-1] + ', "facts": ['
+
+    for index, (fact_id, questions) in enumerate(groups):
+        yield (', ' if index else '') + json.dumps({
+            'fact_id': fact_id,
+            'questions': questions,
+            'count': len(questions)
+        })
+
+    missing = None
+    if fact_ids is not None and after is None and not groups.truncated:
+        missing = sorted(set(fact_ids) - groups.seen_fact_ids)
+
+    yield '], ' + json.dumps({
+        'facts_count': groups.facts_count,
+        'count': groups.questions_count,
+        'truncated': groups.truncated,
+        'partial': groups.partial,
+        'next_after': groups.last_fact_id if groups.truncated else None,
+        'missing': missing
+    })[1:]
@@ -0,0 +1,289 @@
+import fcntl
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from django.utils.module_loading import import_string
+
+from .models import APIKey
+
+
+class BaseRateLimitBackend:
+    """Token bucket plus in-flight counter per API key.
+
+    `acquire` returns None when the request may proceed (and counts it as in
+    flight until `release`), otherwise the number of seconds to wait.
+    """
+
+    def acquire(self, key_id, rate, burst, max_in_flight):
+        raise NotImplementedError
+
+    def release(self, key_id):
+        raise NotImplementedError
+
+
+class SharedMemoryBackend(BaseRateLimitBackend):
+    """Limiter state in a memory-mapped file shared by all workers of a host.
+
+    The file holds a fixed open-addressing table of per-key slots, guarded by
+    an fcntl lock, so every gunicorn worker sees the same buckets. In-flight
+    counts that were never released (a worker killed mid-request) are reset
+    once the key has been idle for `stale_after` seconds. When every slot is
+    taken, a new key takes over the slot idle the longest; if none has been
+    idle that long, its requests are rejected until one has.
+    """
+    slot = struct.Struct('<qddiid')  # key id, tokens, refilled at, in flight, unused, active at
+
+    def __init__(self, path=None, slots=4096, stale_after=150.0):
+        self.path = path or os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else '/tmp', 'mockapi-ratelimit')
+        self.slots = slots
+        self.stale_after = stale_after
+        self._pid = None
+        self._map = None
+        self._fd = None
+        # fcntl locks are per process, so threads of one worker also need this
+        self._thread_lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        with self._thread_lock:
+            # Opened lazily and re-opened after fork, never shared across processes
+            if self._pid != os.getpid():
+                size = self.slot.size * self.slots
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+                if os.fstat(self._fd).st_size < size:
+                    os.ftruncate(self._fd, size)
+                self._map = mmap.mmap(self._fd, size)
+                self._pid = os.getpid()
+
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                yield self._map
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+    def _find(self, table, key_id, now=None):
+        """Offset of the slot for key_id; with now, claims an empty slot or
+        else the one idle longest beyond stale_after, and None if there is none"""
+        start = key_id % self.slots
+        stale_offset, stale_since = None, None
+        for probe in range(self.slots):
+            offset = ((start + probe) % self.slots) * self.slot.size
+            slot_key, _, _, _, _, active_at = self.slot.unpack_from(table, offset)
+            if slot_key == key_id or (slot_key == 0 and now is not None):
+                return offset
+            if slot_key == 0:
+                # Slots are never emptied, so key_id has none
+                return None
+            if now is not None and now - active_at > self.stale_after and (
+                stale_since is None or active_at < stale_since
+            ):
+                stale_offset, stale_since = offset, active_at
+        # Table full: take over an idle key's slot (its state is reset) rather
+        # than share one, which would leave both keys unlimited
+        return stale_offset
+
+    def acquire(self, key_id, rate, burst, max_in_flight):
+        now = time.monotonic()
+        with self._locked() as table:
+            offset = self._find(table, key_id, now)
+            if offset is None:
+                return 1.0
+            slot_key, tokens, refilled_at, in_flight, _, active_at = self.slot.unpack_from(table, offset)
+            if slot_key != key_id:
+                tokens, refilled_at, in_flight, active_at = float(burst), now, 0, now
+
+            if in_flight and now - active_at > self.stale_after:
+                in_flight = 0
+
+            retry_after = None
+            if rate:
+                tokens = min(float(burst), tokens + (now - refilled_at) * rate)
+            if max_in_flight and in_flight >= max_in_flight:
+                retry_after = 1.0
+            elif rate and tokens < 1:
+                retry_after = (1 - tokens) / rate
+            else:
+                if rate:
+                    tokens -= 1
+                in_flight += 1
+                active_at = now
+
+            self.slot.pack_into(table, offset, key_id, tokens, now, in_flight, 0, active_at)
+        return retry_after
+
+    def release(self, key_id):
+        with self._locked() as table:
+            offset = self._find(table, key_id)
+            if offset is None:
+                return
+            slot_key, tokens, refilled_at, in_flight, _, active_at = self.slot.unpack_from(table, offset)
+            if slot_key == key_id and in_flight > 0:
+                self.slot.pack_into(table, offset, key_id, tokens, refilled_at, in_flight - 1, 0, active_at)
+
+
+class CacheBackend(BaseRateLimitBackend):
+    """Limiter state in a Django cache (e.g. Redis or Memcached), for
+    deployments running workers on several hosts.
+
+    Bucket updates are serialized with a short-lived cache.add() lock; if the
+    lock cannot be taken quickly the request is allowed rather than delayed.
+    """
+
+    def __init__(self, alias='default', prefix='ratelimit', lock_timeout=0.05, stale_after=150):
+        self.alias = alias
+        self.prefix = prefix
+        self.lock_timeout = lock_timeout
+        self.stale_after = stale_after
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def acquire(self, key_id, rate, burst, max_in_flight):
+        in_flight_key = f'{self.prefix}:{key_id}:in_flight'
+        if max_in_flight:
+            if self._increment(in_flight_key) > max_in_flight:
+                self._decrement(in_flight_key)
+                return 1.0
+
+        retry_after = self._take_token(key_id, rate, burst) if rate else None
+        if retry_after is not None:
+            if max_in_flight:
+                self._decrement(in_flight_key)
+            return retry_after
+
+        if max_in_flight:
+            # Keep the counter alive while requests are running
+            self.cache.touch(in_flight_key, self.stale_after)
+        return None
+
+    def _increment(self, key):
+        """incr() of a counter that may expire at any time"""
+        for _ in range(3):
+            self.cache.add(key, 0, self.stale_after)
+            try:
+                return self.cache.incr(key)
+            except ValueError:
+                # Expired between add() and incr()
+                continue
+        self.cache.set(key, 1, self.stale_after)
+        return 1
+
+    def _decrement(self, key):
+        try:
+            self.cache.decr(key)
+        except ValueError:
+            # Counter expired while the request was running
+            pass
+
+    def _take_token(self, key_id, rate, burst):
+        lock_key = f'{self.prefix}:{key_id}:lock'
+        bucket_key = f'{self.prefix}:{key_id}:bucket'
+        deadline = time.time() + self.lock_timeout
+        while not self.cache.add(lock_key, 1, 1):
+            if time.time() > deadline:
+                return None
+            time.sleep(0.002)
+        try:
+            now = time.time()
+            tokens, refilled_at = self.cache.get(bucket_key, (float(burst), now))
+            tokens = min(float(burst), tokens + (now - refilled_at) * rate)
+            if tokens < 1:
+                self.cache.set(bucket_key, (tokens, now), self.stale_after)
+                return (1 - tokens) / rate
+            self.cache.set(bucket_key, (tokens - 1, now), self.stale_after)
+            return None
+        finally:
+            self.cache.delete(lock_key)
+
+    def release(self, key_id):
+        self._decrement(f'{self.prefix}:{key_id}:in_flight')
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                config = settings.RATE_LIMIT
+                backend_class = import_string(config['BACKEND'])
+                _backend = backend_class(**config.get('OPTIONS', {}))
+    return _backend
+
+
+class RateLimitMiddleware:
+    """Reject API requests over their key's rate or concurrency limit with a
+    429 before the view runs.
+
+    Key limits are cached per worker for LIMITS_TTL seconds, so an over-limit
+    request costs no database query. Unknown keys are passed through and get
+    their 401 from the view, as are keys without any limit.
+    """
+    LIMITS_TTL = 30.0
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.limits = {}
+
+    def __call__(self, request):
+        if not request.path.startswith('/api/') or request.path.startswith('/api/create-key/'):
+            return self.get_response(request)
+
+        key = request.headers.get('X-API-Key') or request.GET.get('api_key')
+        limits = self.get_limits(key) if key else None
+        if limits is None:
+            return self.get_response(request)
+
+        key_id, rate, burst, max_in_flight = limits
+        backend = get_backend()
+        retry_after = backend.acquire(key_id, rate, burst, max_in_flight)
+        if retry_after is not None:
+            seconds = max(1, math.ceil(retry_after))
+            response = JsonResponse({
+                'error': 'Rate limit exceeded',
+                'retry_after': seconds
+            }, status=429)
+            response['Retry-After'] = str(seconds)
+            return response
+
+        # For streaming responses the slot is released once the view returns
+        try:
+            return self.get_response(request)
+        finally:
+            backend.release(key_id)
+
+    def get_limits(self, key):
+        now = time.monotonic()
+        cached = self.limits.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+
+        config = settings.RATE_LIMIT
+        row = APIKey.objects.filter(key=key, is_active=True).values_list(
+            'id', 'rate_limit', 'burst_limit', 'max_in_flight'
+        ).first()
+        limits = None
+        if row:
+            key_id, rate, burst, max_in_flight = row
+            rate = config['RATE'] if rate is None else rate
+            burst = config['BURST'] if burst is None else burst
+            max_in_flight = config['MAX_IN_FLIGHT'] if max_in_flight is None else max_in_flight
+            if rate or max_in_flight:
+                limits = (key_id, rate, max(burst, 1), max_in_flight)
+
+        if len(self.limits) > 10000:
+            self.limits.clear()
+        self.limits[key] = (now + self.LIMITS_TTL, limits)
+        return limits
@@ -0,0 +1,151 @@
+"""
+Versioned dataset releases: a manifest of every fact's content hash, made
+when a dataset is ingested (`manage.py populate_db`, `manage.py
+release_dataset`), and the delta between two releases.
+
+A fact's hash covers its questions (text, score, fetchability), each
+question's HTML content and the active links of its results page with the
+SERP document behind each. Documents are hashed when they are saved
+(`HtmlContent.content_hash`, `SerpContent.content_hash`), so a release reads
+those hashes instead of whole documents; rows saved before the hashes
+existed get them here. Database ids and access statistics are left out, so
+re-ingesting unchanged data gives the same hashes.
+
+A release stores the whole manifest, compressed. Clients keep the version
+they synced and ask for the delta since it: the facts added or changed,
+with their new hashes, and the facts removed.
+"""
+import json
+import zlib
+
+from django.db import transaction
+
+from .coldstore import body
+from .models import Dataset, DatasetRelease, Fact, HtmlContent, HtmlContentUrl, Question, SerpContent
+from .text import content_hash
+
+BATCH_SIZE = 500
+
+
+def fill_content_hashes(dataset, batch_size=BATCH_SIZE):
+    """Hash the dataset's HTML content and linked SERP documents that have no
+    hash yet; returns how many were hashed"""
+    hashed = 0
+    pages = HtmlContent.objects.filter(dataset=dataset, content_hash__isnull=True)
+    while batch := list(pages.only('id', 'content', 'cold_segment', 'cold_offset')[:batch_size]):
+        for page in batch:
+            page.content_hash = content_hash(body(page, 'content'))
+        HtmlContent.objects.bulk_update(batch, ['content_hash'])
+        hashed += len(batch)
+
+    documents = SerpContent.objects.filter(
+        content_hash__isnull=True,
+        link_id__in=HtmlContentUrl.objects.filter(dataset=dataset).values('link_id')
+    )
+    columns = ['id', *SerpContent.SELECTABLE_FIELDS, 'cold_segment', 'cold_offset']
+    while batch := list(documents.only(*columns)[:batch_size]):
+        for document in batch:
+            document.content_hash = content_hash(document.document_json())
+        SerpContent.objects.bulk_update(batch, ['content_hash'])
+        hashed += len(batch)
+    return hashed
+
+
+def fact_hashes(dataset, batch_size=BATCH_SIZE):
+    """Yield (fact_id, hash) for every fact of the dataset"""
+    facts = list(Fact.objects.filter(dataset=dataset).order_by('id').values_list('id', 'fact_id'))
+    for start in range(0, len(facts), batch_size):
+        chunk = facts[start:start + batch_size]
+        questions = list(Question.objects.filter(
+            dataset=dataset, fact_id__in=[pk for pk, _ in chunk]
+        ).values_list('id', 'fact_id', 'text', 'score', 'is_fetchable'))
+        pages = {
+            page_id: (question_id, page_hash)
+            for page_id, question_id, page_hash in HtmlContent.objects.filter(
+                dataset=dataset, question_id__in=[question[0] for question in questions]
+            ).values_list('id', 'question_id', 'content_hash')
+        }
+        urls = {}
+        for page_id, *url in HtmlContentUrl.objects.filter(
+            dataset=dataset, html_content_id__in=list(pages), link__is_active=True
+        ).values_list(
+            'html_content_id', 'rank', 'link__url', 'link__title', 'link__description',
+            'link__serp_content__content_hash'
+        ):
+            urls.setdefault(pages[page_id][0], []).append(url)
+        page_hashes = {question_id: page_hash for question_id, page_hash in pages.values()}
+
+        entries = {}
+        for question_id, fact_pk, text, score, is_fetchable in questions:
+            entry = [
+                text, score, is_fetchable, page_hashes.get(question_id),
+                sorted(urls.get(question_id, []), key=lambda url: (url[0], url[1]))
+            ]
+            entries.setdefault(fact_pk, []).append(json.dumps(entry))
+        for pk, fact_id in chunk:
+            # Question order does not depend on ids
+            yield fact_id, content_hash('\n'.join(sorted(entries.get(pk, []))))
+
+
+def diff(old, new):
+    """(added, changed, removed) between two {fact_id: hash} manifests: the
+    added and changed facts with their new hashes, the removed fact ids"""
+    added = {fact_id: new[fact_id] for fact_id in sorted(new.keys() - old.keys())}
+    changed = {
+        fact_id: new[fact_id] for fact_id in sorted(new.keys() & old.keys()) if new[fact_id] != old[fact_id]
+    }
+    removed = sorted(old.keys() - new.keys())
+    return added, changed, removed
+
+
+def create_release(dataset, batch_size=BATCH_SIZE):
+    """Make a release of the dataset's current content unless it matches the
+    latest release; returns (release, created)"""
+    fill_content_hashes(dataset, batch_size)
+    hashes = dict(fact_hashes(dataset, batch_size))
+    manifest = json.dumps(hashes, sort_keys=True).encode('ascii')
+    digest = content_hash(manifest)
+
+    with transaction.atomic():
+        # One release at a time per dataset
+        Dataset.objects.select_for_update().get(pk=dataset.pk)
+        previous = dataset.releases.order_by('-version').first()
+        if previous is not None and previous.digest == digest:
+            return previous, False
+        added, changed, removed = diff(previous.fact_hashes() if previous else {}, hashes)
+        release = DatasetRelease.objects.create(
+            dataset=dataset,
+            version=previous.version + 1 if previous else 1,
+            digest=digest,
+            facts_count=len(hashes),
+            added_count=len(added),
+            changed_count=len(changed),
+            removed_count=len(removed),
+            manifest=zlib.compress(manifest),
+        )
+    return release, True
+
+
+def release_summary(release):
+    """The fields of a release that responses list, without its manifest"""
+    return {
+        'version': release.version,
+        'created_at': release.created_at.isoformat(),
+        'digest': release.digest,
+        'facts_count': release.facts_count,
+        'added_count': release.added_count,
+        'changed_count': release.changed_count,
+        'removed_count': release.removed_count,
+    }
+
+
+def get_release(dataset, version, manifest=True):
+    """The dataset's release numbered version ('latest' for the newest), or None"""
+    releases = DatasetRelease.objects.filter(dataset=dataset)
+    if not manifest:
+        releases = releases.defer('manifest')
+    if version == 'latest':
+        return releases.order_by('-version').first()
+    if not str(version).isdigit():
+        return None
+    return releases.filter(version=int(version)).first()
@@ -0,0 +1,152 @@
+import re
+
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F, Func, TextField, Value
+
+from .coldstore import COLD_COLUMNS, cold_store
+from .models import HtmlContentUrl, SerpContent
+
+DEFAULT_SEARCH_LANGUAGE = 'en'
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# FTS5 index built by build_embedded_db for SQLite (embedded mode)
+FTS_TABLE = 'api_serpcontent_fts'
+# bm25 column weights for title, summary and text, like the A/B/C weights of
+# the Postgres search vector
+FTS_WEIGHTS = (10.0, 4.0, 2.0)
+
+
+def search_config(language=None):
+    """Text search config for a language, resolved by the same SQL function
+    that the search_vector trigger uses so queries and documents agree"""
+    return Func(
+        Value(language or DEFAULT_SEARCH_LANGUAGE),
+        function='api_search_config',
+        output_field=TextField()
+    )
+
+
+def build_search_query(text, language=None):
+    """Parse user input with web search syntax (quotes, OR, -term)"""
+    return SearchQuery(text, config=search_config(language), search_type='websearch')
+
+
+def search_serp_content(text, language=None, dataset_name=None, fact_id=None):
+    """Ranked SERP content matching a full-text query.
+
+    Scoping by dataset or fact uses a semi-join on the question links, so a
+    document linked from several questions is only returned once.
+    """
+    if connection.vendor == 'sqlite':
+        queryset = _fts_search(text)
+    else:
+        query = build_search_query(text, language)
+        queryset = SerpContent.objects.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query)
+        )
+
+    if language:
+        queryset = queryset.filter(language=language)
+
+    if dataset_name or fact_id:
+        links = HtmlContentUrl.objects.all()
+        if dataset_name:
+            links = links.filter(dataset__name=dataset_name)
+        if fact_id:
+            links = links.filter(html_content__question__fact__fact_id=fact_id)
+        queryset = queryset.filter(link_id__in=links.values('link_id'))
+
+    return queryset.only(
+        'id', 'url', 'title', 'language', 'meta_site_name', 'publish_date'
+    ).order_by('-rank', 'id')
+
+
+def search_headlines(ids, text, language=None, max_fragments=3):
+    """Highlighted text snippets for the given SERP content ids.
+
+    Run separately for the current page only, since ts_headline has to
+    re-parse the full document text. The text of documents in the cold store
+    is read from there and sent with the query.
+    """
+    if connection.vendor == 'sqlite':
+        return _fts_headlines(ids, text)
+
+    query = build_search_query(text, language)
+
+    def headline(expression):
+        return SearchHeadline(
+            expression, query,
+            config=search_config(language),
+            start_sel='<b>',
+            stop_sel='</b>',
+            max_fragments=max_fragments,
+        )
+
+    headlines = {}
+    for pk, value, segment, offset in SerpContent.objects.filter(id__in=ids).annotate(
+        headline=headline('text')
+    ).values_list('id', 'headline', *COLD_COLUMNS):
+        if segment is not None:
+            value = SerpContent.objects.filter(id=pk).annotate(
+                headline=headline(Value(cold_store.read(segment, offset), output_field=TextField()))
+            ).values_list('headline', flat=True).first()
+        headlines[pk] = value
+    return headlines
+
+
+def websearch_to_fts5(text):
+    """Translate web search syntax (quotes, OR, -term) into an FTS5 query,
+    or None if nothing is left to match"""
+    positive, negative = [], []
+    for token in re.findall(r'-?"[^"]*"?|\S+', text):
+        if token == 'OR':
+            if positive and positive[-1] != 'OR':
+                positive.append('OR')
+            continue
+        negate = token.startswith('-')
+        words = re.findall(r'\w+', token)
+        if not words:
+            continue
+        phrase = '"' + ' '.join(words) + '"'
+        (negative if negate else positive).append(phrase)
+
+    while positive and positive[-1] == 'OR':
+        positive.pop()
+    if not positive:
+        return None
+    query = ' '.join(positive)
+    if negative:
+        query = f'({query}) NOT ({" OR ".join(negative)})'
+    return query
+
+
+def _fts_search(text):
+    match = websearch_to_fts5(text)
+    if match is None:
+        return SerpContent.objects.none()
+    weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+    # bm25() is lower for better matches; negate it so that -rank orders
+    # results the same way as ts_rank on Postgres
+    return SerpContent.objects.extra(
+        select={'rank': f'-bm25({FTS_TABLE}, {weights})'},
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = api_serpcontent.id', f'{FTS_TABLE} MATCH %s'],
+        params=[match]
+    )
+
+
+def _fts_headlines(ids, text):
+    match = websearch_to_fts5(text)
+    ids = list(ids)
+    if match is None or not ids:
+        return {}
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, snippet({FTS_TABLE}, 2, '<b>', '</b>', ' ... ', 35) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND rowid IN ({placeholders})",
+            [match, *ids]
+        )
+        return dict(cursor.fetchall())
@@ -0,0 +1,203 @@
+"""
+Per-worker cache of whole SERP documents, keyed by normalized URL.
+
+A few popular URLs account for most SERP reads. Full-document requests
+(no `fields`) look their URL up here before querying the link and its
+payload; a hit answers the request without touching the database apart
+from the usage and scrape counters.
+
+The cache is bounded by the bytes of the documents it holds, not by their
+number. Entries are kept in least recently used order, and a document that
+does not fit is only admitted when it was asked for more often than each of
+the entries it would evict (TinyLFU admission, weighed by size). Request
+frequencies are estimated by a count-min sketch of 4-bit counters that are
+halved periodically, so old popularity fades. One large article requested
+once cannot push out hundreds of small hot ones.
+
+Saving or deleting a Link or SerpContent, and the bulk actions that change
+them, bump a version counter in shared memory (as for api.catalog), and
+every worker drops its entries when it sees the counter move. Entries also
+expire after SERP_CACHE_TTL seconds, which bounds staleness after bulk SQL
+or changes on another host.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+
+from .catalog import SharedVersion
+
+# A document as the full-document responses need it
+SerpDocument = namedtuple('SerpDocument', ['link_id', 'url', 'scraped_at', 'json'])
+
+# Rough per-entry memory besides the document and URLs
+ENTRY_OVERHEAD = 256
+
+# Counter values are halved by translating each byte through this table
+_HALVE = bytes(value >> 1 for value in range(256))
+
+
+class FrequencySketch:
+    """Count-min sketch of how often keys were asked for: 4 rows of 4-bit
+    counters (saturating at 15), all halved every 10 * width increments"""
+    ROWS = 4
+    MAX_COUNT = 15
+
+    def __init__(self, width):
+        # A power of two, so that a hash is reduced with a mask
+        self.width = 1 << max(width - 1, 1).bit_length()
+        self._counters = bytearray(self.ROWS * self.width)
+        self._additions = 0
+        self.sample_size = 10 * self.width
+
+    def _indexes(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=4 * self.ROWS).digest()
+        mask = self.width - 1
+        return [
+            row * self.width + (int.from_bytes(digest[4 * row:4 * row + 4], 'little') & mask)
+            for row in range(self.ROWS)
+        ]
+
+    def increment(self, key):
+        indexes = self._indexes(key)
+        minimum = min(self._counters[index] for index in indexes)
+        if minimum < self.MAX_COUNT:
+            # Conservative update: only the smallest counters grow
+            for index in indexes:
+                if self._counters[index] == minimum:
+                    self._counters[index] = minimum + 1
+        self._additions += 1
+        if self._additions >= self.sample_size:
+            self._counters = self._counters.translate(_HALVE)
+            self._additions //= 2
+
+    def frequency(self, key):
+        return min(self._counters[index] for index in self._indexes(key))
+
+
+class SerpCache:
+    """Byte-bounded LRU cache with frequency-based admission, of one worker;
+    max_bytes and ttl default to settings.SERP_CACHE_BYTES and SERP_CACHE_TTL"""
+    COUNTERS = ('hits', 'misses', 'admitted', 'rejected', 'evicted', 'expired', 'invalidations')
+
+    def __init__(self, max_bytes=None, ttl=None, version=None):
+        self._max_bytes = max_bytes
+        self.ttl = ttl
+        self.version = version or SharedVersion(
+            os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else '/tmp', 'mockapi-serp-cache')
+        )
+        self._lock = threading.Lock()
+        # key: (document, size, loaded at)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._seen_version = None
+        self._sketch = None
+        self._counts = dict.fromkeys(self.COUNTERS, 0)
+        self._evicted_bytes = 0
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes if self._max_bytes is not None else settings.SERP_CACHE_BYTES
+
+    def _sync(self):
+        """Drop every entry when the shared version moved; called with the lock held"""
+        version = self.version.get()
+        if version != self._seen_version:
+            if self._entries:
+                self._counts['invalidations'] += 1
+            self._entries.clear()
+            self._bytes = 0
+            self._seen_version = version
+        if self._sketch is None:
+            # About one counter per 4 KB of capacity, for the sizes of typical documents
+            self._sketch = FrequencySketch(max(self.max_bytes // 4096, 1024))
+
+    def get(self, key):
+        """The document cached under key, or None; counts the request either way"""
+        if self.max_bytes <= 0:
+            return None
+        ttl = self.ttl if self.ttl is not None else settings.SERP_CACHE_TTL
+        with self._lock:
+            self._sync()
+            self._sketch.increment(key)
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[2] > ttl:
+                self._remove(key)
+                self._counts['expired'] += 1
+                entry = None
+            if entry is None:
+                self._counts['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counts['hits'] += 1
+            return entry[0]
+
+    def put(self, key, document):
+        """Cache document under key if it fits, or if it is requested more
+        often than each of the least recently used entries it would replace;
+        returns whether it was admitted"""
+        size = len(document.json) + len(document.url) + len(key) + ENTRY_OVERHEAD
+        max_bytes = self.max_bytes
+        if max_bytes <= 0:
+            return False
+        with self._lock:
+            self._sync()
+            if key in self._entries:
+                self._remove(key)
+            if size > max_bytes:
+                self._counts['rejected'] += 1
+                return False
+
+            needed = self._bytes + size - max_bytes
+            if needed > 0:
+                frequency = self._sketch.frequency(key)
+                victims = []
+                for victim, (_, victim_size, _) in self._entries.items():
+                    if needed <= 0:
+                        break
+                    if self._sketch.frequency(victim) >= frequency:
+                        self._counts['rejected'] += 1
+                        return False
+                    victims.append(victim)
+                    needed -= victim_size
+                for victim in victims:
+                    self._evicted_bytes += self._remove(victim)
+                    self._counts['evicted'] += 1
+
+            self._entries[key] = (document, size, time.monotonic())
+            self._bytes += size
+            self._counts['admitted'] += 1
+            return True
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+        return size
+
+    def invalidate(self):
+        """Make every worker of the host drop its cached documents"""
+        self.version.bump()
+
+    def stats(self):
+        """Counters since the worker started, with the share of lookups that
+        hit and the current size"""
+        with self._lock:
+            counts = dict(self._counts)
+            entries = len(self._entries)
+            cached_bytes = self._bytes
+            evicted_bytes = self._evicted_bytes
+        lookups = counts['hits'] + counts['misses']
+        return {
+            **counts,
+            'hit_ratio': counts['hits'] / lookups if lookups else None,
+            'evicted_bytes': evicted_bytes,
+            'entries': entries,
+            'bytes': cached_bytes,
+            'max_bytes': self.max_bytes,
+        }
+
+
+serp_cache = SerpCache()
@@ -0,0 +1,265 @@
+"""
+Structured extraction of a stored Google results page (`HtmlContent.content`):
+the organic results with their position, title, URL and snippet, the
+featured snippet and the knowledge panel.
+
+Pages are parsed with the standard library HTML parser into a small tree
+without scripts and styles. The class names used to find each block cover
+the Google markup of the stored pages; bump PARSER_VERSION when the
+extraction changes, so `manage.py backfill_serp_results` recomputes it.
+"""
+from html.parser import HTMLParser
+from urllib.parse import parse_qs, urlsplit
+
+PARSER_VERSION = 1
+
+VOID_ELEMENTS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta',
+    'param', 'source', 'track', 'wbr',
+}
+SKIPPED_ELEMENTS = {'script', 'style', 'noscript', 'template', 'svg'}
+# Elements whose text is separated from the surrounding text
+BLOCK_ELEMENTS = {
+    'address', 'article', 'br', 'dd', 'div', 'dl', 'dt', 'h1', 'h2', 'h3', 'h4', 'h5',
+    'h6', 'hr', 'li', 'ol', 'p', 'section', 'table', 'td', 'th', 'tr', 'ul',
+}
+
+RESULT_CLASSES = {'g', 'tF2Cxc', 'MjjYud'}
+SNIPPET_CLASSES = {'VwiC3b', 'IsZvec', 'lEBKkf', 's3v9rd', 'st'}
+FEATURED_CLASSES = {'ifM9O', 'c2xzTb', 'V3FYCf'}
+FEATURED_TEXT_CLASSES = {'hgKElc', 'LGOjhe', 'iKJnec'}
+KNOWLEDGE_PANEL_CLASSES = {'kp-wholepage', 'knowledge-panel', 'kp-blk', 'osrp-blk'}
+RELATED_QUESTION_CLASSES = {'related-question-pair', 'cbphWd'}
+AD_IDS = {'tads', 'tadsb', 'bottomads'}
+
+
+class Node:
+    __slots__ = ('tag', 'attrs', 'children', 'parent')
+
+    def __init__(self, tag, attrs, parent):
+        self.tag = tag
+        self.attrs = attrs
+        self.children = []
+        self.parent = parent
+
+    @property
+    def classes(self):
+        return set((self.attrs.get('class') or '').split())
+
+    def iter(self):
+        """This node and its descendant elements in document order"""
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed([child for child in node.children if isinstance(child, Node)]))
+
+    def find(self, predicate):
+        return next((node for node in self.iter() if node is not self and predicate(node)), None)
+
+    def ancestors(self):
+        node = self.parent
+        while node is not None:
+            yield node
+            node = node.parent
+
+    def text(self):
+        """Text of the subtree, with whitespace collapsed"""
+        parts = []
+        stack = [self]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                parts.append(item)
+                continue
+            if item.tag in BLOCK_ELEMENTS:
+                parts.append(' ')
+                stack.append(' ')
+            stack.extend(reversed(item.children))
+        return ' '.join(''.join(parts).split())
+
+
+class TreeBuilder(HTMLParser):
+    """Lenient tree builder: unmatched end tags are ignored and unclosed
+    elements are closed by the end tag of an ancestor"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Node('#root', {}, None)
+        self.stack = [self.root]
+        self.skipping = None
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if self.skipping:
+            if tag == self.skipping:
+                self.skip_depth += 1
+            return
+        if tag in SKIPPED_ELEMENTS:
+            self.skipping, self.skip_depth = tag, 1
+            return
+        node = Node(tag, {name: value or '' for name, value in attrs}, self.stack[-1])
+        self.stack[-1].children.append(node)
+        if tag not in VOID_ELEMENTS:
+            self.stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        if self.skipping or tag in SKIPPED_ELEMENTS:
+            return
+        self.stack[-1].children.append(Node(tag, {name: value or '' for name, value in attrs}, self.stack[-1]))
+
+    def handle_endtag(self, tag):
+        if self.skipping:
+            if tag == self.skipping:
+                self.skip_depth -= 1
+                if not self.skip_depth:
+                    self.skipping = None
+            return
+        for index in range(len(self.stack) - 1, 0, -1):
+            if self.stack[index].tag == tag:
+                del self.stack[index:]
+                return
+
+    def handle_data(self, data):
+        if not self.skipping:
+            self.stack[-1].children.append(data)
+
+
+def result_url(href):
+    """Target of a result link (unwrapping /url?q= redirects), or None for
+    links to Google itself"""
+    if href.startswith('/url?'):
+        query = parse_qs(urlsplit(href).query)
+        href = (query.get('q') or query.get('url') or [''])[0]
+    if not href.startswith(('http://', 'https://')):
+        return None
+    host = urlsplit(href).hostname or ''
+    if host.startswith('google.') or '.google.' in host or host.endswith('googleusercontent.com'):
+        return None
+    return href
+
+
+def _has_class(classes):
+    return lambda node: bool(node.classes & classes)
+
+
+def _organic_results(root, excluded):
+    results = []
+    seen = set()
+    for anchor in root.iter():
+        if anchor.tag != 'a' or not anchor.attrs.get('href'):
+            continue
+        heading = anchor.find(lambda node: node.tag == 'h3')
+        url = result_url(anchor.attrs['href'])
+        if heading is None or url is None or url in seen:
+            continue
+        ancestors = list(anchor.ancestors())
+        if any(id(node) in excluded for node in ancestors):
+            continue
+
+        container = next((node for node in ancestors if node.classes & RESULT_CLASSES), None)
+        if container is None:
+            container = ancestors[min(3, len(ancestors) - 1)]
+        snippet = container.find(
+            lambda node: bool(node.classes & SNIPPET_CLASSES) or 'data-sncf' in node.attrs
+        )
+
+        seen.add(url)
+        results.append({
+            'position': len(results) + 1,
+            'title': heading.text(),
+            'url': url,
+            'snippet': snippet.text() if snippet is not None else None,
+        })
+    return results
+
+
+def _featured_snippet(region):
+    text_node = region.find(_has_class(FEATURED_TEXT_CLASSES))
+    if text_node is not None:
+        text = text_node.text()
+    else:
+        # List snippets
+        text = '\n'.join(item.text() for item in region.iter() if item.tag == 'li') or None
+    if not text:
+        return None
+
+    source = region.find(lambda node: node.tag == 'a' and node.find(lambda child: child.tag == 'h3') is not None)
+    return {
+        'text': text,
+        'title': source.find(lambda node: node.tag == 'h3').text() if source is not None else None,
+        'url': result_url(source.attrs.get('href', '')) if source is not None else None,
+    }
+
+
+def _knowledge_panel(region):
+    def attribute(name):
+        node = region.find(lambda node: node.attrs.get('data-attrid') == name)
+        return node.text() if node is not None else None
+
+    title = attribute('title')
+    if title is None:
+        heading = region.find(lambda node: node.tag == 'h2' and bool(node.classes & {'qrShPb', 'SPZz6b'}))
+        title = heading.text() if heading is not None else None
+
+    description = source_url = None
+    description_node = region.find(_has_class({'kno-rdesc'}))
+    if description_node is not None:
+        span = description_node.find(lambda node: node.tag == 'span')
+        if span is not None:
+            description = Node('span', {}, None)
+            description.children = list(span.children)
+            # "... Wikipedia" link to the source at the end of the text
+            last = description.children[-1] if description.children else None
+            if isinstance(last, Node) and last.tag == 'a':
+                source_url = result_url(last.attrs.get('href', ''))
+                description.children.pop()
+            description = description.text() or None
+
+    facts = []
+    for node in region.iter():
+        attrid = node.attrs.get('data-attrid', '')
+        if not attrid.startswith(('kc:/', 'hw:/', 'ss:/')):
+            continue
+        label = node.find(_has_class({'w8qArf'}))
+        value = node.find(_has_class({'LrzXr', 'kno-fv'}))
+        if label is not None and value is not None:
+            facts.append({'label': label.text().rstrip(': '), 'value': value.text()})
+
+    if not (title or description or facts):
+        return None
+    return {
+        'title': title,
+        'subtitle': attribute('subtitle'),
+        'description': description,
+        'source_url': source_url,
+        'facts': facts,
+    }
+
+
+def parse_serp(html):
+    """Structured results of a Google results page"""
+    builder = TreeBuilder()
+    builder.feed(html or '')
+    builder.close()
+    root = builder.root
+
+    featured = knowledge_panel = None
+    excluded = set()
+    for node in root.iter():
+        classes = node.classes
+        if featured is None and (classes & FEATURED_CLASSES or node.tag == 'block-component'):
+            featured = node
+            excluded.add(id(node))
+        elif knowledge_panel is None and classes & KNOWLEDGE_PANEL_CLASSES:
+            knowledge_panel = node
+            excluded.add(id(node))
+        elif classes & RELATED_QUESTION_CLASSES or node.attrs.get('id') in AD_IDS:
+            excluded.add(id(node))
+
+    return {
+        'version': PARSER_VERSION,
+        'organic': _organic_results(root, excluded),
+        'featured_snippet': _featured_snippet(featured) if featured is not None else None,
+        'knowledge_panel': _knowledge_panel(knowledge_panel) if knowledge_panel is not None else None,
+    }
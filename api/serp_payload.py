@@ -0,0 +1,92 @@
+"""
+Full-document responses of the SERP content endpoints from the stored
+payload (`SerpContent.payload`).
+
+A request without `fields` loads the link and only the payload and
+timestamps of its SERP content; the payload is decompressed and placed in
+the response as is, so no JSON arrays or dates are decoded and nothing is
+encoded again. The response is byte for byte what JsonResponse writes for
+the same content. Requests for some fields, and content whose payload was
+not built yet, are answered from the model fields as before.
+
+Whole documents of popular URLs are also kept by each worker in
+api.serp_cache, so that repeated requests skip the lookup altogether.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse
+
+from .models import Link, SerpContent
+from .normalize import normalize_url
+from .serp_cache import SerpDocument, serp_cache
+
+# Columns the payload replaces, left unloaded for full-document requests
+DEFERRED_FIELDS = [
+    f'serp_content__{name}' for name in (*SerpContent.SELECTABLE_FIELDS, 'search_vector', 'minhash')
+]
+
+
+def serp_link(url, full):
+    """The active link matching url with its SERP content (see
+    LinkQuerySet.lookup); with full, only the content's payload is loaded"""
+    links = Link.objects.filter(is_active=True).select_related('serp_content')
+    if full:
+        links = links.defer(*DEFERRED_FIELDS)
+    return links.lookup(url)
+
+
+def serp_document(url):
+    """The whole SERP document of the active link matching url, from the
+    worker's cache or else the database (then cached if admitted); raises
+    Link.DoesNotExist or SerpContent.DoesNotExist like serp_link. URL
+    variants share one entry, as they share one link."""
+    key = normalize_url(url)
+    document = serp_cache.get(key)
+    if document is None:
+        link = serp_link(url, full=True)
+        serp_content = link.serp_content
+        data = serp_content.payload_json()
+        if data is None:
+            # Cold or not built yet: encoded as build_payload would
+            serp_content.refresh_from_db(fields=SerpContent.SELECTABLE_FIELDS)
+            data = serp_content.document_json()
+        document = SerpDocument(link.id, link.url, serp_content.scraped_at.isoformat(), data)
+        serp_cache.put(key, document)
+    return document
+
+
+def serp_document_response(url, document):
+    """The SERP content endpoints' response for a whole document"""
+    envelope = {
+        'success': True,
+        'url': url,
+        'fields_requested': None,
+        'scraped_at': document.scraped_at,
+    }
+    return _payload_response(envelope, document.json)
+
+
+def _payload_response(envelope, payload):
+    # 'data' is the last key: the envelope is closed after the payload
+    document = json.dumps(envelope, cls=DjangoJSONEncoder)
+    return HttpResponse(
+        b''.join([document[:-1].encode('ascii'), b', "data": ', payload, b'}']),
+        content_type='application/json'
+    )
+
+
+def serp_content_response(url, selected_fields, serp_content):
+    """The SERP content endpoints' response for serp_content"""
+    envelope = {
+        'success': True,
+        'url': url,
+        'fields_requested': selected_fields,
+        'scraped_at': serp_content.scraped_at.isoformat(),
+    }
+    payload = serp_content.payload_json() if not selected_fields else None
+    if payload is None:
+        if not selected_fields and serp_content.get_deferred_fields():
+            serp_content.refresh_from_db(fields=SerpContent.SELECTABLE_FIELDS)
+        return JsonResponse({**envelope, 'data': serp_content.get_selected_fields(selected_fields)})
+    return _payload_response(envelope, payload)
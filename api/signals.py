@@ -0,0 +1,71 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .catalog import catalog
+from .counters import datasets_changed, facts_changed, html_contents_changed, questions_changed
+from .models import Dataset, Fact, Question, HtmlContent, HtmlContentUrl, Link, SerpContent
+from .serp_cache import serp_cache
+
+
+@receiver(post_save, sender=Dataset)
+@receiver(post_delete, sender=Dataset)
+@receiver(post_save, sender=Fact)
+@receiver(post_delete, sender=Fact)
+def catalog_changed(sender, raw=False, **kwargs):
+    # After commit, so no worker reloads the catalog before the change is visible
+    if not raw:
+        transaction.on_commit(catalog.invalidate)
+
+
+@receiver(post_save, sender=Fact)
+def fact_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        datasets_changed([instance.dataset_id])
+
+
+@receiver(post_delete, sender=Fact)
+def fact_deleted(sender, instance, **kwargs):
+    datasets_changed([instance.dataset_id])
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def question_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        facts_changed([instance.fact_id])
+
+
+@receiver(post_save, sender=HtmlContent)
+@receiver(post_delete, sender=HtmlContent)
+def html_content_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        questions_changed([instance.question_id])
+
+
+@receiver(post_save, sender=HtmlContentUrl)
+@receiver(post_delete, sender=HtmlContentUrl)
+def html_content_url_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        html_contents_changed([instance.html_content_id])
+
+
+@receiver(post_save, sender=SerpContent)
+@receiver(post_delete, sender=SerpContent)
+def serp_content_changed(sender, instance, raw=False, created=True, **kwargs):
+    # Only creation and deletion change SERP coverage
+    if created and not raw:
+        facts_changed(
+            HtmlContentUrl.objects.filter(link_id=instance.link_id).values_list(
+                'html_content__question__fact_id', flat=True
+            ).distinct()
+        )
+
+
+@receiver(post_save, sender=Link)
+@receiver(post_delete, sender=Link)
+@receiver(post_save, sender=SerpContent)
+@receiver(post_delete, sender=SerpContent)
+def serp_document_changed(sender, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(serp_cache.invalidate)
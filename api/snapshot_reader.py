@@ -0,0 +1,104 @@
+"""Read dataset snapshots written by the snapshot_dataset command.
+
+Only needs pyarrow (no Django), so benchmark jobs can use it on a
+downloaded snapshot directory:
+
+    from api.snapshot_reader import Snapshot
+
+    snapshot = Snapshot('snapshots/factbench/20250115T103000Z')
+    questions = snapshot.questions(['correct_1', 'correct_2'])
+    serp = snapshot.serp_content(link_ids, columns=['link_id', 'title', 'text'])
+
+Arrow IPC snapshots are memory-mapped: tables point straight into the page
+cache, so opening them costs no copy and several processes reading the same
+snapshot share one copy in memory. Parquet snapshots are decoded on read.
+"""
+import json
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+MANIFEST_NAME = 'manifest.json'
+
+
+class Snapshot:
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / MANIFEST_NAME) as f:
+            self.manifest = json.load(f)
+        self.format = self.manifest['format']
+        self._tables = {}
+
+    @property
+    def dataset(self):
+        return self.manifest['dataset']
+
+    @property
+    def version(self):
+        return self.manifest['version']
+
+    @property
+    def table_names(self):
+        return list(self.manifest['tables'])
+
+    def table(self, name, columns=None):
+        """A whole table, one chunk per partition file"""
+        if name not in self._tables:
+            parts = [self._read_part(self.path / entry['name']) for entry in self.manifest['tables'][name]['files']]
+            self._tables[name] = pa.concat_tables(parts) if len(parts) > 1 else parts[0]
+        table = self._tables[name]
+        return table.select(columns) if columns else table
+
+    def _read_part(self, path):
+        if self.format == 'arrow':
+            return pa.ipc.open_file(pa.memory_map(str(path), 'r')).read_all()
+        return pq.read_table(path, memory_map=True)
+
+    def facts(self, columns=None):
+        return self.table('facts', columns)
+
+    def questions(self, fact_ids=None, fetchable_only=False, columns=None):
+        """Questions ordered by fact_id and score, optionally for some facts"""
+        table = self.table('questions')
+        mask = None
+        if fact_ids is not None:
+            mask = pc.is_in(table['fact_id'], value_set=pa.array(list(fact_ids), pa.string()))
+        if fetchable_only:
+            mask = table['is_fetchable'] if mask is None else pc.and_(mask, table['is_fetchable'])
+        if mask is not None:
+            table = table.filter(mask)
+        return table.select(columns) if columns else table
+
+    def question_links(self, question_ids=None):
+        """(question_id, link_id, rank) rows, ordered by question and rank"""
+        table = self.table('question_links')
+        if question_ids is not None:
+            table = table.filter(pc.is_in(table['question_id'], value_set=pa.array(list(question_ids), pa.int64())))
+        return table
+
+    def links(self, link_ids=None, columns=None):
+        return self._by_ids(self.table('links'), 'id', link_ids, columns)
+
+    def serp_content(self, link_ids=None, columns=None):
+        return self._by_ids(self.table('serp_content'), 'link_id', link_ids, columns)
+
+    def _by_ids(self, table, column, ids, columns):
+        if ids is not None:
+            table = table.filter(pc.is_in(table[column], value_set=pa.array(list(ids), pa.int64())))
+        return table.select(columns) if columns else table
+
+
+def open_snapshot(root, dataset, version='latest'):
+    """Open a snapshot under a SNAPSHOT_ROOT-style directory tree"""
+    directory = Path(root) / dataset
+    if version == 'latest':
+        versions = sorted(
+            path.name for path in directory.iterdir()
+            if not path.name.startswith('.') and (path / MANIFEST_NAME).is_file()
+        )
+        if not versions:
+            raise FileNotFoundError(f'No snapshots of {dataset} in {root}')
+        version = versions[-1]
+    return Snapshot(directory / version)
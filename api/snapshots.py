@@ -0,0 +1,60 @@
+import json
+import re
+from pathlib import Path
+
+from django.conf import settings
+
+MANIFEST_NAME = 'manifest.json'
+# Versions are UTC timestamps (e.g. 20250115T103000Z), optionally followed by
+# a label (20250115T103000Z-baseline), so they sort by age; anything else in
+# a dataset's directory, such as a snapshot being written, is not a version
+VERSION_FORMAT = '%Y%m%dT%H%M%SZ'
+LABEL_RE = re.compile(r'^[0-9A-Za-z_-][0-9A-Za-z._-]*$')
+_VERSION_RE = re.compile(r'^[0-9]{8}T[0-9]{6}Z(-[0-9A-Za-z_-][0-9A-Za-z._-]*)?$')
+
+
+def snapshot_root():
+    return Path(settings.SNAPSHOT_ROOT)
+
+
+def dataset_snapshot_dir(dataset_name):
+    return snapshot_root() / dataset_name
+
+
+def list_versions(dataset_name):
+    """Complete snapshot versions of a dataset, oldest first"""
+    directory = dataset_snapshot_dir(dataset_name)
+    if not directory.is_dir():
+        return []
+    return sorted(
+        path.name for path in directory.iterdir()
+        if _VERSION_RE.match(path.name) and (path / MANIFEST_NAME).is_file()
+    )
+
+
+def resolve_version(dataset_name, version):
+    """Directory of a snapshot version ('latest' for the newest), or None"""
+    versions = list_versions(dataset_name)
+    if version == 'latest':
+        version = versions[-1] if versions else None
+    if version not in versions:
+        return None
+    return dataset_snapshot_dir(dataset_name) / version
+
+
+def load_manifest(snapshot_dir):
+    with open(Path(snapshot_dir) / MANIFEST_NAME) as f:
+        return json.load(f)
+
+
+def snapshot_file(snapshot_dir, manifest, filename):
+    """(path, file entry) for a file listed in the manifest, or None.
+
+    Only manifest entries are served, so a request can never reach outside
+    the snapshot directory.
+    """
+    for table in manifest['tables'].values():
+        for entry in table['files']:
+            if entry['name'] == filename:
+                return Path(snapshot_dir) / filename, entry
+    return None
@@ -1,3 +1,1369 @@
-from django.test import TestCase
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.http import HttpResponse, JsonResponse
+from django.test import LiveServerTestCase, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .catalog import SharedVersion, catalog
+from .coalesce import SharedFlights, SharedResponse, SingleFlight
+from .coldstore import RECORD, ColdStoreError, SegmentStore, cold_store
+from .counters import deferred_counters
+from .duplicates import EMPTY_SIGNATURE, find_clusters
+from .management.commands.populate_db import Command as PopulateCommand
+from .management.commands.tier_documents import Command as TierCommand
+from .models import APIKey, Dataset, Fact, HtmlContent, HtmlContentUrl, Job, Link, PassageIndex, Question, SerpContent
+from .normalize import normalize_url
+from .partitions import clear_dataset
+from .passages import question_documents, rank_passages
+from .question_page import question_page_json
+from .questions import FactQuestionGroups
+from . import ratelimit
+from .ratelimit import CacheBackend, RateLimitMiddleware, SharedMemoryBackend
+from .releases import create_release, diff, fact_hashes
+from .serp_cache import ENTRY_OVERHEAD, FrequencySketch, SerpCache, SerpDocument
+from .serp_parser import PARSER_VERSION, parse_serp, result_url
+from .serp_payload import serp_document, serp_document_response
+from .snapshots import MANIFEST_NAME, dataset_snapshot_dir, list_versions, resolve_version
+from .text import PASSAGE_CHARS, passage_index, split_passages, tokenize
+from .utils import record_scrape
+
+
+class Clock:
+    """A time.monotonic() replacement that only moves when told to"""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+# The client package ships next to the project, not installed
+sys.path.insert(0, str(settings.BASE_DIR / 'client'))
+from factcheck_client import FactCheckClient, NotFound  # noqa: E402
+
+
+def create_dataset(name, facts=2, questions=2, documents=3):
+    """A dataset whose facts f0, f1, ... have `questions` fetchable questions
+    (and one that is not), each with a results page linking `documents` SERP
+    documents shared by all questions, ranked in order"""
+    dataset = Dataset.objects.create(name=name)
+    links = []
+    for index in range(documents):
+        link = Link.objects.create(url=f'https://{name}.example.org/doc-{index}', title=f'Document {index}')
+        SerpContent.objects.create(
+            link=link, url=link.url, title=f'Document {index}', language='en',
+            text=f'Document {index} is about the Eiffel Tower in Paris. ' * 20 + f'It was built in 188{index}.',
+            authors=[f'Author {index}'], keywords=['paris', 'tower'],
+        )
+        links.append(link)
+    for fact_index in range(facts):
+        fact = Fact.objects.create(dataset=dataset, fact_id=f'f{fact_index}')
+        Question.objects.create(fact=fact, text=f'Unfetchable question {fact_index}', score=0.99)
+        for rank in range(questions):
+            question = Question.objects.create(
+                fact=fact, text=f'When was the Eiffel Tower built? ({fact_index}.{rank})',
+                score=0.9 - rank / 10, is_fetchable=True
+            )
+            page = HtmlContent.objects.create(
+                question=question, content=f'<html><body><h1>Results {fact_index}.{rank}</h1></body></html>'
+            )
+            for link_rank, link in enumerate(links):
+                HtmlContentUrl.objects.create(html_content=page, link=link, rank=link_rank)
+    return dataset
+
+
+class APITestCase(TestCase):
+    """Requests made with an API key; datasets created in setUpTestData are
+    signalled to the catalog as if committed"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('client')
+        cls.api_key = APIKey.objects.create(user=cls.user, name='tests')
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.create_data()
+
+    @classmethod
+    def create_data(cls):
+        pass
+
+    def get(self, path, **params):
+        return self.client.get(path, params, HTTP_X_API_KEY=self.api_key.key)
+
+
+class CounterTests(TestCase):
+    COUNTERS = ['facts_count', 'questions_count', 'html_contents_count', 'linked_urls_count', 'serp_urls_count']
+
+    def counters(self, dataset):
+        return list(Dataset.objects.filter(pk=dataset.pk).values_list(*self.COUNTERS).get())
+
+    def test_kept_up_to_date(self):
+        dataset = create_dataset('counted', facts=2, questions=2, documents=3)
+        self.assertEqual(self.counters(dataset), [2, 6, 4, 6, 6])
+        HtmlContentUrl.objects.filter(html_content__question__fact__fact_id='f0', link__url__endswith='doc-2')[0].delete()
+        HtmlContent.objects.filter(question__fact__fact_id='f1')[0].delete()
+        self.assertEqual(self.counters(dataset), [2, 6, 3, 6, 6])
+        Question.objects.filter(fact__fact_id='f0').delete()
+        self.assertEqual(self.counters(dataset), [2, 3, 1, 3, 3])
+
+    def test_deferred_until_the_block_ends(self):
+        queries = []
+        for name, questions in [('small', 1), ('large', 5)]:
+            dataset = create_dataset(name, facts=2, questions=questions, documents=3)
+            before = self.counters(dataset)
+            with CaptureQueriesContext(connection) as captured, deferred_counters():
+                HtmlContent.objects.filter(question__fact__dataset=dataset, question__fact__fact_id='f0').delete()
+                HtmlContentUrl.objects.filter(
+                    html_content__question__fact__dataset=dataset, html_content__question__fact__fact_id='f1', rank=0
+                ).delete()
+                self.assertEqual(self.counters(dataset), before)
+            queries.append(len(captured))
+            self.assertEqual(self.counters(dataset), [2, 2 + 2 * questions, questions, 2, 2])
+            self.assertEqual(
+                list(Fact.objects.filter(dataset=dataset).order_by('fact_id').values_list('linked_urls_count', flat=True)),
+                [0, 2]
+            )
+        # The facts of deleted rows are not looked up row by row
+        self.assertEqual(queries[0], queries[1])
+
+    def test_clearing_a_dataset_does_not_go_row_by_row(self):
+        queries = []
+        for name, questions in [('small', 1), ('large', 6)]:
+            dataset = create_dataset(name, facts=2, questions=questions, documents=4)
+            with CaptureQueriesContext(connection) as captured:
+                clear_dataset(dataset)
+            queries.append(len(captured))
+            self.assertEqual(self.counters(dataset), [0, 0, 0, 0, 0])
+            self.assertFalse(Question.objects.filter(dataset=dataset).exists())
+            self.assertFalse(HtmlContentUrl.objects.filter(dataset=dataset).exists())
+        self.assertEqual(queries[0], queries[1])
+
+    def test_populate_db_clear_empties_every_table(self):
+        create_dataset('cleared')
+        APIKey.objects.create(user=User.objects.create_user('someone'), name='key')
+        PopulateCommand().clear_data()
+        for model in [Dataset, Fact, Question, HtmlContent, HtmlContentUrl, Link, SerpContent, APIKey]:
+            self.assertFalse(model.objects.exists(), model.__name__)
+        self.assertTrue(User.objects.filter(username='someone').exists())
+
+
+class SharedMemoryBackendTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'ratelimit')
+        self.clock = Clock()
+        patcher = mock.patch('api.ratelimit.time.monotonic', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_bucket_refills_at_rate(self):
+        backend = SharedMemoryBackend(self.path)
+        for _ in range(2):
+            self.assertIsNone(backend.acquire(1, 1.0, 2, 0))
+            backend.release(1)
+        self.assertAlmostEqual(backend.acquire(1, 1.0, 2, 0), 1.0)
+
+        self.clock.now += 0.5
+        self.assertAlmostEqual(backend.acquire(1, 1.0, 2, 0), 0.5)
+        self.clock.now += 0.5
+        self.assertIsNone(backend.acquire(1, 1.0, 2, 0))
+
+    def test_bucket_never_exceeds_burst(self):
+        backend = SharedMemoryBackend(self.path)
+        self.assertIsNone(backend.acquire(1, 1.0, 2, 0))
+        self.clock.now += 3600
+        for _ in range(2):
+            self.assertIsNone(backend.acquire(1, 1.0, 2, 0))
+        self.assertIsNotNone(backend.acquire(1, 1.0, 2, 0))
+
+    def test_in_flight_cap(self):
+        backend = SharedMemoryBackend(self.path)
+        self.assertIsNone(backend.acquire(1, 0, 1, 2))
+        self.assertIsNone(backend.acquire(1, 0, 1, 2))
+        self.assertEqual(backend.acquire(1, 0, 1, 2), 1.0)
+        # Other keys are not affected
+        self.assertIsNone(backend.acquire(2, 0, 1, 2))
+
+        backend.release(1)
+        self.assertIsNone(backend.acquire(1, 0, 1, 2))
+
+    def test_unreleased_requests_expire(self):
+        backend = SharedMemoryBackend(self.path, stale_after=10)
+        self.assertIsNone(backend.acquire(1, 0, 1, 1))
+        self.assertEqual(backend.acquire(1, 0, 1, 1), 1.0)
+        self.clock.now += 11
+        self.assertIsNone(backend.acquire(1, 0, 1, 1))
+
+    def test_full_table_reclaims_idle_slots(self):
+        backend = SharedMemoryBackend(self.path, slots=2, stale_after=10)
+        self.assertIsNone(backend.acquire(1, 0, 1, 1))
+        self.assertIsNone(backend.acquire(2, 0, 1, 1))
+        # No free slot and none idle: rejected rather than sharing a slot
+        self.assertEqual(backend.acquire(3, 0, 1, 1), 1.0)
+        backend.release(3)
+        self.assertEqual(backend.acquire(1, 0, 1, 1), 1.0)
+
+        self.clock.now += 5
+        backend.release(2)
+        self.assertIsNone(backend.acquire(2, 0, 1, 1))
+        self.clock.now += 6
+        # Key 1 has been idle for 11 seconds, key 2 for 6
+        self.assertIsNone(backend.acquire(3, 0, 1, 1))
+        self.assertEqual(backend.acquire(3, 0, 1, 1), 1.0)
+        self.assertEqual(backend.acquire(2, 0, 1, 1), 1.0)
+
+
+class CacheBackendTests(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_in_flight_cap(self):
+        backend = CacheBackend()
+        self.assertIsNone(backend.acquire(1, 0, 1, 1))
+        self.assertEqual(backend.acquire(1, 0, 1, 1), 1.0)
+        backend.release(1)
+        self.assertIsNone(backend.acquire(1, 0, 1, 1))
+
+    def test_counter_expiring_before_incr(self):
+        backend = CacheBackend()
+        cache = caches['default']
+        incr = cache.incr
+        calls = []
+
+        def expiring_incr(key, *args, **kwargs):
+            if not calls:
+                calls.append(key)
+                cache.delete(key)
+            return incr(key, *args, **kwargs)
+
+        with mock.patch.object(cache, 'incr', expiring_incr):
+            self.assertIsNone(backend.acquire(1, 0, 1, 1))
+        self.assertEqual(calls, ['ratelimit:1:in_flight'])
+        self.assertEqual(backend.acquire(1, 0, 1, 1), 1.0)
+
+    def test_release_after_expiry(self):
+        backend = CacheBackend()
+        self.assertIsNone(backend.acquire(1, 0, 1, 1))
+        caches['default'].clear()
+        backend.release(1)
+
+
+class RateLimitMiddlewareTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('limits')
+        self.limited = APIKey.objects.create(user=user, name='limited', rate_limit=1, burst_limit=1)
+        self.unlimited = APIKey.objects.create(user=user, name='unlimited')
+
+    def test_limits_are_opt_in(self):
+        middleware = RateLimitMiddleware(lambda request: None)
+        self.assertIsNone(middleware.get_limits(self.unlimited.key))
+        self.assertEqual(middleware.get_limits(self.limited.key), (self.limited.id, 1.0, 1, 0))
+
+
+class NormalizeUrlTests(SimpleTestCase):
+    def test_variants_share_one_form(self):
+        variants = [
+            'https://Example.org/wiki/Caf%C3%A9/',
+            'https://example.org:443/wiki/Café',
+            'https://example.org/wiki/Caf%c3%a9#history',
+            'https%3A%2F%2Fexample.org%2Fwiki%2FCaf%C3%A9',
+        ]
+        self.assertEqual({normalize_url(url) for url in variants}, {'https://example.org/wiki/Caf%C3%A9'})
+        self.assertEqual(normalize_url('https://example.org/%7Euser'), normalize_url('https://example.org/~user'))
+
+    def test_encoded_delimiters_are_data(self):
+        self.assertEqual(normalize_url('https://example.org/a%3Fb'), 'https://example.org/a%3Fb')
+        self.assertNotEqual(normalize_url('https://example.org/a%3Fb'), normalize_url('https://example.org/a?b'))
+        self.assertNotEqual(normalize_url('https://example.org/a%2Fb'), normalize_url('https://example.org/a/b'))
+        self.assertNotEqual(normalize_url('https://example.org/a%23b'), normalize_url('https://example.org/a#b'))
+        self.assertEqual(normalize_url('https://example.org/?q=a%2Bb&c=d'), 'https://example.org/?q=a%2Bb&c=d')
+
+
+class LinkLookupTests(TestCase):
+    def test_one_link_per_normalized_url(self):
+        link = Link.objects.create(url='https://example.org/page/')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Link.objects.create(url='https://EXAMPLE.org/page')
+
+        found, created = Link.objects.for_url('https://example.org/page').get_or_create(
+            defaults={'url': 'https://example.org/page'}
+        )
+        self.assertEqual((found, created), (link, False))
+        self.assertEqual(Link.objects.lookup('https://example.org:443/page#top'), link)
+        with self.assertRaises(Link.DoesNotExist):
+            Link.objects.lookup('https://example.org/page%2F')
+
+
+class FactQuestionGroupsTests(SimpleTestCase):
+    ROWS = [
+        ('a', 1, 'a1', 0.9, True),
+        ('a', 2, 'a2', 0.5, False),
+        ('b', 3, 'b1', 0.8, True),
+        ('b', 4, 'b2', 0.1, True),
+        ('c', None, None, None, None),
+    ]
+
+    def groups(self, limit):
+        groups = FactQuestionGroups(
+            self.ROWS, limit, fact_rows=lambda fact_id: [row for row in self.ROWS if row[0] == fact_id]
+        )
+        return groups, [(fact_id, [q['text'] for q in questions]) for fact_id, questions in groups]
+
+    def test_everything_within_the_limit(self):
+        groups, facts = self.groups(10)
+        self.assertEqual(facts, [('a', ['a1', 'a2']), ('b', ['b1', 'b2']), ('c', [])])
+        self.assertFalse(groups.truncated)
+        self.assertEqual((groups.facts_count, groups.questions_count), (3, 4))
+
+    def test_fact_cut_short_is_left_out(self):
+        groups, facts = self.groups(3)
+        self.assertEqual(facts, [('a', ['a1', 'a2'])])
+        self.assertTrue(groups.truncated)
+        self.assertFalse(groups.partial)
+        self.assertEqual(groups.last_fact_id, 'a')
+
+    def test_limit_at_a_fact_boundary(self):
+        groups, facts = self.groups(4)
+        self.assertEqual(facts, [('a', ['a1', 'a2']), ('b', ['b1', 'b2'])])
+        self.assertTrue(groups.truncated)
+        self.assertEqual(groups.last_fact_id, 'b')
+
+    def test_first_fact_over_the_limit_is_returned_whole(self):
+        groups, facts = self.groups(1)
+        self.assertEqual(facts, [('a', ['a1', 'a2'])])
+        self.assertTrue(groups.truncated)
+        self.assertFalse(groups.partial)
+        self.assertEqual((groups.last_fact_id, groups.questions_count), ('a', 2))
+
+    def test_fact_over_the_maximum_is_partial(self):
+        with mock.patch('api.questions.MAX_QUESTIONS_LIMIT', 1):
+            groups, facts = self.groups(1)
+        self.assertEqual(facts, [('a', ['a1'])])
+        self.assertTrue(groups.partial)
+
+
+class BulkQuestionsTests(APITestCase):
+    @classmethod
+    def create_data(cls):
+        cls.dataset = Dataset.objects.create(name='bulk')
+        for index in range(5):
+            fact = Fact.objects.create(dataset=cls.dataset, fact_id=f'correct_{index}')
+            for rank in range(index % 3):
+                Question.objects.create(fact=fact, text=f'{fact.fact_id} q{rank}', score=rank / 10)
+
+    def test_paging_with_after_returns_every_fact_once(self):
+        facts, after = [], None
+        while True:
+            params = {'prefix': 'correct_', 'limit': 3}
+            if after:
+                params['after'] = after
+            data = self.get('/api/datasets/bulk/questions/', **params).json()
+            facts += [fact['fact_id'] for fact in data['facts']]
+            self.assertLessEqual(data['count'], 3)
+            if not data['truncated']:
+                break
+            after = data['next_after']
+        self.assertEqual(facts, [f'correct_{index}' for index in range(5)])
+
+    def test_facts_larger_than_the_limit_are_not_cut(self):
+        # correct_2 has two questions, more than the limit
+        facts, after = {}, 'correct_1'
+        while after:
+            data = self.get('/api/datasets/bulk/questions/', prefix='correct_', limit=1, after=after).json()
+            self.assertFalse(data['partial'])
+            facts.update((fact['fact_id'], fact['count']) for fact in data['facts'])
+            after = data['next_after']
+        self.assertEqual(facts, {'correct_2': 2, 'correct_3': 0, 'correct_4': 1})
+
+    def test_questions_ranked_and_missing_listed(self):
+        data = self.get('/api/datasets/bulk/questions/', fact_ids='correct_2,nope').json()
+        self.assertEqual(data['facts'][0]['fact_id'], 'correct_2')
+        self.assertEqual([q['text'] for q in data['facts'][0]['questions']], ['correct_2 q1', 'correct_2 q0'])
+        self.assertEqual(data['missing'], ['nope'])
+
+
+class QuestionPageTests(APITestCase):
+    """The page rendered by Postgres against the one built with the ORM"""
+
+    @classmethod
+    def create_data(cls):
+        dataset = create_dataset('page', facts=1, questions=2, documents=4)
+        fact = dataset.facts.get()
+        # Rank 2 has no results page
+        Question.objects.create(fact=fact, text='No page yet', score=0.1, is_fetchable=True)
+        links = list(Link.objects.filter(url__startswith='https://page.example.org/').order_by('url'))
+        Link.objects.filter(pk=links[0].pk).update(
+            title='Café “Eiffel” \u2014 tour 🗼', description='Line\nbreak\t"quoted" \\ \x7f',
+            scrape_count=3, last_scraped=datetime(2025, 1, 15, 10, 30, 0, 123456, tzinfo=dt_timezone.utc)
+        )
+        Link.objects.filter(pk=links[1].pk).update(
+            last_scraped=datetime(2025, 1, 15, 10, 30, tzinfo=dt_timezone.utc)
+        )
+        # Documents 1 and 3 are near-duplicates of document 0, document 2 is its own cluster
+        cluster = links[0].serp_content.pk
+        SerpContent.objects.filter(link__in=[links[0], links[1], links[3]]).update(cluster_id=cluster)
+        SerpContent.objects.filter(link=links[2]).update(cluster_id=links[2].serp_content.pk)
+        HtmlContent.objects.filter(question__fact=fact).update(content='<p>Résumé</p>\n<p>"x"</p>')
+
+    def both(self, path, **params):
+        with override_settings(QUESTION_PAGE_JSON_IN_DB=True):
+            in_db = self.get(path, **params)
+        with override_settings(QUESTION_PAGE_JSON_IN_DB=False):
+            orm = self.get(path, **params)
+        self.assertEqual(in_db.status_code, orm.status_code)
+        self.assertEqual(in_db.content, orm.content)
+        return in_db
+
+    def test_rendered_by_the_database(self):
+        fact = catalog.get_fact_or_404('page', 'f0')
+        for collapse in [False, True]:
+            self.assertIsNotNone(question_page_json(fact, 'page', 'f0', 0, True, collapse))
+
+    def test_same_bytes_as_the_orm(self):
+        for rank in [0, 1]:
+            for include_html in ['1', '0']:
+                response = self.both(f'/api/datasets/page/facts/f0/questions/{rank}/', include_html=include_html)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()['total_urls'], 4)
+
+    def test_collapsed_duplicates(self):
+        response = self.both('/api/datasets/page/facts/f0/questions/0/', collapse_duplicates='1')
+        urls = response.json()['available_urls']
+        self.assertEqual([url['url'] for url in urls], [
+            'https://page.example.org/doc-0', 'https://page.example.org/doc-2'
+        ])
+        self.assertEqual(urls[0]['duplicates'], ['https://page.example.org/doc-1', 'https://page.example.org/doc-3'])
+        self.assertEqual(urls[1]['duplicates'], [])
+
+    def test_missing_page(self):
+        response = self.both('/api/datasets/page/facts/f0/questions/2/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_rank_out_of_range(self):
+        for rank in [3, 50]:
+            response = self.both(f'/api/datasets/page/facts/f0/questions/{rank}/')
+            self.assertEqual(response.status_code, 404)
+            self.assertEqual(response.json()['error'], f'Question rank {rank} not found. Available ranks: 0-2')
+
+
+class SegmentStoreTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = SegmentStore(root=directory.name, segment_size=100)
+
+    def test_round_trip(self):
+        records = [(1, 'short'), (2, 'Ünïcödé 🗼 ' * 10), (3, ''), (4, 'x' * 500), (5, 'last')]
+        locations = self.store.append(1, records)
+        # A record goes to the next segment once the current one holds 100 bytes
+        self.assertEqual([segment for segment, _ in locations], [1, 1, 2, 2, 3])
+        self.assertEqual(self.store.segments(), [1, 2, 3])
+        self.assertEqual([self.store.read(*location) for location in locations], [body for _, body in records])
+        # Appending continues in the last segment
+        [location] = self.store.append(2, [(6, 'more')])
+        self.assertEqual(location, (3, RECORD.size + len('last')))
+        self.assertEqual(self.store.read(*location), 'more')
+
+    def test_corrupt_or_missing_records(self):
+        [(segment, offset)] = self.store.append(1, [(1, 'some text')])
+        with open(self.store.path(segment), 'r+b') as f:
+            f.seek(offset + RECORD.size + 2)
+            f.write(b'X')
+        store = SegmentStore(root=self.store.root)
+        with self.assertRaisesMessage(ColdStoreError, 'Corrupt record'):
+            store.read(segment, offset)
+        with self.assertRaisesMessage(ColdStoreError, 'No record'):
+            store.read(segment, offset + 1)
+        with self.assertRaisesMessage(ColdStoreError, 'missing'):
+            store.read(segment + 1, 0)
+
+
+class TextRangeTests(APITestCase):
+    """Slices of a document's text, served from the database and from the
+    cold store"""
+    TEXT = 'Añ 🗼 tower. ' * 50
+
+    @classmethod
+    def create_data(cls):
+        link = Link.objects.create(url='https://text.example.org/doc')
+        SerpContent.objects.create(link=link, url=link.url, text=cls.TEXT)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(COLD_STORE_ROOT=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # Segment maps of other tests' directories
+        patcher = mock.patch.object(cold_store, '_maps', {})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def text(self, range_header=None, **params):
+        headers = {'HTTP_RANGE': range_header} if range_header else {}
+        response = self.client.get(
+            '/api/serp-content/text/', {'url': 'https://text.example.org/doc', **params},
+            HTTP_X_API_KEY=self.api_key.key, **headers
+        )
+        return (
+            response.status_code, response.content,
+            *(response.get(header) for header in ['Content-Range', 'X-Total-Bytes', 'X-Next-Offset'])
+        )
+
+    def requests(self):
+        return [
+            self.text(),
+            self.text(offset=0, limit=10),
+            self.text(offset=3, limit=7),
+            self.text(offset=590, limit=100),
+            self.text(offset=5000),
+            self.text('bytes=0-5'),
+            self.text('bytes=3-4'),
+            self.text('bytes=-9'),
+            self.text('bytes=10-'),
+            self.text('bytes=100000-'),
+        ]
+
+    def tier(self, max_scrapes):
+        call_command('tier_documents', '--kind', 'serp', '--max-scrapes', str(max_scrapes), '--idle-days', '0',
+                     stdout=StringIO())
+        return SerpContent.objects.get(url='https://text.example.org/doc')
+
+    def test_slices(self):
+        data = self.TEXT.encode('utf-8')
+        status, content, _, total, next_offset = self.text(offset=3, limit=7)
+        self.assertEqual((status, content.decode('utf-8'), next_offset), (200, self.TEXT[3:10], '10'))
+        self.assertEqual(total, str(len(data)))
+        status, content, content_range, _, _ = self.text('bytes=3-4')
+        self.assertEqual((status, content, content_range), (206, data[3:5], f'bytes 3-4/{len(data)}'))
+        status, content, content_range, _, _ = self.text('bytes=-9')
+        self.assertEqual((status, content), (206, data[-9:]))
+        status, _, content_range, _, _ = self.text('bytes=100000-')
+        self.assertEqual((status, content_range), (416, f'bytes */{len(data)}'))
+
+    def test_cold_documents_are_sliced_the_same(self):
+        hot = self.requests()
+        serp_content = self.tier(max_scrapes=1000)
+        self.assertIsNone(serp_content.text)
+        self.assertIsNotNone(serp_content.cold_segment)
+        self.assertEqual(cold_store.read(serp_content.cold_segment, serp_content.cold_offset), self.TEXT)
+        self.assertEqual(self.requests(), hot)
+        # Requested again: brought back to the database
+        serp_content = self.tier(max_scrapes=0)
+        self.assertEqual(serp_content.text, self.TEXT)
+        self.assertIsNone(serp_content.cold_segment)
+        self.assertEqual(self.requests(), hot)
+
+    def test_tiering_locks_and_skips_rows_changed_meanwhile(self):
+        with CaptureQueriesContext(connection) as queries:
+            serp_content = self.tier(max_scrapes=1000)
+        self.assertTrue(any('FOR UPDATE' in query['sql'] for query in queries.captured_queries))
+        command = TierCommand(stdout=StringIO())
+        # Already frozen: not appended again
+        self.assertEqual(command.freeze(SerpContent, 'text', [serp_content.id]), 0)
+        # Saved since it was read as cold: the new text stays
+        serp_content.text = 'Saved meanwhile'
+        serp_content.save()
+        self.assertEqual(command.thaw(SerpContent, 'text', [serp_content.id]), 0)
+        self.assertEqual(SerpContent.objects.get(id=serp_content.id).text, 'Saved meanwhile')
+
+
+@override_settings(COALESCE_ACROSS_WORKERS=False, COALESCE_TIMEOUT=5)
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = directory.name
+        self.flight = SingleFlight(SharedFlights(self.path))
+
+    def run_concurrently(self, leader_render, follower_render):
+        """(leader result, follower result) of do() for the same key, the
+        follower joining while the leader renders"""
+        started, release = threading.Event(), threading.Event()
+        results = {}
+
+        def render():
+            started.set()
+            release.wait(5)
+            return leader_render()
+
+        def call(name, render):
+            try:
+                results[name] = self.flight.do('key', render)
+            except Exception as e:
+                results[name] = e
+
+        leader = threading.Thread(target=call, args=('leader', render))
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=call, args=('follower', follower_render))
+        follower.start()
+        while self.flight.stats()['requests'] < 2:
+            time.sleep(0.001)
+        release.set()
+        leader.join(5)
+        follower.join(5)
+        return results['leader'], results['follower']
+
+    def test_follower_shares_the_leader_response(self):
+        leader, follower = self.run_concurrently(
+            lambda: JsonResponse({'rendered': 'once'}), lambda: self.fail('rendered twice')
+        )
+        self.assertIs(follower, leader)
+        self.assertEqual(follower.response().content, b'{"rendered": "once"}')
+        stats = self.flight.stats()
+        self.assertEqual((stats['rendered'], stats['shared_in_worker'], stats['coalesced_rate']), (1, 1, 0.5))
+
+    def test_follower_renders_when_the_leader_fails(self):
+        def fail():
+            raise RuntimeError('leader failed')
+
+        leader, follower = self.run_concurrently(fail, lambda: HttpResponse(b'fallback'))
+        self.assertIsInstance(leader, RuntimeError)
+        self.assertEqual(follower.content, b'fallback')
+        self.assertEqual(self.flight.stats()['fallbacks'], 1)
+
+    def test_shared_across_workers(self):
+        leader, follower = SharedFlights(self.path), SharedFlights(self.path)
+        self.assertEqual(leader.join(42, 5), (True, 1))
+        renders, generation = follower.join(42, 5)
+        self.assertEqual((renders, generation), (False, 1))
+        # Another key in the same slot is not coalesced
+        self.assertEqual(follower.join(42 + follower.slots, 5), (True, None))
+        leader.finish(42, 1, SharedResponse(HttpResponse(b'body', status=201), link_ids=[7]), 5)
+        shared = follower.wait(42, generation, 5)
+        self.assertEqual((shared.status_code, shared.content, shared.extra), (201, b'body', {'link_ids': [7]}))
+        # The slot is free again
+        self.assertEqual(follower.join(42, 5), (True, 2))
+
+
+class RecordScrapeTests(TestCase):
+    def test_counts_without_flushing_the_serp_cache(self):
+        link = Link.objects.create(url='https://scrape.example.org/')
+        with self.captureOnCommitCallbacks() as callbacks:
+            record_scrape(link)
+            record_scrape(link)
+        self.assertEqual(callbacks, [])
+        link.refresh_from_db()
+        self.assertEqual(link.scrape_count, 2)
+        self.assertIsNotNone(link.last_scraped)
+
+
+class SerpCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # Entries of 1000 bytes each, four of which fit
+        self.cache = SerpCache(
+            max_bytes=4000, ttl=60, version=SharedVersion(os.path.join(directory.name, 'version'))
+        )
+
+    def document(self, key, size=1000):
+        url = f'https://cache.example.org/{key}'
+        return SerpDocument(1, url, None, 'x' * (size - len(url) - len(key) - ENTRY_OVERHEAD))
+
+    def fill(self, keys, requests=1):
+        for key in keys:
+            for _ in range(requests):
+                self.assertIsNone(self.cache.get(key))
+            self.assertTrue(self.cache.put(key, self.document(key)))
+
+    def test_bounded_by_bytes(self):
+        self.fill(['a', 'b', 'c', 'd'])
+        self.assertEqual(self.cache.stats()['bytes'], 4000)
+        self.assertFalse(self.cache.put('huge', self.document('huge', size=4001)))
+        # Requested more often than the least recently used entry: replaces it
+        self.cache.get('a')
+        for _ in range(2):
+            self.cache.get('e')
+        self.assertTrue(self.cache.put('e', self.document('e')))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('a'))
+        stats = self.cache.stats()
+        self.assertEqual((stats['entries'], stats['bytes']), (4, 4000))
+        self.assertEqual((stats['evicted'], stats['evicted_bytes']), (1, 1000))
+
+    def test_admission_by_frequency(self):
+        self.fill(['a', 'b', 'c', 'd'], requests=3)
+        # Asked for as often as the entry it would replace: not admitted
+        for _ in range(3):
+            self.cache.get('new')
+        self.assertFalse(self.cache.put('new', self.document('new')))
+        # A large document asked for once cannot push out the hot ones
+        self.cache.get('large')
+        self.assertFalse(self.cache.put('large', self.document('large', size=3000)))
+        self.assertEqual([self.cache.get(key) is not None for key in 'abcd'], [True] * 4)
+        # More popular than the two entries it replaces
+        for _ in range(10):
+            self.cache.get('large')
+        self.assertTrue(self.cache.put('large', self.document('large', size=2000)))
+        self.assertEqual([self.cache.get(key) is not None for key in 'abcd'], [False, False, True, True])
+        self.assertEqual(self.cache.stats()['rejected'], 2)
+
+    def test_invalidated_by_the_shared_version(self):
+        self.fill(['a'])
+        self.cache.invalidate()
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.stats()['invalidations'], 1)
+
+    def test_frequencies_fade(self):
+        sketch = FrequencySketch(16)
+        for _ in range(20):
+            sketch.increment('hot')
+        self.assertEqual(sketch.frequency('hot'), FrequencySketch.MAX_COUNT)
+        for index in range(sketch.sample_size):
+            sketch.increment(f'other-{index}')
+        self.assertLess(sketch.frequency('hot'), FrequencySketch.MAX_COUNT)
+
+
+class SerpDocumentCacheTests(TestCase):
+    def setUp(self):
+        self.link = Link.objects.create(url='https://cached.example.org/doc')
+        SerpContent.objects.create(link=self.link, url=self.link.url, title='Cached', text='Some text')
+        patcher = mock.patch('api.serp_payload.serp_cache', SerpCache(max_bytes=1 << 20, ttl=60))
+        self.cache = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_hits_skip_the_database_until_a_change(self):
+        document = serp_document('https://cached.example.org/doc')
+        with self.assertNumQueries(0):
+            self.assertEqual(serp_document('HTTPS://cached.example.org/doc/'), document)
+        with self.captureOnCommitCallbacks(execute=True):
+            SerpContent.objects.filter(link=self.link).get().save()
+        with self.assertNumQueries(1):
+            serp_document('https://cached.example.org/doc')
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['invalidations']), (1, 2, 1))
+
+
+class SerpContentEndpointTests(APITestCase):
+    URL = 'https://served.example.org/doc'
+
+    @classmethod
+    def create_data(cls):
+        cls.link = Link.objects.create(url=cls.URL, title='Served')
+        SerpContent.objects.create(
+            link=cls.link, url=cls.URL, title='Café “served”', language='fr', text='Añ 🗼 tower. ' * 50,
+            summary='A tower', authors=['Author'], keywords=['served', 'tower'],
+            publish_date=datetime(2020, 1, 2, 3, 4, 5, 678901, tzinfo=dt_timezone.utc)
+        )
+
+    def setUp(self):
+        # Every request reads the database
+        patcher = mock.patch('api.serp_payload.serp_cache', SerpCache(max_bytes=0))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(COLD_STORE_ROOT=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        patcher = mock.patch.object(cold_store, '_maps', {})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def json_response(self):
+        """What JsonResponse writes for the document, as for a content
+        without payload"""
+        serp_content = SerpContent.objects.get(link=self.link)
+        return JsonResponse({
+            'success': True,
+            'url': self.URL,
+            'fields_requested': None,
+            'scraped_at': serp_content.scraped_at.isoformat(),
+            'data': serp_content.get_selected_fields(),
+        }).content
+
+    def responses(self):
+        return [
+            serp_document_response(self.URL, serp_document(self.URL)).content,
+            self.get('/api/serp-content/', url=self.URL).content,
+            self.get(f'/api/serp-content/{self.URL}/').content,
+        ]
+
+    def test_payload_is_written_as_json_response_would(self):
+        expected = self.json_response()
+        self.assertIsNotNone(SerpContent.objects.get(link=self.link).payload)
+        self.assertEqual(self.responses(), [expected] * 3)
+
+        # Not built yet: encoded from the model fields
+        SerpContent.objects.filter(link=self.link).update(payload=None)
+        self.assertEqual(self.responses(), [expected] * 3)
+
+        # Cold: the text is read from the cold store
+        call_command('tier_documents', '--kind', 'serp', '--max-scrapes', '1000', '--idle-days', '0',
+                     stdout=StringIO())
+        serp_content = SerpContent.objects.get(link=self.link)
+        self.assertIsNone(serp_content.text)
+        self.assertIsNone(serp_content.payload)
+        self.assertIsNotNone(serp_content.cold_segment)
+        self.assertEqual(self.responses(), [expected] * 3)
+
+    def test_path_parameter_echoes_the_requested_url(self):
+        url = 'HTTPS://served.example.org/doc'
+        for params in ({}, {'fields': 'title'}):
+            response = self.get(f'/api/serp-content/{url}/', **params)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['url'], url, params)
+            response = self.get('/api/serp-content/', url=url, **params)
+            self.assertEqual(response.json()['url'], url, params)
+
+
+class SerpParserTests(SimpleTestCase):
+    PAGE = """<!doctype html><html><head><style>.g { color: red }</style>
+    <script>var a = "<a href='https://script.example.org/'><h3>Not a result</h3></a>";</script></head>
+    <body><div id="tads"><div class="g"><a href="https://ads.example.org/"><h3>Sponsored</h3></a></div></div>
+    <div class="ifM9O"><span class="hgKElc">The tower was built from <b>1887</b> to 1889.</span>
+      <a href="https://featured.example.org/eiffel"><h3>Eiffel Tower history</h3></a></div>
+    <div id="search">
+      <div class="g"><div><a href="/url?q=https://first.example.org/page%3Fid%3D1&amp;sa=U"><br><h3>First &amp; best</h3></a></div>
+        <div class="VwiC3b">Snippet <em>one</em>
+        with a line break.</div></div>
+      <div class="related-question-pair"><a href="https://related.example.org/"><h3>When was it built?</h3></a></div>
+      <div class="g"><a href="https://maps.google.com/place"><h3>On the map</h3></a></div>
+      <div class="MjjYud"><a href="https://second.example.org/"><h3>Second</h3></a></div>
+      <div class="g"><a href="https://first.example.org/page?id=1"><h3>First again</h3></a></div>
+    </div>
+    <div class="kp-wholepage"><h2 class="qrShPb">Eiffel Tower</h2>
+      <div data-attrid="subtitle">Tower in Paris, France</div>
+      <div class="kno-rdesc"><span>A wrought-iron lattice tower. <a href="https://en.wikipedia.org/wiki/Eiffel_Tower">Wikipedia</a></span></div>
+      <div data-attrid="kc:/location/location:address"><span class="w8qArf">Address: </span><span class="LrzXr">Champ de Mars, Paris</span></div>
+      <div data-attrid="hw:/collection/architectural_structures:height"><span class="w8qArf">Height: </span><span class="LrzXr">330 m</span></div>
+      <a href="https://kp.example.org/"><h3>Panel link</h3></a>
+    </div></body></html>"""
+
+    def test_parse_serp(self):
+        parsed = parse_serp(self.PAGE)
+        self.assertEqual(parsed['version'], PARSER_VERSION)
+        self.assertEqual(parsed['organic'], [
+            {'position': 1, 'title': 'First & best', 'url': 'https://first.example.org/page?id=1',
+             'snippet': 'Snippet one with a line break.'},
+            {'position': 2, 'title': 'Second', 'url': 'https://second.example.org/', 'snippet': None},
+        ])
+        self.assertEqual(parsed['featured_snippet'], {
+            'text': 'The tower was built from 1887 to 1889.',
+            'title': 'Eiffel Tower history',
+            'url': 'https://featured.example.org/eiffel',
+        })
+        self.assertEqual(parsed['knowledge_panel'], {
+            'title': 'Eiffel Tower',
+            'subtitle': 'Tower in Paris, France',
+            'description': 'A wrought-iron lattice tower.',
+            'source_url': 'https://en.wikipedia.org/wiki/Eiffel_Tower',
+            'facts': [{'label': 'Address', 'value': 'Champ de Mars, Paris'}, {'label': 'Height', 'value': '330 m'}],
+        })
+
+    def test_list_featured_snippet_and_empty_page(self):
+        parsed = parse_serp(
+            '<block-component><ol><li>Step one</li><li>Step <b>two</b></li></ol>'
+            '<a href="/url?url=https://steps.example.org/"><h3>Steps</h3></a></block-component>'
+        )
+        self.assertEqual(parsed['featured_snippet'], {
+            'text': 'Step one\nStep two', 'title': 'Steps', 'url': 'https://steps.example.org/'
+        })
+        self.assertEqual(parsed['organic'], [])
+        self.assertEqual(parse_serp(None), {
+            'version': PARSER_VERSION, 'organic': [], 'featured_snippet': None, 'knowledge_panel': None
+        })
+
+    def test_result_url(self):
+        self.assertEqual(result_url('/url?q=https://a.example.org/x&sa=U'), 'https://a.example.org/x')
+        self.assertIsNone(result_url('/search?q=eiffel'))
+        self.assertIsNone(result_url('https://www.google.com/search?q=x'))
+        self.assertIsNone(result_url('https://lh3.googleusercontent.com/image'))
+        self.assertEqual(result_url('http://example.org/'), 'http://example.org/')
+
+
+FILLER = 'Paris has many museums, gardens and cafes. ' * 14
+
+
+class PassageRankingTests(APITestCase):
+    """BM25 ranking of a question's evidence passages and its budgets"""
+    TEXTS = [
+        # Two passages: the first mentions every query term, twice for two
+        'The Eiffel Tower was built for the fair; the tower was built in two years. ' + FILLER + '\n\n' + FILLER,
+        'Eiffel designed bridges. ' + FILLER + '\n\n' + FILLER,
+        'The tower was built in 1889.',
+    ]
+
+    @classmethod
+    def create_data(cls):
+        dataset = Dataset.objects.create(name='ranked')
+        fact = Fact.objects.create(dataset=dataset, fact_id='f0')
+        cls.question = Question.objects.create(
+            fact=fact, text='When was the Eiffel Tower built?', score=0.9, is_fetchable=True
+        )
+        page = HtmlContent.objects.create(question=cls.question, content='<html></html>')
+        cls.contents = []
+        for index, text in enumerate(cls.TEXTS):
+            link = Link.objects.create(url=f'https://ranked.example.org/doc-{index}', title=f'Document {index}')
+            cls.contents.append(SerpContent.objects.create(link=link, url=link.url, language='en', text=text))
+            HtmlContentUrl.objects.create(html_content=page, link=link, rank=index)
+
+    def rank(self, **limits):
+        terms = list(dict.fromkeys(tokenize(self.question.text)))
+        return rank_passages(question_documents(self.question), terms, **limits)
+
+    def test_split_passages(self):
+        # Short paragraphs are merged
+        self.assertEqual(split_passages('One.\n\nTwo.\n'), [(0, 10)])
+        # Paragraphs that do not fit together are kept apart
+        text = self.TEXTS[0]
+        first, second = text.split('\n\n')
+        self.assertEqual(
+            split_passages(text), [(0, len(first.rstrip())), (len(first) + 2, len(first) + 2 + len(second.rstrip()))]
+        )
+        long = 'A sentence that goes on. ' * 100
+        spans = split_passages(long.strip())
+        self.assertEqual(spans[0], (0, long.rfind('. ', 0, 1000) + 1))
+        self.assertTrue(all(end - start <= PASSAGE_CHARS for start, end in spans))
+        self.assertEqual(spans[-1][1], len(long.strip()))
+
+    def test_passage_index(self):
+        passages, postings = passage_index(self.TEXTS[0])
+        self.assertEqual([tuple(passage[:2]) for passage in passages], split_passages(self.TEXTS[0]))
+        self.assertEqual((postings['eiffel'], postings['tower'], postings['built']), ('0', '0:2', '0:2'))
+        self.assertEqual(postings['paris'], '0:14 1:14')
+        self.assertNotIn('the', postings)
+
+    def test_ranking_order(self):
+        passages, considered = self.rank()
+        self.assertEqual(considered, 5)
+        # Passages without any query term are never returned
+        self.assertEqual(
+            [(passage['url'][-5:], passage['passage']) for passage in passages],
+            [('doc-0', 0), ('doc-2', 0), ('doc-1', 0)]
+        )
+        scores = [passage['score'] for passage in passages]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        for passage in passages:
+            text = self.TEXTS[int(passage['url'][-1])]
+            self.assertEqual(passage['text'], text[passage['start']:passage['end']])
+            self.assertEqual(passage['chars'], passage['end'] - passage['start'])
+
+    def test_top_k(self):
+        passages, _ = self.rank(top_k=1)
+        self.assertEqual([(passage['url'][-5:], passage['passage']) for passage in passages], [('doc-0', 0)])
+
+    def test_budgets_skip_passages_that_do_not_fit(self):
+        best, short = len(self.TEXTS[0].split('\n\n')[0].rstrip()), len(self.TEXTS[2])
+        for limits in ({'max_chars': 100}, {'max_tokens': 10}):
+            passages, _ = self.rank(**limits)
+            # The best passage is too long, the shorter one below it still fits
+            self.assertEqual([passage['url'][-5:] for passage in passages], ['doc-2'], limits)
+            self.assertEqual(passages[0]['chars'], short)
+        passages, _ = self.rank(max_chars=best + short)
+        self.assertEqual([passage['url'][-5:] for passage in passages], ['doc-0', 'doc-2'])
+        self.assertLessEqual(sum(passage['chars'] for passage in passages), best + short)
+
+    def test_index_rebuilt_on_save(self):
+        content = self.contents[1]
+        self.assertNotIn('lattice', PassageIndex.objects.get(serp_content=content).postings)
+        content.text = 'Eiffel built a wrought iron lattice tower.'
+        content.save()
+        index = PassageIndex.objects.get(serp_content=content)
+        self.assertEqual(index.passages, [[0, len(content.text), 6]])
+        self.assertEqual(index.postings['lattice'], '0')
+        passages, _ = self.rank()
+        self.assertEqual(passages[0]['url'][-5:], 'doc-1')
+        self.assertEqual(passages[0]['text'], content.text)
+
+    def test_endpoint(self):
+        path = '/api/datasets/ranked/facts/f0/questions/0/passages/'
+        response = self.get(path, k=2, max_tokens=200)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['query_terms'], ['eiffel', 'tower', 'built'])
+        self.assertEqual((data['documents'], data['passages_considered'], data['count']), (3, 5, 2))
+        self.assertLessEqual(data['total_tokens'], 200)
+        self.assertNotIn('link_id', data['passages'][0])
+        self.assertEqual(self.get(path, k=0).status_code, 400)
+        self.assertEqual(self.get(path, max_chars='many').status_code, 400)
+
+
+class ReleaseTests(APITestCase):
+    """Fact hashes, releases and the delta between them"""
+
+    @classmethod
+    def create_data(cls):
+        cls.dataset = create_dataset('released', facts=4, questions=2, documents=2)
+        # A document linked from f2 alone
+        cls.own_link = Link.objects.create(url='https://released.example.org/own', title='Own')
+        SerpContent.objects.create(link=cls.own_link, url=cls.own_link.url, text='Only for f2')
+        HtmlContentUrl.objects.create(
+            html_content=HtmlContent.objects.filter(question__fact__fact_id='f2').order_by('id')[0],
+            link=cls.own_link, rank=5
+        )
+
+    def hashes(self):
+        return dict(fact_hashes(self.dataset))
+
+    def changed(self, before):
+        after = self.hashes()
+        self.assertEqual(after.keys(), before.keys())
+        return sorted(fact_id for fact_id in after if after[fact_id] != before[fact_id])
+
+    def question(self, fact_id):
+        return Question.objects.filter(fact__fact_id=fact_id, is_fetchable=True).order_by('id')[0]
+
+    def test_hashes_are_stable(self):
+        hashes = self.hashes()
+        self.assertEqual(list(hashes), ['f0', 'f1', 'f2', 'f3'])
+        self.assertEqual(self.hashes(), hashes)
+
+        # Ingested again in another order: new ids, same hash
+        fact = Fact.objects.get(dataset=self.dataset, fact_id='f3')
+        questions = list(fact.questions.order_by('id'))
+        pages = {page.question_id: page for page in HtmlContent.objects.filter(question__fact=fact)}
+        urls = {
+            page_id: list(HtmlContentUrl.objects.filter(html_content_id=page_id).values_list('link_id', 'rank'))
+            for page_id in [page.id for page in pages.values()]
+        }
+        fact.questions.all().delete()
+        for question in reversed(questions):
+            copy = Question.objects.create(
+                fact=fact, text=question.text, score=question.score, is_fetchable=question.is_fetchable
+            )
+            page = pages.get(question.id)
+            if page is not None:
+                copy_page = HtmlContent.objects.create(question=copy, content=page.content)
+                for link_id, rank in reversed(urls[page.id]):
+                    HtmlContentUrl.objects.create(html_content=copy_page, link_id=link_id, rank=rank)
+        self.assertEqual(self.hashes(), hashes)
+
+    def test_hash_changes_with_questions(self):
+        before = self.hashes()
+        question = self.question('f0')
+        question.text = 'When was the Eiffel Tower finished?'
+        question.save()
+        question = self.question('f1')
+        question.score = 0.5
+        question.save()
+        Question.objects.create(fact=Fact.objects.get(dataset=self.dataset, fact_id='f3'), text='New', score=0.1)
+        self.assertEqual(self.changed(before), ['f0', 'f1', 'f3'])
+
+    def test_hash_changes_with_html_content(self):
+        before = self.hashes()
+        page = HtmlContent.objects.get(question=self.question('f1'))
+        page.content = '<html><body><h1>Other results</h1></body></html>'
+        page.save()
+        self.assertEqual(self.changed(before), ['f1'])
+
+    def test_hash_changes_with_serp_documents(self):
+        before = self.hashes()
+        serp_content = SerpContent.objects.get(link=self.own_link)
+        serp_content.text = 'Changed for f2'
+        serp_content.save()
+        self.assertEqual(self.changed(before), ['f2'])
+        before = self.hashes()
+        Link.objects.filter(id=self.own_link.id).update(is_active=False)
+        self.assertEqual(self.changed(before), ['f2'])
+
+    def test_missing_content_hashes_are_filled(self):
+        hashes = self.hashes()
+        HtmlContent.objects.filter(dataset=self.dataset).update(content_hash=None)
+        SerpContent.objects.update(content_hash=None)
+        release, _ = create_release(self.dataset)
+        self.assertEqual(release.fact_hashes(), hashes)
+
+    def test_diff(self):
+        self.assertEqual(
+            diff({'a': '1', 'b': '2', 'c': '3'}, {'b': '2', 'c': '4', 'd': '5'}),
+            ({'d': '5'}, {'c': '4'}, ['a'])
+        )
+
+    def test_releases_and_delta(self):
+        first, created = create_release(self.dataset)
+        self.assertEqual((first.version, created, first.added_count, first.facts_count), (1, True, 4, 4))
+        self.assertEqual(create_release(self.dataset), (first, False))
+
+        question = self.question('f0')
+        question.text = 'Changed'
+        question.save()
+        Fact.objects.get(dataset=self.dataset, fact_id='f3').delete()
+        Fact.objects.create(dataset=self.dataset, fact_id='f4')
+        second, created = create_release(self.dataset)
+        hashes = self.hashes()
+        self.assertEqual(
+            (second.version, created, second.added_count, second.changed_count, second.removed_count),
+            (2, True, 1, 1, 1)
+        )
+        self.assertEqual(second.fact_hashes(), hashes)
+
+        response = self.get('/api/datasets/released/releases/latest/')
+        self.assertEqual((response.status_code, response.json()['facts']), (200, hashes))
+        not_modified = self.client.get(
+            '/api/datasets/released/releases/2/', HTTP_X_API_KEY=self.api_key.key, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(not_modified.status_code, 304)
+
+        delta = self.get('/api/datasets/released/releases/latest/delta/', since=1).json()
+        self.assertEqual((delta['since'], delta['version']), (1, 2))
+        self.assertEqual(delta['added'], {'f4': hashes['f4']})
+        self.assertEqual(delta['changed'], {'f0': hashes['f0']})
+        self.assertEqual(delta['removed'], ['f3'])
+        delta = self.get('/api/datasets/released/releases/2/delta/', since=2).json()
+        self.assertEqual((delta['added'], delta['changed'], delta['removed']), ({}, {}, []))
+        self.assertEqual(self.get('/api/datasets/released/releases/1/delta/', since=2).status_code, 400)
+        self.assertEqual(self.get('/api/datasets/released/releases/2/delta/', since=9).status_code, 404)
+        self.assertEqual(self.get('/api/datasets/released/releases/2/delta/').status_code, 400)
+
+    def test_release_dataset_command(self):
+        out = StringIO()
+        call_command('release_dataset', 'released', stdout=out)
+        self.question('f1').delete()
+        call_command('release_dataset', 'released', '--keep', '1', stdout=out)
+        call_command('release_dataset', 'released', stdout=out)
+        self.assertIn('released: release 2 with 4 facts (0 added, 1 changed, 0 removed)', out.getvalue())
+        self.assertIn('released: removed 1 old releases', out.getvalue())
+        self.assertIn('released: unchanged since release 2', out.getvalue())
+        self.assertEqual(list(self.dataset.releases.values_list('version', flat=True)), [2])
+        with self.assertRaises(CommandError):
+            call_command('release_dataset', 'missing', stdout=out)
+
+
+class SnapshotTests(APITestCase):
+    @classmethod
+    def create_data(cls):
+        fact = Fact.objects.create(dataset=Dataset.objects.create(name='snap'), fact_id='f1')
+        Question.objects.create(fact=fact, text='q', score=0.5, is_fetchable=True)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        settings = override_settings(SNAPSHOT_ROOT=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def snapshot(self, *args):
+        call_command('snapshot_dataset', 'snap', *args, stdout=StringIO())
+
+    def test_label_is_appended_to_the_timestamp(self):
+        self.snapshot('--label', 'baseline')
+        [version] = list_versions('snap')
+        self.assertRegex(version, r'^[0-9]{8}T[0-9]{6}Z-baseline$')
+        self.assertEqual(resolve_version('snap', 'latest').name, version)
+
+    def test_labels_cannot_leave_the_dataset_directory(self):
+        for label in ['../outside', '.hidden', 'a/b']:
+            with self.assertRaises(CommandError):
+                self.snapshot('--label', label)
+        self.assertEqual(list(self.root.iterdir()), [])
+
+    def test_staging_directory_is_not_a_version(self):
+        staging = dataset_snapshot_dir('snap') / '.20250101T000000Z.tmp'
+        staging.mkdir(parents=True)
+        (staging / MANIFEST_NAME).write_text('{}')
+        self.assertEqual(list_versions('snap'), [])
+
+
+class ClusterDuplicatesTests(TestCase):
+    def setUp(self):
+        article = ' '.join(f'word{index}' for index in range(200))
+        self.contents = []
+        for index, text in enumerate([article, article + ' and one more', 'Something else entirely. ' * 20, '... !!!']):
+            link = Link.objects.create(url=f'https://dup.example.org/{index}')
+            self.contents.append(SerpContent.objects.create(link=link, url=link.url, text=text))
+
+    def cluster(self):
+        call_command('cluster_duplicates', stdout=StringIO())
+        return [SerpContent.objects.get(pk=content.pk) for content in self.contents]
+
+    def test_near_duplicates_share_a_cluster(self):
+        first, second, other, wordless = self.cluster()
+        self.assertEqual(first.cluster_id, first.pk)
+        self.assertEqual(second.cluster_id, first.pk)
+        self.assertEqual(other.cluster_id, other.pk)
+        self.assertIsNone(wordless.cluster_id)
+
+    def test_text_without_words_is_signed_once(self):
+        wordless = self.cluster()[3]
+        self.assertEqual(bytes(wordless.minhash), EMPTY_SIGNATURE)
+        output = StringIO()
+        call_command('cluster_duplicates', stdout=output)
+        self.assertIn('Signed 0 documents', output.getvalue())
+
+    def test_large_buckets_are_verified_in_batches(self):
+        signatures = {node: bytes(512) for node in range(1, 8)}
+        signatures[4] = b'\x01' * 512
+        loaded = []
+
+        def load(ids):
+            loaded.append(len(ids))
+            return {node: signatures[node] for node in ids}
+
+        clusters = find_clusters([list(range(1, 8))], load, batch_size=3)
+        self.assertEqual(clusters, {1: 1, 2: 1, 3: 1, 5: 1, 6: 1, 7: 1})
+        self.assertLessEqual(max(loaded), 4)
+
+
+@override_settings(CATALOG_TTL=3600)
+class AdminCatalogTests(TestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dataset = Dataset.objects.create(name='admin-catalog')
+        self.client.force_login(User.objects.create_superuser('admin'))
+
+    def run_action(self, action):
+        response = self.client.post(
+            '/admin/api/dataset/', {'action': action, '_selected_action': [self.dataset.pk]}
+        )
+        self.assertEqual(response.status_code, 302)
+
+    def test_dataset_actions_reload_the_catalog(self):
+        self.assertEqual(catalog.dataset_id('admin-catalog'), self.dataset.pk)
+        self.run_action('deactivate_datasets')
+        self.assertIsNone(catalog.dataset_id('admin-catalog'))
+        self.run_action('activate_datasets')
+        self.assertEqual(catalog.dataset_id('admin-catalog'), self.dataset.pk)
+
+
+class JobAccessTests(APITestCase):
+    @classmethod
+    def create_data(cls):
+        cls.own = Job.objects.create(
+            kind='fact.export', status=Job.SUCCEEDED, created_by=cls.user, result={'file': 'own.jsonl'}
+        )
+        cls.other = Job.objects.create(
+            kind='fact.export', status=Job.SUCCEEDED, created_by=User.objects.create_user('other'),
+            result={'file': 'other.jsonl'}
+        )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for name in ['own.jsonl', 'other.jsonl']:
+            Path(directory.name, name).write_text(f'{name}\n')
+        settings = override_settings(EXPORT_ROOT=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_own_job(self):
+        response = self.get(f'/api/jobs/{self.own.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['download_url'].endswith(f'/api/jobs/{self.own.pk}/download/'))
+        response = self.get(f'/api/jobs/{self.own.pk}/download/')
+        self.assertEqual(b''.join(response.streaming_content), b'own.jsonl\n')
+
+    def test_job_of_another_user_is_not_found(self):
+        self.assertEqual(self.get(f'/api/jobs/{self.other.pk}/').status_code, 404)
+        self.assertEqual(self.get(f'/api/jobs/{self.other.pk}/download/').status_code, 404)
+
+    def test_staff_see_every_job(self):
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        self.assertEqual(self.get(f'/api/jobs/{self.other.pk}/').status_code, 200)
+        self.assertEqual(self.get(f'/api/jobs/{self.other.pk}/download/').status_code, 200)
+
+
+class ClientTests(LiveServerTestCase):
+    """The Python client against a live local instance"""
+
+    def setUp(self):
+        self.api_key = APIKey.objects.create(user=User.objects.create_user('client'), name='client')
+        create_dataset('live', facts=3)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        # Limiter state of this test only
+        patcher = mock.patch.object(ratelimit, '_backend', SharedMemoryBackend(os.path.join(directory.name, 'limits')))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def client_for(self, **options):
+        client = FactCheckClient(self.api_key.key, base_url=f'{self.live_server_url}/api', **options)
+        self.addCleanup(client.close)
+        return client
+
+    def test_datasets_facts_and_questions(self):
+        client = self.client_for()
+        self.assertIn('live', [dataset['name'] for dataset in client.datasets()])
+        self.assertEqual(sorted(fact['fact_id'] for fact in client.facts('live')), ['f0', 'f1', 'f2'])
+        questions = client.questions('live', 'f0')
+        self.assertEqual(len(questions), 3)
+        with self.assertRaises(NotFound):
+            client.questions('live', 'missing')
+
+    def test_iter_questions_follows_pages(self):
+        client = self.client_for()
+        facts = list(client.iter_questions('live', prefix='f', limit=4))
+        self.assertEqual([fact['fact_id'] for fact in facts], ['f0', 'f1', 'f2'])
+        self.assertTrue(all(fact['count'] == 3 for fact in facts))
+
+    def test_iter_questions_completes_partial_facts(self):
+        client = self.client_for()
+        with mock.patch('api.questions.MAX_QUESTIONS_LIMIT', 2):
+            facts = list(client.iter_questions('live', prefix='f', limit=1))
+        self.assertEqual([(fact['fact_id'], fact['count']) for fact in facts], [('f0', 3), ('f1', 3), ('f2', 3)])
+
+    def test_serp_content_and_concurrent_fetching(self):
+        client = self.client_for(max_workers=2)
+        document = client.serp_content('https://live.example.org/doc-1/', fields=['title'])
+        self.assertEqual(document['data'], {'title': 'Document 1'})
+
+        urls = [f'https://live.example.org/doc-{index}' for index in range(3)] + ['https://live.example.org/none']
+        results = dict(client.map_serp_content(urls))
+        self.assertEqual(list(results), urls)
+        self.assertEqual(results[urls[2]]['data']['title'], 'Document 2')
+        self.assertIsInstance(results[urls[3]], NotFound)
+        self.assertTrue(client.serp_text(urls[0], limit=8).startswith('Document'))
+
+    def test_question_page_and_evidence(self):
+        client = self.client_for()
+        page = client.question_page('live', 'f1', 0, include_html=False)
+        self.assertEqual(page['question']['text'], 'When was the Eiffel Tower built? (1.0)')
+        self.assertEqual(
+            [url['url'] for url in page['available_urls']],
+            [f'https://live.example.org/doc-{index}' for index in range(3)]
+        )
+        evidence = dict(client.iter_evidence('live', fields=['title']))
+        self.assertEqual(sorted(evidence), ['f0', 'f1', 'f2'])
+
+    def test_disk_cache_revalidates_with_etag(self):
+        client = self.client_for(cache_dir=self.directory)
+        statuses = []
+        request = client.pool.request
+
+        def recording_request(*args, **kwargs):
+            response = request(*args, **kwargs)
+            statuses.append(response[0])
+            return response
+
+        with mock.patch.object(client.pool, 'request', recording_request):
+            first = client.facts('live')
+            second = client.facts('live')
+        self.assertEqual(first, second)
+        self.assertEqual(statuses, [200, 304])
+
+    def test_rate_limited_requests_are_retried(self):
+        APIKey.objects.filter(pk=self.api_key.pk).update(rate_limit=2, burst_limit=1)
+        client = self.client_for(backoff_factor=0.01)
+        statuses = []
+        request = client.pool.request
+
+        def recording_request(*args, **kwargs):
+            response = request(*args, **kwargs)
+            statuses.append(response[0])
+            return response
+
+        with mock.patch.object(client.pool, 'request', recording_request):
+            for _ in range(2):
+                client.datasets()
+        self.assertEqual(statuses[0], 200)
+        self.assertIn(429, statuses)
+        self.assertEqual(statuses[-1], 200)
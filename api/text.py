@@ -0,0 +1,104 @@
+import hashlib
+import math
+import re
+from collections import Counter
+
+# Rough characters-per-token ratio of BPE tokenizers on English text
+CHARS_PER_TOKEN = 4
+
+
+def text_statistics(text):
+    """Return (characters, words, approximate LLM tokens) for a text"""
+    if not text:
+        return 0, 0, 0
+    chars = len(text)
+    return chars, len(text.split()), math.ceil(chars / CHARS_PER_TOKEN)
+
+
+def content_hash(data):
+    """Hex digest identifying a document's content, compared between dataset
+    releases (api.releases)"""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+# Passages are paragraphs merged or split to about this many characters
+# (roughly 250 tokens), small enough to pack several into a prompt
+PASSAGE_CHARS = 1000
+# Bump when tokenization or splitting changes, so backfill_passages rebuilds
+PASSAGE_INDEX_VERSION = 1
+
+TOKEN_RE = re.compile(r'\w+')
+PARAGRAPH_RE = re.compile(r'\S[^\n]*(?:\n(?!\s*\n)[^\n]*)*')
+SENTENCE_END_RE = re.compile(r'[.!?]["\')\]]*\s+')
+STOPWORDS = frozenset(
+    'a about above after again against all am an and any are as at be because been before being '
+    'below between both but by can did do does doing down during each few for from further had has '
+    'have having he her here hers herself him himself his how i if in into is it its itself just me '
+    'more most my myself no nor not now of off on once only or other our ours ourselves out over own '
+    's same she should so some such t than that the their theirs them themselves then there these '
+    'they this those through to too under until up very was we were what when where which while who '
+    'whom why will with you your yours yourself yourselves'.split()
+)
+
+
+def tokenize(text):
+    """Lowercase word tokens of a text, without stopwords (no stemming)"""
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+def _split_long(text, start, end, size):
+    """Spans of at most size characters covering text[start:end], cut after
+    sentence ends where possible and otherwise at whitespace"""
+    spans = []
+    while end - start > size:
+        window = text[start:start + size]
+        cuts = [match.end() for match in SENTENCE_END_RE.finditer(window)]
+        cut = cuts[-1] if cuts and cuts[-1] > size // 2 else window.rfind(' ') + 1 or size
+        spans.append((start, start + len(window[:cut].rstrip())))
+        start += cut
+        while start < end and text[start].isspace():
+            start += 1
+    if start < end:
+        spans.append((start, end))
+    return spans
+
+
+def split_passages(text, size=PASSAGE_CHARS):
+    """(start, end) character spans of the passages of a text: paragraphs
+    merged while they fit in size characters, longer ones split"""
+    spans = []
+    for match in PARAGRAPH_RE.finditer(text or ''):
+        start, end = match.start(), len(match.group().rstrip()) + match.start()
+        if spans and end - spans[-1][0] <= size:
+            spans[-1] = (spans[-1][0], end)
+        elif end - start > size:
+            spans.extend(_split_long(text, start, end, size))
+        else:
+            spans.append((start, end))
+    return spans
+
+
+def passage_index(text):
+    """Passages of a text as [start, end, tokens], and the passages each term
+    occurs in as {term: postings}, where postings is a string like "0 3:2 7"
+    (passage numbers, with the frequency when it is above 1). Strings keep
+    the stored JSON several times smaller than nested arrays."""
+    passages = []
+    postings = {}
+    for number, (start, end) in enumerate(split_passages(text)):
+        tokens = tokenize(text[start:end])
+        passages.append([start, end, len(tokens)])
+        for term, frequency in Counter(tokens).items():
+            postings.setdefault(term, []).append(f'{number}:{frequency}' if frequency > 1 else str(number))
+    return passages, {term: ' '.join(entries) for term, entries in postings.items()}
+
+
+def parse_postings(postings):
+    """(passage, frequency) pairs of a postings string from passage_index"""
+    pairs = []
+    for entry in (postings or '').split():
+        number, _, frequency = entry.partition(':')
+        pairs.append((int(number), int(frequency or 1)))
+    return pairs
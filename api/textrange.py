@@ -0,0 +1,152 @@
+"""
+Partial reads of large text columns (`SerpContent.text`,
+`HtmlContent.content`), served as plain text instead of JSON.
+
+A client asks for a character window with the `offset`/`limit` query
+parameters, or for a byte range of the UTF-8 text with a `Range: bytes=...`
+header. Either way the slice is cut by the database (`substring`), so only
+the start of a multi-megabyte value is read and nothing past the window is
+sent to Django. Values moved to the cold store (api.coldstore) are sliced
+from its memory-mapped segment instead.
+"""
+import re
+
+from django.db.models import BinaryField, Func, IntegerField, Value
+from django.db.models.functions import Substr
+from django.http import HttpResponse
+
+from .coldstore import COLD_COLUMNS, cold_store
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+TEXT_CONTENT_TYPE = 'text/plain; charset=utf-8'
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+class OctetLength(Func):
+    """Size in bytes of a text column (read from the TOAST header in Postgres,
+    without fetching the value)"""
+    function = 'octet_length'
+    output_field = IntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='length(CAST(%(expressions)s AS BLOB))', **extra_context)
+
+
+class Utf8Bytes(Func):
+    """UTF-8 encoding of a text expression"""
+    template = "convert_to(%(expressions)s, 'UTF8')"
+    output_field = BinaryField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='CAST(%(expressions)s AS BLOB)', **extra_context)
+
+
+def byte_slice(field_name, start, end):
+    """Bytes start..end (inclusive) of the UTF-8 encoding of a text column.
+    A character is at least one byte, so only the first end + 1 characters
+    are read and encoded."""
+    return Func(
+        Utf8Bytes(Substr(field_name, 1, end + 1)), Value(start + 1), Value(end - start + 1),
+        function='substr', output_field=BinaryField()
+    )
+
+
+def parse_range(header, total):
+    """(start, end) of a single `bytes=` range of a value of total bytes.
+
+    Returns None when the header should be ignored (absent, malformed or
+    asking for several ranges), so the whole value is sent, and raises
+    RangeNotSatisfiable when the range starts past the end.
+    """
+    match = RANGE_RE.match(header.replace(' ', '')) if header else None
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first == '':
+        # Suffix range: the last N bytes
+        length = int(last)
+        if not length or not total:
+            raise RangeNotSatisfiable
+        return max(total - length, 0), total - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= total:
+        raise RangeNotSatisfiable
+    return start, min(int(last), total - 1) if last else total - 1
+
+
+def parse_window(params):
+    """(offset, limit) from the offset/limit query parameters, or None when
+    neither is given; raises ValueError on invalid values"""
+    if params.get('offset') is None and params.get('limit') is None:
+        return None
+    try:
+        offset = int(params.get('offset') or 0)
+        limit = int(params['limit']) if params.get('limit') else None
+    except ValueError:
+        raise ValueError('offset and limit must be integers')
+    if offset < 0 or (limit is not None and limit < 1):
+        raise ValueError('offset must be >= 0 and limit >= 1')
+    return offset, limit
+
+
+def text_response(request, queryset, field_name):
+    """Plain-text response with field_name of the row selected by queryset:
+    a character window, a byte range or the whole value. None when there is
+    no such row; raises ValueError on invalid offset/limit parameters."""
+    window = parse_window(request.GET)
+    rows = queryset.annotate(total_bytes=OctetLength(field_name))
+
+    if window is not None:
+        offset, limit = window
+        # One character more than asked for tells whether the text goes on
+        row = rows.annotate(part=Substr(field_name, offset + 1, limit + 1 if limit else None)).values_list(
+            'part', 'total_bytes', *COLD_COLUMNS
+        ).first()
+        if row is None:
+            return None
+        part, total = row[0] or '', row[1] or 0
+        if row[2] is not None:
+            data = cold_store.read_bytes(row[2], row[3])
+            part, total = data.decode('utf-8')[offset:offset + limit + 1 if limit else None], len(data)
+        more = limit is not None and len(part) > limit
+        response = HttpResponse(part[:limit] if more else part, content_type=TEXT_CONTENT_TYPE)
+        response['X-Text-Offset'] = offset
+        if more:
+            response['X-Next-Offset'] = offset + limit
+    else:
+        row = rows.values_list('pk', 'total_bytes', *COLD_COLUMNS).first()
+        if row is None:
+            return None
+        total = row[1] or 0
+        cold = cold_store.read_bytes(row[2], row[3]) if row[2] is not None else None
+        if cold is not None:
+            total = len(cold)
+        try:
+            byte_range = parse_range(request.headers.get('Range'), total)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416, content_type=TEXT_CONTENT_TYPE)
+            response['Content-Range'] = f'bytes */{total}'
+            return response
+
+        if byte_range is None:
+            value = cold if cold is not None else queryset.values_list(field_name, flat=True).first()
+            response = HttpResponse(value or '', content_type=TEXT_CONTENT_TYPE)
+        else:
+            start, end = byte_range
+            if cold is not None:
+                data = cold[start:end + 1]
+            else:
+                data = queryset.annotate(part=byte_slice(field_name, start, end)).values_list(
+                    'part', flat=True
+                ).first()
+            response = HttpResponse(bytes(data or b''), status=206, content_type=TEXT_CONTENT_TYPE)
+            response['Content-Range'] = f'bytes {start}-{end}/{total}'
+
+    response['Accept-Ranges'] = 'bytes'
+    response['X-Total-Bytes'] = total
+    return response
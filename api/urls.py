@@ -11,9 +11,26 @@ urlpatterns = [
     # API Endpoints
     path('api/datasets/', views.api_datasets, name='api_datasets'),
     path('api/datasets/<str:dataset_name>/facts/', views.api_dataset_facts, name='api_dataset_facts'),
+    path('api/datasets/<str:dataset_name>/questions/', views.api_dataset_questions, name='api_dataset_questions'),
     path('api/datasets/<str:dataset_name>/facts/<str:fact_id>/questions/', views.api_fact_questions, name='api_fact_questions'),
     path('api/datasets/<str:dataset_name>/facts/<str:fact_id>/questions/<int:question_rank>/', views.api_fact_question_page, name='api_fact_question_page'),
+    path('api/datasets/<str:dataset_name>/facts/<str:fact_id>/questions/<int:question_rank>/html/', views.api_fact_question_html, name='api_fact_question_html'),
+    path('api/datasets/<str:dataset_name>/facts/<str:fact_id>/questions/<int:question_rank>/passages/', views.api_fact_question_passages, name='api_fact_question_passages'),
+    path('api/datasets/<str:dataset_name>/facts/<str:fact_id>/evidence/', views.api_fact_evidence, name='api_fact_evidence'),
+    path('api/datasets/<str:dataset_name>/facts/<str:fact_id>/questions/<int:question_rank>/evidence/', views.api_fact_evidence, name='api_fact_question_evidence'),
+    path('api/datasets/<str:dataset_name>/snapshots/', views.api_dataset_snapshots, name='api_dataset_snapshots'),
+    path('api/datasets/<str:dataset_name>/snapshots/<str:version>/', views.api_dataset_snapshot, name='api_dataset_snapshot'),
+    path('api/datasets/<str:dataset_name>/snapshots/<str:version>/<path:filename>', views.api_dataset_snapshot_file, name='api_dataset_snapshot_file'),
+    path('api/datasets/<str:dataset_name>/releases/', views.api_dataset_releases, name='api_dataset_releases'),
+    path('api/datasets/<str:dataset_name>/releases/<str:version>/', views.api_dataset_release, name='api_dataset_release'),
+    path('api/datasets/<str:dataset_name>/releases/<str:version>/delta/', views.api_dataset_release_delta, name='api_dataset_release_delta'),
+    # Before the legacy pattern below, which would take "text" for a URL
+    path('api/serp-content/text/', views.api_serp_content_text, name='api_serp_content_text'),
     re_path(r'^api/serp-content/(?P<url>.+)/$', views.api_serp_content, name='api_serp_content'),
     path('api/serp-content/', views.api_serp_content_query, name='api_serp_content_query'),
+    path('api/search/', views.api_search, name='api_search'),
+    path('api/jobs/<int:job_id>/', views.api_job, name='api_job'),
+    path('api/jobs/<int:job_id>/download/', views.api_job_download, name='api_job_download'),
+    path('api/metrics/', views.api_metrics, name='api_metrics'),
 ]
 
@@ -1,5 +1,7 @@
+from django.conf import settings
+from django.db.models import F
 from django.utils import timezone
-from .models import APIKey
+from .models import APIKey, Link
 
 def validate_api_key(request):
     """Validate API key from request headers"""
@@ -14,6 +16,28 @@ def validate_api_key(request):
     except APIKey.DoesNotExist:
         return None
 
+def record_usage(api_key):
+    """Count a request against the API key"""
+    # Embedded mode serves a read-only database file
+    if settings.READ_ONLY_DATA:
+        return
+    # One UPDATE, so concurrent requests of a key (such as coalesced ones,
+    # which finish together) are all counted
+    APIKey.objects.filter(pk=api_key.pk).update(usage_count=F('usage_count') + 1, last_used=timezone.now())
+
+def record_scrape(link):
+    """Count a SERP content fetch of the link"""
+    record_scrapes([link.id])
+
+def record_scrapes(link_ids):
+    """Count a SERP content fetch of each link, in one UPDATE"""
+    if settings.READ_ONLY_DATA or not link_ids:
+        return
+    Link.objects.filter(id__in=link_ids).update(
+        scrape_count=F('scrape_count') + 1,
+        last_scraped=timezone.now()
+    )
+
 def load_mock_data():
     """Load mock data from filesystem into database"""
     from django.conf import settings
@@ -1,16 +1,38 @@
 import json
+import os
 
 from urllib.parse import unquote
 from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse, HttpResponse
+from django.http import FileResponse, JsonResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
 from django.utils import timezone
 from django.conf import settings
-from .models import APIKey, Dataset, Fact, SerpContent, Link, Question, HtmlContent
-from .utils import validate_api_key, load_mock_data
+from django.db.models import F
+from .models import APIKey, Dataset, DatasetRelease, Fact, SerpContent, Link, Question, HtmlContent, Job
+from .catalog import catalog
+from .coalesce import SharedResponse, coalesce, request_key, single_flight
+from .duplicates import collapse_duplicates
+from .evidence import (
+    build_evidence, fetchable_questions, html_content_columns, html_content_payload, include_html_option
+)
+from .jobs import export_root, visible_jobs
+from .passages import DEFAULT_TOP_K, MAX_TOP_K, question_documents, rank_passages
+from .question_page import question_page_json
+from .questions import (
+    DEFAULT_QUESTIONS_LIMIT, MAX_FACT_IDS, MAX_QUESTIONS_LIMIT, STREAM_QUESTIONS_THRESHOLD,
+    FactQuestionGroups, fact_question_rows, render_fact_questions
+)
+from .releases import diff, get_release, release_summary
+from .snapshots import list_versions, load_manifest, resolve_version, snapshot_file
+from .textrange import text_response
+from .serp_cache import serp_cache
+from .serp_payload import serp_content_response, serp_document, serp_document_response, serp_link
+from .search import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, search_serp_content, search_headlines
+from .text import tokenize
+from .utils import validate_api_key, load_mock_data, record_scrape, record_scrapes, record_usage
 
 
 def index(request):
@@ -21,6 +43,11 @@ def index(request):
 @require_http_methods(["POST"])
 def create_api_key(request):
     """Create new API key for user"""
+    if settings.READ_ONLY_DATA:
+        return JsonResponse({
+            'error': 'API keys cannot be created on a read-only (embedded) deployment'
+        }, status=403)
+
     try:
         data = json.loads(request.body)
         username = data.get('username')
@@ -65,8 +92,10 @@ def api_datasets(request):
     if not api_key:
         return JsonResponse({'error': 'Invalid API key'}, status=401)
 
-    datasets = Dataset.objects.filter(is_active=True).values(
-        'name', 'description', 'created_at'
+    datasets = Dataset.objects.filter(is_active=True).order_by('id').values(
+        'name', 'description', 'created_at',
+        'facts_count', 'questions_count', 'fetchable_questions_count',
+        'html_contents_count', 'linked_urls_count', 'serp_urls_count'
     )
 
     return JsonResponse({
@@ -81,8 +110,10 @@ def api_dataset_facts(request, dataset_name):
     if not api_key:
         return JsonResponse({'error': 'Invalid API key'}, status=401)
 
-    dataset = get_object_or_404(Dataset, name=dataset_name, is_active=True)
-    facts = dataset.facts.all().values('fact_id', 'created_at')
+    dataset = catalog.get_dataset_or_404(dataset_name)
+    facts = dataset.facts.order_by('id').values(
+        'fact_id', 'created_at', 'questions_count', 'fetchable_questions_count'
+    )
 
     return JsonResponse({
         'dataset': dataset_name,
@@ -102,58 +133,49 @@ def api_serp_content(request, url):
         # The URL comes already decoded from Django's URL resolver
         decoded_url = unquote(url) if url != unquote(url) else url
 
-        if not decoded_url.endswith('/'):
-            decoded_url += '/'
+        # Get selected fields from query parameters
+        fields_param = request.GET.get('fields')
+        if fields_param:
+            selected_fields = [f.strip() for f in fields_param.split(',') if f.strip()]
+        else:
+            selected_fields = None
 
-        # Find the link and its content
-        try:
-            link = Link.objects.get(url=decoded_url, is_active=True)
-            serp_content = link.serp_content
-        except Link.DoesNotExist:
-            # Try with the original URL (sometimes encoding issues)
+        def render():
+            # Encoding and trailing-slash variants share one normalized URL hash;
+            # whole documents come from the worker's cache or the stored payload
             try:
-                link = Link.objects.get(url=url, is_active=True)
-                serp_content = link.serp_content
-                decoded_url = url
+                if selected_fields:
+                    link = serp_link(decoded_url, full=False)
+                    response = serp_content_response(decoded_url, selected_fields, link.serp_content)
+                    link_id = link.id
+                else:
+                    document = serp_document(decoded_url)
+                    response = serp_document_response(decoded_url, document)
+                    link_id = document.link_id
             except Link.DoesNotExist:
                 return JsonResponse({
                     'error': 'URL not found',
                     'url_tried': [decoded_url, url],
                     'suggestion': 'Use query parameter method: /api/serp-content/?url=YOUR_URL'
                 }, status=404)
-        except SerpContent.DoesNotExist:
-            return JsonResponse({
-                'error': 'SERP content not available for this URL',
-                'url': decoded_url
-            }, status=404)
-
-        # Get selected fields from query parameters
-        fields_param = request.GET.get('fields')
-        if fields_param:
-            selected_fields = [f.strip() for f in fields_param.split(',') if f.strip()]
-        else:
-            selected_fields = None
+            except SerpContent.DoesNotExist:
+                return JsonResponse({
+                    'error': 'SERP content not available for this URL',
+                    'url': decoded_url
+                }, status=404)
 
-        # Get content data
-        content_data = serp_content.get_selected_fields(selected_fields)
+            return SharedResponse(response, link_id=link_id)
 
-        # Update API key usage
-        api_key.usage_count += 1
-        api_key.last_used = timezone.now()
-        api_key.save()
+        # Identical concurrent requests share one lookup and rendering
+        shared = coalesce(request_key(request), render)
+        if shared.status_code == 200:
+            # Update API key usage
+            record_usage(api_key)
 
-        # Update link scrape count
-        link.scrape_count += 1
-        link.last_scraped = timezone.now()
-        link.save()
+            # Update link scrape count
+            record_scrapes([shared.extra['link_id']])
 
-        return JsonResponse({
-            'success': True,
-            'url': decoded_url,
-            'fields_requested': selected_fields,
-            'scraped_at': serp_content.scraped_at.isoformat(),
-            'data': content_data
-        })
+        return shared.response()
 
     except Exception as e:
         return JsonResponse({
@@ -176,21 +198,6 @@ def api_serp_content_query(request):
         }, status=400)
 
     try:
-        # Find the link and its content
-        try:
-            link = Link.objects.get(url=url, is_active=True)
-            serp_content = link.serp_content
-        except Link.DoesNotExist:
-            return JsonResponse({
-                'error': 'URL not found',
-                'url': url
-            }, status=404)
-        except SerpContent.DoesNotExist:
-            return JsonResponse({
-                'error': 'SERP content not available for this URL',
-                'url': url
-            }, status=404)
-
         # Get selected fields from query parameters
         fields_param = request.GET.get('fields')
         if fields_param:
@@ -198,26 +205,82 @@ def api_serp_content_query(request):
         else:
             selected_fields = None
 
-        # Get content data
-        content_data = serp_content.get_selected_fields(selected_fields)
+        def render():
+            # Find the link and its content; whole documents may be cached
+            try:
+                if selected_fields:
+                    link = serp_link(url, full=False)
+                    response = serp_content_response(url, selected_fields, link.serp_content)
+                    link_id = link.id
+                else:
+                    document = serp_document(url)
+                    response = serp_document_response(url, document)
+                    link_id = document.link_id
+            except Link.DoesNotExist:
+                return JsonResponse({
+                    'error': 'URL not found',
+                    'url': url
+                }, status=404)
+            except SerpContent.DoesNotExist:
+                return JsonResponse({
+                    'error': 'SERP content not available for this URL',
+                    'url': url
+                }, status=404)
+
+            return SharedResponse(response, link_id=link_id)
+
+        # Identical concurrent requests share one lookup and rendering
+        shared = coalesce(request_key(request), render)
+        if shared.status_code == 200:
+            # Update API key usage
+            record_usage(api_key)
+
+            # Update link scrape count
+            record_scrapes([shared.extra['link_id']])
+
+        return shared.response()
+
+    except Exception as e:
+        return JsonResponse({
+            'error': f'Internal server error: {str(e)}',
+            'url': url
+        }, status=500)
+
+@csrf_exempt
+def api_serp_content_text(request):
+    """Get the text of a URL's SERP content as plain text, whole or in part
+    (offset/limit characters or a Range header)"""
+    api_key = validate_api_key(request)
+    if not api_key:
+        return JsonResponse({'error': 'Invalid API key'}, status=401)
+
+    url = request.GET.get('url')
+    if not url:
+        return JsonResponse({
+            'error': 'URL parameter is required',
+            'usage': 'GET /api/serp-content/text/?url=https://example.com&limit=20000'
+        }, status=400)
+
+    try:
+        try:
+            link = Link.objects.filter(is_active=True).lookup(url)
+        except Link.DoesNotExist:
+            return JsonResponse({'error': 'URL not found', 'url': url}, status=404)
+
+        try:
+            response = text_response(request, SerpContent.objects.filter(link=link), 'text')
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        if response is None:
+            return JsonResponse({'error': 'SERP content not available for this URL', 'url': url}, status=404)
 
         # Update API key usage
-        api_key.usage_count += 1
-        api_key.last_used = timezone.now()
-        api_key.save()
+        record_usage(api_key)
 
         # Update link scrape count
-        link.scrape_count += 1
-        link.last_scraped = timezone.now()
-        link.save()
+        record_scrape(link)
 
-        return JsonResponse({
-            'success': True,
-            'url': url,
-            'fields_requested': selected_fields,
-            'scraped_at': serp_content.scraped_at.isoformat(),
-            'data': content_data
-        })
+        return response
 
     except Exception as e:
         return JsonResponse({
@@ -233,12 +296,12 @@ def api_fact_questions(request, dataset_name, fact_id):
         return JsonResponse({'error': 'Invalid API key'}, status=401)
 
     # Get dataset and fact
-    dataset = get_object_or_404(Dataset, name=dataset_name, is_active=True)
-    fact = get_object_or_404(Fact, dataset=dataset, fact_id=fact_id)
+    fact = catalog.get_fact_or_404(dataset_name, fact_id)
 
     # Get all fetchable questions ordered by score (highest first)
     questions = Question.objects.filter(
         fact=fact,
+        dataset_id=fact.dataset_id,
     ).order_by('-score')
 
     # Build response with synthetic fetch_id
@@ -252,9 +315,7 @@ def api_fact_questions(request, dataset_name, fact_id):
         })
 
     # Update API key usage
-    api_key.usage_count += 1
-    api_key.last_used = timezone.now()
-    api_key.save()
+    record_usage(api_key)
 
     return JsonResponse({
         'success': True,
@@ -264,6 +325,76 @@ def api_fact_questions(request, dataset_name, fact_id):
         'count': len(questions_data)
     })
 
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def api_dataset_questions(request, dataset_name):
+    """Get ranked questions for many facts of a dataset, by fact_ids or prefix"""
+    api_key = validate_api_key(request)
+    if not api_key:
+        return JsonResponse({'error': 'Invalid API key'}, status=401)
+
+    # Long fact_id lists can be sent as a JSON body instead of the query string
+    if request.method == 'POST':
+        try:
+            params = json.loads(request.body or b'{}')
+        except ValueError:
+            return JsonResponse({'error': 'Request body must be JSON'}, status=400)
+        if not isinstance(params, dict):
+            return JsonResponse({'error': 'Request body must be a JSON object'}, status=400)
+        fact_ids = params.get('fact_ids')
+    else:
+        params = request.GET
+        fact_ids = params.get('fact_ids')
+        if fact_ids is not None:
+            fact_ids = fact_ids.split(',')
+
+    prefix = params.get('prefix') or None
+    after = params.get('after') or None
+
+    if fact_ids is not None:
+        if not isinstance(fact_ids, list):
+            return JsonResponse({'error': 'fact_ids must be a list'}, status=400)
+        fact_ids = list(dict.fromkeys(str(fact_id).strip() for fact_id in fact_ids if str(fact_id).strip()))
+        if len(fact_ids) > MAX_FACT_IDS:
+            return JsonResponse({'error': f'At most {MAX_FACT_IDS} fact_ids per request'}, status=400)
+
+    if not fact_ids and not prefix:
+        return JsonResponse({
+            'error': 'fact_ids or prefix parameter is required',
+            'usage': f'GET /api/datasets/{dataset_name}/questions/?fact_ids=correct_1,correct_2 '
+                     f'or ?prefix=correct_&after=correct_1'
+        }, status=400)
+
+    try:
+        limit = int(params.get('limit', DEFAULT_QUESTIONS_LIMIT))
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'limit must be an integer'}, status=400)
+    if not 1 <= limit <= MAX_QUESTIONS_LIMIT:
+        return JsonResponse({'error': f'limit must be between 1 and {MAX_QUESTIONS_LIMIT}'}, status=400)
+
+    dataset = catalog.get_dataset_or_404(dataset_name)
+
+    # Update API key usage
+    record_usage(api_key)
+
+    stream = limit > STREAM_QUESTIONS_THRESHOLD
+    groups = FactQuestionGroups(
+        fact_question_rows(dataset, fact_ids=fact_ids, prefix=prefix, after=after),
+        limit,
+        stream=stream,
+        fact_rows=lambda fact_id: fact_question_rows(dataset, fact_ids=[fact_id])
+    )
+    chunks = render_fact_questions(dataset_name, groups, fact_ids=fact_ids, after=after)
+    if stream:
+        return StreamingHttpResponse(chunks, content_type='application/json')
+
+    try:
+        return HttpResponse(''.join(chunks), content_type='application/json')
+    except Exception as e:
+        return JsonResponse({
+            'error': f'Internal server error: {str(e)}'
+        }, status=500)
+
 @csrf_exempt
 def api_fact_question_page(request, dataset_name, fact_id, question_rank):
     """Get HTML content and available URLs for a specific question by rank"""
@@ -271,60 +402,189 @@ def api_fact_question_page(request, dataset_name, fact_id, question_rank):
     if not api_key:
         return JsonResponse({'error': 'Invalid API key'}, status=401)
 
+    include_html = include_html_option(request.GET.get('include_html'))
+    collapse = request.GET.get('collapse_duplicates', '0').lower() in ('1', 'true', 'yes')
+
     try:
         # Get dataset and fact
-        dataset = get_object_or_404(Dataset, name=dataset_name, is_active=True)
-        fact = get_object_or_404(Fact, dataset=dataset, fact_id=fact_id)
+        fact = catalog.get_fact_or_404(dataset_name, fact_id)
+
+        def render():
+            # The whole document rendered by the database in one query, when it can
+            document = question_page_json(fact, dataset_name, fact_id, question_rank, include_html, collapse)
+            if document is not None:
+                return HttpResponse(document, content_type='application/json')
+
+            # Get all fetchable questions ordered by score (highest first)
+            questions = Question.objects.filter(
+                fact=fact,
+                dataset_id=fact.dataset_id,
+                is_fetchable=True
+            ).order_by('-score')
+
+            # Check if question_rank is valid
+            if question_rank >= len(questions) or question_rank < 0:
+                return JsonResponse({
+                    'error': f'Question rank {question_rank} not found. Available ranks: 0-{len(questions)-1}'
+                }, status=404)
 
-        # Get all fetchable questions ordered by score (highest first)
-        questions = Question.objects.filter(
-            fact=fact,
-            is_fetchable=True
-        ).order_by('-score')
+            # Get the question at the specified rank
+            question = questions[question_rank]
 
-        # Check if question_rank is valid
+            # Get HTML content for this question, reading only the form requested
+            html_content = HtmlContent.objects.filter(question=question, dataset_id=fact.dataset_id).only(
+                'id', 'question_id', *html_content_columns(include_html)
+            ).first()
+            if html_content is None:
+                return JsonResponse({
+                    'error': f'No HTML content available for question at rank {question_rank}'
+                }, status=404)
+
+            # Get all available URLs for this HTML content
+            available_urls = []
+            html_content_urls = html_content.htmlcontenturl_set.select_related('link').filter(
+                dataset_id=fact.dataset_id,
+                link__is_active=True
+            ).annotate(
+                serp_content_id=F('link__serp_content__id'),
+                text_chars=F('link__serp_content__text_chars'),
+                text_words=F('link__serp_content__text_words'),
+                text_tokens=F('link__serp_content__text_tokens'),
+                cluster_id=F('link__serp_content__cluster_id')
+            ).order_by('rank', 'id')
+
+            if collapse:
+                html_content_urls = collapse_duplicates(
+                    html_content_urls, lambda html_url: html_url.cluster_id, lambda html_url: html_url.link.url
+                )
+            else:
+                html_content_urls = [(html_url, None) for html_url in html_content_urls]
+
+            for html_url, duplicates in html_content_urls:
+                link = html_url.link
+                url_data = {
+                    'url': link.url,
+                    'domain': link.domain,
+                    'title': link.title,
+                    'description': link.description,
+                    'rank': html_url.rank,
+                    'scrape_count': link.scrape_count,
+                    'last_scraped': link.last_scraped.isoformat() if link.last_scraped else None,
+                    'has_serp_content': html_url.serp_content_id is not None,
+                    'text_chars': html_url.text_chars,
+                    'text_words': html_url.text_words,
+                    'text_tokens': html_url.text_tokens
+                }
+                if collapse:
+                    url_data['duplicates'] = duplicates
+                available_urls.append(url_data)
+
+            return JsonResponse({
+                'success': True,
+                'dataset': dataset_name,
+                'fact_id': fact_id,
+                'question_rank': question_rank,
+                'question': {
+                    'text': question.text,
+                    'score': question.score,
+                    'is_fetchable': question.is_fetchable
+                },
+                'html_content': html_content_payload(html_content, include_html) if include_html else None,
+                'available_urls': available_urls,
+                'total_urls': len(available_urls)
+            })
+
+        # Identical concurrent requests share one rendering
+        shared = coalesce(request_key(request), render)
+        if shared.status_code == 200:
+            # Update API key usage
+            record_usage(api_key)
+
+        return shared.response()
+
+    except Exception as e:
+        return JsonResponse({
+            'error': f'Internal server error: {str(e)}'
+        }, status=500)
+
+@csrf_exempt
+def api_fact_question_html(request, dataset_name, fact_id, question_rank):
+    """Get the raw HTML of a question's results page as plain text, whole or
+    in part (offset/limit characters or a Range header)"""
+    api_key = validate_api_key(request)
+    if not api_key:
+        return JsonResponse({'error': 'Invalid API key'}, status=401)
+
+    fact = catalog.get_fact_or_404(dataset_name, fact_id)
+
+    try:
+        questions = fetchable_questions(fact)
         if question_rank >= len(questions) or question_rank < 0:
             return JsonResponse({
                 'error': f'Question rank {question_rank} not found. Available ranks: 0-{len(questions)-1}'
             }, status=404)
 
-        # Get the question at the specified rank
-        question = questions[question_rank]
-
-        # Get HTML content for this question
         try:
-            html_content = question.html_content
-        except HtmlContent.DoesNotExist:
+            html_contents = HtmlContent.objects.filter(question=questions[question_rank], dataset_id=fact.dataset_id)
+            response = text_response(request, html_contents, 'content')
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        if response is None:
             return JsonResponse({
                 'error': f'No HTML content available for question at rank {question_rank}'
             }, status=404)
 
-        # Get all available URLs for this HTML content
-        available_urls = []
-        html_content_urls = html_content.htmlcontenturl_set.select_related('link').filter(
-            link__is_active=True
-        ).order_by('rank')
-
-        for html_url in html_content_urls:
-            link = html_url.link
-            url_data = {
-                'url': link.url,
-                'domain': link.domain,
-                'title': link.title,
-                'description': link.description,
-                'rank': html_url.rank,
-                'scrape_count': link.scrape_count,
-                'last_scraped': link.last_scraped.isoformat() if link.last_scraped else None,
-                'has_serp_content': hasattr(link, 'serp_content')
-            }
-            available_urls.append(url_data)
-
         # Update API key usage
-        api_key.usage_count += 1
-        api_key.last_used = timezone.now()
-        api_key.save()
+        record_usage(api_key)
 
+        return response
+
+    except Exception as e:
         return JsonResponse({
+            'error': f'Internal server error: {str(e)}'
+        }, status=500)
+
+@csrf_exempt
+def api_fact_question_passages(request, dataset_name, fact_id, question_rank):
+    """Get the passages of a question's evidence documents that best match the
+    question (BM25), within a character or token budget"""
+    api_key = validate_api_key(request)
+    if not api_key:
+        return JsonResponse({'error': 'Invalid API key'}, status=401)
+
+    fact = catalog.get_fact_or_404(dataset_name, fact_id)
+
+    try:
+        top_k = int(request.GET.get('k', DEFAULT_TOP_K))
+        max_chars = int(request.GET['max_chars']) if request.GET.get('max_chars') else None
+        max_tokens = int(request.GET['max_tokens']) if request.GET.get('max_tokens') else None
+    except ValueError:
+        return JsonResponse({'error': 'k, max_chars and max_tokens must be integers'}, status=400)
+
+    if not 1 <= top_k <= MAX_TOP_K or (max_chars is not None and max_chars < 1) or (
+        max_tokens is not None and max_tokens < 1
+    ):
+        return JsonResponse({
+            'error': f'k must be between 1 and {MAX_TOP_K}, max_chars and max_tokens >= 1'
+        }, status=400)
+    collapse = request.GET.get('collapse_duplicates', '0').lower() in ('1', 'true', 'yes')
+
+    def render():
+        questions = fetchable_questions(fact)
+        if question_rank >= len(questions) or question_rank < 0:
+            return JsonResponse({
+                'error': f'Question rank {question_rank} not found. Available ranks: 0-{len(questions)-1}'
+            }, status=404)
+        question = questions[question_rank]
+
+        terms = list(dict.fromkeys(tokenize(question.text)))
+        documents = question_documents(question, collapse=collapse)
+        passages, considered = rank_passages(
+            documents, terms, top_k=top_k, max_chars=max_chars, max_tokens=max_tokens
+        )
+        link_ids = sorted({passage.pop('link_id') for passage in passages})
+
+        return SharedResponse(JsonResponse({
             'success': True,
             'dataset': dataset_name,
             'fact_id': fact_id,
@@ -334,14 +594,422 @@ def api_fact_question_page(request, dataset_name, fact_id, question_rank):
                 'score': question.score,
                 'is_fetchable': question.is_fetchable
             },
-            'html_content': {
-                'content': html_content.content
-            },
-            'available_urls': available_urls,
-            'total_urls': len(available_urls)
+            'query_terms': terms,
+            'documents': len(documents),
+            'passages_considered': considered,
+            'passages': passages,
+            'count': len(passages),
+            'total_chars': sum(passage['chars'] for passage in passages),
+            'total_tokens': sum(passage['tokens'] for passage in passages)
+        }), link_ids=link_ids)
+
+    try:
+        # Identical concurrent requests share one ranking
+        shared = coalesce(request_key(request), render)
+        if shared.status_code == 200:
+            # Update API key usage
+            record_usage(api_key)
+
+            # Update the scrape counts of the documents quoted
+            record_scrapes(shared.extra['link_ids'])
+
+        return shared.response()
+
+    except Exception as e:
+        return JsonResponse({
+            'error': f'Internal server error: {str(e)}'
+        }, status=500)
+
+@csrf_exempt
+def api_fact_evidence(request, dataset_name, fact_id, question_rank=None):
+    """Get questions with their ranked URLs and SERP content in one response,
+    for one question by rank or for every fetchable question of the fact"""
+    api_key = validate_api_key(request)
+    if not api_key:
+        return JsonResponse({'error': 'Invalid API key'}, status=401)
+
+    fact = catalog.get_fact_or_404(dataset_name, fact_id)
+
+    fields_param = request.GET.get('fields')
+    if fields_param:
+        selected_fields = [f.strip() for f in fields_param.split(',') if f.strip()]
+    else:
+        selected_fields = None
+    include_html = include_html_option(request.GET.get('include_html'))
+    collapse = request.GET.get('collapse_duplicates', '0').lower() in ('1', 'true', 'yes')
+
+    def render():
+        questions = list(enumerate(fetchable_questions(fact)))
+        if question_rank is not None:
+            if question_rank >= len(questions) or question_rank < 0:
+                return JsonResponse({
+                    'error': f'Question rank {question_rank} not found. Available ranks: 0-{len(questions)-1}'
+                }, status=404)
+            questions = [questions[question_rank]]
+
+        bundles, link_ids = build_evidence(
+            questions, fields=selected_fields, include_html=include_html, collapse=collapse
+        )
+
+        response = {
+            'success': True,
+            'dataset': dataset_name,
+            'fact_id': fact_id,
+            'fields_requested': selected_fields
+        }
+        if question_rank is not None:
+            response.update(bundles[0])
+        else:
+            response.update({'questions': bundles, 'count': len(bundles)})
+        return SharedResponse(JsonResponse(response), link_ids=sorted(link_ids))
+
+    try:
+        # Identical concurrent requests share one bundle
+        shared = coalesce(request_key(request), render)
+        if shared.status_code == 200:
+            # Update API key usage
+            record_usage(api_key)
+
+            # Update the scrape counts of the SERP content served
+            record_scrapes(shared.extra['link_ids'])
+
+        return shared.response()
+
+    except Exception as e:
+        return JsonResponse({
+            'error': f'Internal server error: {str(e)}'
+        }, status=500)
+
+@csrf_exempt
+def api_search(request):
+    """Full-text search over SERP content, ranked by relevance"""
+    api_key = validate_api_key(request)
+    if not api_key:
+        return JsonResponse({'error': 'Invalid API key'}, status=401)
+
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({
+            'error': 'q parameter is required',
+            'usage': 'GET /api/search/?q=henry dunant&dataset=factbench&page=1'
+        }, status=400)
+
+    try:
+        page = int(request.GET.get('page', 1))
+        page_size = int(request.GET.get('page_size', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({'error': 'page and page_size must be integers'}, status=400)
+
+    if page < 1 or not 1 <= page_size <= MAX_PAGE_SIZE:
+        return JsonResponse({
+            'error': f'page must be >= 1 and page_size between 1 and {MAX_PAGE_SIZE}'
+        }, status=400)
+
+    language = request.GET.get('language') or None
+    dataset_name = request.GET.get('dataset') or None
+    fact_id = request.GET.get('fact_id') or None
+    highlight = request.GET.get('highlight', '1').lower() not in ('0', 'false', 'no')
+
+    if fact_id and not dataset_name:
+        return JsonResponse({'error': 'fact_id requires the dataset parameter'}, status=400)
+
+    if dataset_name:
+        catalog.get_dataset_or_404(dataset_name)
+
+    try:
+        # Fetch one extra row to know whether another page exists without a COUNT
+        offset = (page - 1) * page_size
+        matches = list(search_serp_content(
+            query, language=language, dataset_name=dataset_name, fact_id=fact_id
+        )[offset:offset + page_size + 1])
+        has_next = len(matches) > page_size
+        matches = matches[:page_size]
+
+        headlines = {}
+        if highlight and matches:
+            headlines = search_headlines([match.id for match in matches], query, language)
+
+        results = []
+        for match in matches:
+            results.append({
+                'url': match.url,
+                'title': match.title,
+                'language': match.language,
+                'meta_site_name': match.meta_site_name,
+                'publish_date': match.publish_date.isoformat() if match.publish_date else None,
+                'rank': match.rank,
+                'headline': headlines.get(match.id)
+            })
+
+        # Update API key usage
+        record_usage(api_key)
+
+        return JsonResponse({
+            'success': True,
+            'query': query,
+            'language': language,
+            'dataset': dataset_name,
+            'fact_id': fact_id,
+            'page': page,
+            'page_size': page_size,
+            'has_next': has_next,
+            'results': results,
+            'count': len(results)
         })
 
     except Exception as e:
         return JsonResponse({
             'error': f'Internal server error: {str(e)}'
         }, status=500)
+
+@csrf_exempt
+def api_dataset_snapshots(request, dataset_name):
+    """List the downloadable columnar snapshots of a dataset"""
+    api_key = validate_api_key(request)
+    if not api_key:
+        return JsonResponse({'error': 'Invalid API key'}, status=401)
+
+    catalog.get_dataset_or_404(dataset_name)
+
+    snapshots = []
+    for version in reversed(list_versions(dataset_name)):
+        manifest = load_manifest(resolve_version(dataset_name, version))
+        snapshots.append({
+            'version': version,
+            'created_at': manifest['created_at'],
+            'format': manifest['format'],
+            'rows': {name: table['rows'] for name, table in manifest['tables'].items()},
+            'bytes': sum(entry['bytes'] for table in manifest['tables'].values() for entry in table['files']),
+            'manifest_url': request.build_absolute_uri(
+                f'/api/datasets/{dataset_name}/snapshots/{version}/'
+            )
+        })
+
+    # Update API key usage
+    record_usage(api_key)
+
+    return JsonResponse({
+        'success': True,
+        'dataset': dataset_name,
+        'snapshots': snapshots,
+        'count': len(snapshots)
+    })
+
+@csrf_exempt
+def api_dataset_snapshot(request, dataset_name, version):
+    """Get the manifest of a snapshot ('latest' for the newest) with file URLs"""
+    api_key = validate_api_key(request)
+    if not api_key:
+        return JsonResponse({'error': 'Invalid API key'}, status=401)
+
+    catalog.get_dataset_or_404(dataset_name)
+    snapshot_dir = resolve_version(dataset_name, version)
+    if snapshot_dir is None:
+        return JsonResponse({'error': f'Snapshot {version} not found'}, status=404)
+
+    manifest = load_manifest(snapshot_dir)
+    for table in manifest['tables'].values():
+        for entry in table['files']:
+            entry['url'] = request.build_absolute_uri(
+                f'/api/datasets/{dataset_name}/snapshots/{manifest["version"]}/{entry["name"]}'
+            )
+
+    # Update API key usage
+    record_usage(api_key)
+
+    return JsonResponse({'success': True, **manifest})
+
+@csrf_exempt
+def api_dataset_snapshot_file(request, dataset_name, version, filename):
+    """Download one partition file of a snapshot"""
+    api_key = validate_api_key(request)
+    if not api_key:
+        return JsonResponse({'error': 'Invalid API key'}, status=401)
+
+    catalog.get_dataset_or_404(dataset_name)
+    snapshot_dir = resolve_version(dataset_name, version)
+    found = snapshot_file(snapshot_dir, load_manifest(snapshot_dir), filename) if snapshot_dir else None
+    if found is None:
+        return JsonResponse({'error': f'File {filename} not found in snapshot {version}'}, status=404)
+
+    path, entry = found
+    # Snapshot files never change, so their checksum is a strong ETag
+    etag = f'"{entry["sha256"]}"'
+    if request.headers.get('If-None-Match') == etag:
+        return HttpResponseNotModified()
+
+    # Update API key usage
+    record_usage(api_key)
+
+    response = FileResponse(
+        open(path, 'rb'),
+        as_attachment=True,
+        filename=f'{dataset_name}-{snapshot_dir.name}-{filename.replace("/", "-")}'
+    )
+    response['ETag'] = etag
+    return response
+
+@csrf_exempt
+def api_dataset_releases(request, dataset_name):
+    """List the releases of a dataset, newest first"""
+    api_key = validate_api_key(request)
+    if not api_key:
+        return JsonResponse({'error': 'Invalid API key'}, status=401)
+
+    dataset = catalog.get_dataset_or_404(dataset_name)
+    releases = []
+    for release in DatasetRelease.objects.filter(dataset=dataset).defer('manifest').order_by('-version'):
+        releases.append({
+            **release_summary(release),
+            'manifest_url': request.build_absolute_uri(
+                f'/api/datasets/{dataset_name}/releases/{release.version}/'
+            )
+        })
+
+    # Update API key usage
+    record_usage(api_key)
+
+    return JsonResponse({
+        'success': True,
+        'dataset': dataset_name,
+        'releases': releases,
+        'count': len(releases)
+    })
+
+@csrf_exempt
+def api_dataset_release(request, dataset_name, version):
+    """Get the manifest of a release ('latest' for the newest): the content
+    hash of every fact"""
+    api_key = validate_api_key(request)
+    if not api_key:
+        return JsonResponse({'error': 'Invalid API key'}, status=401)
+
+    dataset = catalog.get_dataset_or_404(dataset_name)
+    release = get_release(dataset, version)
+    if release is None:
+        return JsonResponse({'error': f'Release {version} not found'}, status=404)
+
+    etag = f'"{release.version}-{release.digest}"'
+    if request.headers.get('If-None-Match') == etag:
+        return HttpResponseNotModified()
+
+    # Update API key usage
+    record_usage(api_key)
+
+    # The manifest was encoded when the release was made: 'facts' is the
+    # last key, the envelope is closed after it
+    envelope = json.dumps({'success': True, 'dataset': dataset_name, **release_summary(release)})
+    response = HttpResponse(
+        b''.join([envelope[:-1].encode('ascii'), b', "facts": ', release.manifest_json(), b'}']),
+        content_type='application/json'
+    )
+    response['ETag'] = etag
+    return response
+
+@csrf_exempt
+def api_dataset_release_delta(request, dataset_name, version):
+    """Facts added, changed or removed between release `since` and this one"""
+    api_key = validate_api_key(request)
+    if not api_key:
+        return JsonResponse({'error': 'Invalid API key'}, status=401)
+
+    since = request.GET.get('since')
+    if not since:
+        return JsonResponse({'error': 'since (the release version to compare with) is required'}, status=400)
+
+    dataset = catalog.get_dataset_or_404(dataset_name)
+    release = get_release(dataset, version)
+    if release is None:
+        return JsonResponse({'error': f'Release {version} not found'}, status=404)
+    base = get_release(dataset, since)
+    if base is None:
+        # Deleted by `release_dataset --keep`: sync from the full manifest
+        return JsonResponse({'error': f'Release {since} not found, download the manifest instead'}, status=404)
+    if base.version > release.version:
+        return JsonResponse({'error': 'since must not be newer than the release'}, status=400)
+
+    added, changed, removed = diff(base.fact_hashes(), release.fact_hashes())
+
+    # Update API key usage
+    record_usage(api_key)
+
+    return JsonResponse({
+        'success': True,
+        'dataset': dataset_name,
+        'since': base.version,
+        'version': release.version,
+        'digest': release.digest,
+        'added': added,
+        'changed': changed,
+        'removed': removed,
+    })
+
+@csrf_exempt
+def api_job(request, job_id):
+    """Get the status and progress of a background job"""
+    api_key = validate_api_key(request)
+    if not api_key:
+        return JsonResponse({'error': 'Invalid API key'}, status=401)
+
+    job = get_object_or_404(visible_jobs(api_key.user), pk=job_id)
+
+    # Update API key usage
+    record_usage(api_key)
+
+    download_url = None
+    if job.status == Job.SUCCEEDED and job.result and job.result.get('file'):
+        download_url = request.build_absolute_uri(f'/api/jobs/{job.pk}/download/')
+
+    return JsonResponse({
+        'success': True,
+        'id': job.pk,
+        'kind': job.kind,
+        'description': job.description,
+        'status': job.status,
+        'progress': job.progress,
+        'total': job.total,
+        'percent': job.percent,
+        'result': job.result,
+        'error': job.error.strip().splitlines()[-1] if job.error else None,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'download_url': download_url
+    })
+
+@csrf_exempt
+def api_job_download(request, job_id):
+    """Download the file written by a finished export job"""
+    api_key = validate_api_key(request)
+    if not api_key:
+        return JsonResponse({'error': 'Invalid API key'}, status=401)
+
+    job = get_object_or_404(visible_jobs(api_key.user), pk=job_id)
+    if job.status != Job.SUCCEEDED or not (job.result or {}).get('file'):
+        return JsonResponse({'error': f'Job {job.pk} has no file to download (status: {job.status})'}, status=404)
+
+    path = export_root() / job.result['file']
+    if not path.is_file():
+        return JsonResponse({'error': f'Export file of job {job.pk} no longer exists'}, status=404)
+
+    # Update API key usage
+    record_usage(api_key)
+
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=job.result['file'])
+
+@csrf_exempt
+def api_metrics(request):
+    """Counters of the worker process serving the request"""
+    api_key = validate_api_key(request)
+    if not api_key:
+        return JsonResponse({'error': 'Invalid API key'}, status=401)
+
+    # Update API key usage
+    record_usage(api_key)
+
+    return JsonResponse({
+        'success': True,
+        'worker': os.getpid(),
+        'coalescing': single_flight.stats(),
+        'serp_cache': serp_cache.stats()
+    })
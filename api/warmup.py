@@ -0,0 +1,149 @@
+"""Cache warm-up: replay the reads of the question page and SERP content
+endpoints for the most requested rows, so the database (shared buffers and
+the OS page cache) serves the first requests after a restart from memory.
+
+Rows are visited in order of popularity: `Link.scrape_count` for SERP
+documents, the summed scrape counts of their links for question pages, with
+links scraped since a cut-off first. HTML, SERP payloads (or text where no
+payload is built) are read in the database, their length being all that is
+transferred, until a byte budget is spent.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Max, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, Length, Substr
+
+from .models import APIKey, Fact, HtmlContent, HtmlContentUrl, Link, Question, SerpContent
+
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def parse_size(value):
+    """Bytes in a size such as '512MB', '2G' or '1048576'"""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMG]?)i?B?\s*', value, re.IGNORECASE)
+    if not match:
+        raise ValueError(f'Invalid size: {value}')
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+
+def buffer_stats():
+    """(blocks read from disk, blocks found in shared buffers) so far for the
+    API tables, their indexes and TOAST data, or None when the database does
+    not report them. The counters are server-wide, so concurrent traffic is
+    included."""
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        if connection.pg_version >= 150000:
+            # Our own counters are otherwise flushed lazily
+            cursor.execute('SELECT pg_stat_force_next_flush()')
+        cursor.execute('SELECT pg_stat_clear_snapshot()')
+        cursor.execute(
+            """
+            SELECT
+                COALESCE(SUM(heap_blks_read + COALESCE(idx_blks_read, 0)
+                             + COALESCE(toast_blks_read, 0) + COALESCE(tidx_blks_read, 0)), 0),
+                COALESCE(SUM(heap_blks_hit + COALESCE(idx_blks_hit, 0)
+                             + COALESCE(toast_blks_hit, 0) + COALESCE(tidx_blks_hit, 0)), 0)
+            FROM pg_statio_user_tables
+            WHERE relname LIKE 'api\\_%%'
+            """
+        )
+        read, hit = cursor.fetchone()
+    return int(read), int(hit)
+
+
+def _scraped_since(since, lookup):
+    """1 for rows whose link was scraped since the cut-off, else 0"""
+    if since is None:
+        return Value(0, output_field=IntegerField())
+    return Case(
+        When(**{f'{lookup}__gte': since}, then=Value(1)),
+        default=Value(0), output_field=IntegerField()
+    )
+
+
+def api_key_targets():
+    """Active API keys, most used first"""
+    return APIKey.objects.filter(is_active=True).order_by(
+        F('last_used').desc(nulls_last=True), '-usage_count'
+    ).values_list('key', flat=True)
+
+
+def question_targets(datasets, since=None):
+    """Ids of fetchable questions with HTML content, the ones whose links are
+    scraped most first"""
+    link = 'html_content__htmlcontenturl__link__'
+    return Question.objects.filter(
+        dataset__in=datasets, is_fetchable=True, html_content__isnull=False
+    ).annotate(
+        recent=Coalesce(Max(_scraped_since(since, f'{link}last_scraped')), 0),
+        popularity=Coalesce(Sum(f'{link}scrape_count'), 0),
+    ).order_by('-recent', '-popularity', 'id').values_list('id', flat=True)
+
+
+def serp_targets(datasets=None, since=None):
+    """Ids of links with SERP content, most scraped first"""
+    links = Link.objects.filter(is_active=True, serp_content__isnull=False)
+    if datasets is not None:
+        links = links.filter(id__in=HtmlContentUrl.objects.filter(
+            dataset__in=datasets
+        ).values('link_id'))
+    return links.annotate(
+        recent=_scraped_since(since, 'last_scraped')
+    ).order_by('-recent', '-scrape_count', 'id').values_list('id', flat=True)
+
+
+def warm_api_keys(keys):
+    """Rows read by validate_api_key and the rate limiter"""
+    return len(list(APIKey.objects.filter(key__in=keys).values_list(
+        'id', 'rate_limit', 'burst_limit', 'max_in_flight', 'user_id'
+    )))
+
+
+def warm_questions(question_ids):
+    """Read what the question page endpoint reads for these questions;
+    returns the bytes of HTML content touched"""
+    facts = list(Question.objects.filter(id__in=question_ids).values_list(
+        'fact__dataset_id', 'fact__fact_id'
+    ).distinct())
+    # Through the (dataset, fact_id) index and every question of those facts
+    fact_filter = Q()
+    for dataset_id, fact_id in facts:
+        fact_filter |= Q(dataset_id=dataset_id, fact_id=fact_id)
+    list(Question.objects.filter(
+        fact__in=Fact.objects.filter(fact_filter), is_fetchable=True
+    ).values_list('id', 'text', 'score'))
+
+    size = sum(
+        length or 0 for length in HtmlContent.objects.filter(question_id__in=question_ids).annotate(
+            length=Length('content')
+        ).values_list('length', flat=True)
+    )
+    list(HtmlContentUrl.objects.filter(
+        html_content__question_id__in=question_ids, link__is_active=True
+    ).values_list(
+        'rank', 'link__url', 'link__domain', 'link__title', 'link__description',
+        'link__scrape_count', 'link__last_scraped', 'link__serp_content__id',
+        'link__serp_content__text_chars'
+    ))
+    return size
+
+
+def warm_serp(link_ids):
+    """Read what the SERP content endpoints read for these links: the stored
+    payload, or the text of documents whose payload is not built yet; returns
+    the bytes touched"""
+    # Through the url_hash index used to resolve request URLs
+    hashes = Link.objects.filter(id__in=link_ids).values_list('url_hash', flat=True)
+    list(Link.objects.filter(url_hash__in=list(hashes)).values_list('id', 'url'))
+
+    # The length of a stored bytea comes from its header alone; that of a
+    # substring makes the database read the payload itself
+    size = 0
+    for length, _ in SerpContent.objects.filter(link_id__in=link_ids).annotate(
+        length=Coalesce(Length(Substr('payload', 1)), Length('text'))
+    ).values_list('length', 'scraped_at'):
+        size += length or 0
+    return size
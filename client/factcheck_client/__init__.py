@@ -0,0 +1,6 @@
+"""Python client for the FactCheck API"""
+
+from .cache import DiskCache
+from .client import APIError, FactCheckClient, NotFound, __version__
+
+__all__ = ['APIError', 'DiskCache', 'FactCheckClient', 'NotFound', '__version__']
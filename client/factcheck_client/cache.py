@@ -0,0 +1,49 @@
+import hashlib
+import json
+import os
+import tempfile
+
+
+class DiskCache:
+    """ETag-keyed response cache in a directory.
+
+    Each cached GET response is one JSON file named after a hash of the
+    request URL, holding the ETag and the decoded body. Entries are written
+    to a temporary file and renamed, so concurrent threads and processes
+    never read a partial entry.
+    """
+
+    def __init__(self, directory):
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, url):
+        digest = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest[:2], f'{digest}.json')
+
+    def get(self, url):
+        """(etag, body) cached for url, or None"""
+        try:
+            with open(self._path(url), encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry['etag'], entry['body']
+
+    def set(self, url, etag, body):
+        path = self._path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'url': url, 'etag': etag, 'body': body}, f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def clear(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.json'):
+                    os.unlink(os.path.join(root, name))
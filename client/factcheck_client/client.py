@@ -0,0 +1,419 @@
+import hashlib
+import http.client
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlencode, urlsplit
+
+from .cache import DiskCache
+
+__version__ = '0.1.0'
+
+DEFAULT_BASE_URL = 'https://factcheck-api.dei.unipd.it/api'
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Server-side limit of the bulk questions endpoint
+MAX_FACT_IDS = 5000
+
+
+class APIError(Exception):
+    """Error response from the API"""
+
+    def __init__(self, status, payload, url):
+        self.status = status
+        self.payload = payload
+        self.url = url
+        if isinstance(payload, dict):
+            message = payload.get('error', payload)
+        elif isinstance(payload, str) and not payload.lstrip().startswith('<'):
+            message = payload[:200]
+        else:
+            # Error pages of the server or a proxy in front of it
+            message = 'non-JSON response'
+        super().__init__(f'{status}: {message} ({url})')
+
+
+class NotFound(APIError):
+    pass
+
+
+class ConnectionPool:
+    """Keep-alive HTTP connections, one per thread and host.
+
+    Connections the server closed while idle are reopened transparently.
+    """
+
+    def __init__(self, timeout=30):
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self, scheme, netloc):
+        connections = self._local.__dict__.setdefault('connections', {})
+        connection = connections.get((scheme, netloc))
+        if connection is None:
+            connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+            connection = connections[(scheme, netloc)] = connection_class(netloc, timeout=self.timeout)
+        return connection
+
+    def _discard(self, scheme, netloc):
+        connection = self._local.connections.pop((scheme, netloc), None)
+        if connection is not None:
+            connection.close()
+
+    def request(self, method, url, body=None, headers=None, stream=False):
+        """(status, headers, body bytes), or the open response when stream is
+        set; a streamed response must be read to the end before the thread
+        makes another request"""
+        parts = urlsplit(url)
+        target = parts.path + (f'?{parts.query}' if parts.query else '')
+        for attempt in range(2):
+            connection = self._connection(parts.scheme, parts.netloc)
+            try:
+                connection.request(method, target, body=body, headers=headers or {})
+                response = connection.getresponse()
+                if stream:
+                    return response
+                return response.status, response.headers, response.read()
+            except (http.client.RemoteDisconnected, http.client.CannotSendRequest,
+                    BrokenPipeError, ConnectionResetError):
+                self._discard(parts.scheme, parts.netloc)
+                if attempt:
+                    raise
+            except BaseException:
+                self._discard(parts.scheme, parts.netloc)
+                raise
+
+    def close(self):
+        for connection in getattr(self._local, 'connections', {}).values():
+            connection.close()
+        self._local.connections = {}
+
+
+class FactCheckClient:
+    """Client for the FactCheck API.
+
+    Requests reuse keep-alive connections, are retried with exponential
+    backoff on 429 and 5xx responses (honouring Retry-After), and GET
+    responses are cached on disk by ETag when `cache_dir` is set, so repeated
+    benchmark runs only transfer what changed.
+
+    The bulk helpers (`map_serp_content`, `iter_evidence`) run at most
+    `max_workers` requests at a time. Keep it at or below the key's
+    in-flight limit, if it has one, to avoid 429 responses.
+    """
+
+    def __init__(self, api_key, base_url=DEFAULT_BASE_URL, cache_dir=None, max_workers=2,
+                 max_retries=5, backoff_factor=0.5, max_backoff=60.0, timeout=30):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.cache = DiskCache(cache_dir) if cache_dir else None
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.pool = ConnectionPool(timeout=timeout)
+
+    # Transport
+
+    def _url(self, path, params=None):
+        params = {key: value for key, value in (params or {}).items() if value is not None}
+        return f'{self.base_url}{path}' + (f'?{urlencode(params)}' if params else '')
+
+    def _backoff(self, attempt, retry_after=None):
+        delay = random.uniform(0, min(self.max_backoff, self.backoff_factor * 2 ** attempt))
+        if retry_after:
+            try:
+                delay += float(retry_after)
+            except ValueError:
+                pass
+        time.sleep(delay)
+
+    def request(self, method, path, params=None, json_body=None, use_cache=True, retry=True):
+        """Decoded JSON body of an API request, raising APIError on errors"""
+        url = self._url(path, params)
+        headers = {
+            'X-API-Key': self.api_key,
+            'Accept': 'application/json',
+            'User-Agent': f'factcheck-client/{__version__}',
+        }
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+
+        cached = None
+        if self.cache and use_cache and method == 'GET':
+            cached = self.cache.get(url)
+            if cached:
+                headers['If-None-Match'] = cached[0]
+
+        max_retries = self.max_retries if retry else 0
+        for attempt in range(max_retries + 1):
+            try:
+                status, response_headers, data = self.pool.request(method, url, body, headers)
+            except (OSError, http.client.HTTPException):
+                if attempt == max_retries:
+                    raise
+                self._backoff(attempt)
+                continue
+
+            if status == 304 and cached:
+                return cached[1]
+            if status in RETRY_STATUSES and attempt < max_retries:
+                self._backoff(attempt, response_headers.get('Retry-After'))
+                continue
+            break
+
+        if 'json' not in response_headers.get('Content-Type', 'application/json'):
+            # Plain-text endpoints
+            payload = data.decode('utf-8', 'replace')
+        else:
+            try:
+                payload = json.loads(data) if data else None
+            except ValueError:
+                payload = data.decode('utf-8', 'replace')
+        if status >= 400:
+            raise (NotFound if status == 404 else APIError)(status, payload, url)
+
+        etag = response_headers.get('ETag')
+        if self.cache and use_cache and method == 'GET' and etag:
+            self.cache.set(url, etag, payload)
+        return payload
+
+    def get(self, path, **params):
+        return self.request('GET', path, params)
+
+    def close(self):
+        self.pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _map(self, function, items):
+        """Yield function(item) in input order, with at most max_workers
+        requests in flight and a bounded number of items queued"""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = deque()
+            for item in items:
+                pending.append((item, executor.submit(function, item)))
+                if len(pending) >= self.max_workers * 2:
+                    item, future = pending.popleft()
+                    yield item, future
+            while pending:
+                yield pending.popleft()
+
+    # Endpoints
+
+    def create_api_key(self, username, email, key_name='Default Key'):
+        payload = self.request('POST', '/create-key/', json_body={
+            'username': username, 'email': email, 'key_name': key_name
+        }, retry=False)
+        return payload['api_key']
+
+    def datasets(self):
+        return self.get('/datasets/')['datasets']
+
+    def facts(self, dataset):
+        return self.get(f'/datasets/{quote(dataset, safe="")}/facts/')['facts']
+
+    def questions(self, dataset, fact_id):
+        return self.get(f'/datasets/{quote(dataset, safe="")}/facts/{quote(fact_id, safe="")}/questions/')['questions']
+
+    def question_page(self, dataset, fact_id, question_rank, include_html=True, collapse_duplicates=False):
+        """include_html: True (raw page), 'structured' (extracted results) or False"""
+        return self.get(
+            f'/datasets/{quote(dataset, safe="")}/facts/{quote(fact_id, safe="")}/questions/{int(question_rank)}/',
+            include_html=_html_option(include_html),
+            collapse_duplicates='1' if collapse_duplicates else None
+        )
+
+    def questions_bulk(self, dataset, fact_ids=None, prefix=None, after=None, limit=None):
+        """One page of the bulk questions endpoint"""
+        body = {'fact_ids': list(fact_ids) if fact_ids is not None else None,
+                'prefix': prefix, 'after': after, 'limit': limit}
+        return self.request(
+            'POST', f'/datasets/{quote(dataset, safe="")}/questions/',
+            json_body={key: value for key, value in body.items() if value is not None}
+        )
+
+    def evidence(self, dataset, fact_id, question_rank=None, fields=None, include_html=True,
+                 collapse_duplicates=False):
+        path = f'/datasets/{quote(dataset, safe="")}/facts/{quote(fact_id, safe="")}/'
+        if question_rank is not None:
+            path += f'questions/{int(question_rank)}/'
+        return self.get(
+            path + 'evidence/',
+            fields=','.join(fields) if fields else None,
+            include_html=_html_option(include_html),
+            collapse_duplicates='1' if collapse_duplicates else None
+        )
+
+    def serp_text(self, url, offset=None, limit=None):
+        """SERP document text of url as a string, or the limit characters
+        from offset"""
+        return self.get('/serp-content/text/', url=url, offset=offset, limit=limit)
+
+    def question_html(self, dataset, fact_id, question_rank, offset=None, limit=None):
+        """Raw results page HTML of a question, or the limit characters from offset"""
+        return self.get(
+            f'/datasets/{quote(dataset, safe="")}/facts/{quote(fact_id, safe="")}/questions/{int(question_rank)}/html/',
+            offset=offset, limit=limit
+        )
+
+    def passages(self, dataset, fact_id, question_rank, k=None, max_chars=None, max_tokens=None,
+                 collapse_duplicates=False):
+        """Best matching passages of a question's evidence documents"""
+        return self.get(
+            f'/datasets/{quote(dataset, safe="")}/facts/{quote(fact_id, safe="")}/questions/{int(question_rank)}/passages/',
+            k=k, max_chars=max_chars, max_tokens=max_tokens,
+            collapse_duplicates='1' if collapse_duplicates else None
+        )
+
+    def serp_content(self, url, fields=None):
+        return self.get('/serp-content/', url=url, fields=','.join(fields) if fields else None)
+
+    def search(self, query, page=1, page_size=20, language=None, dataset=None, fact_id=None, highlight=True):
+        return self.get(
+            '/search/', q=query, page=page, page_size=page_size, language=language,
+            dataset=dataset, fact_id=fact_id, highlight=None if highlight else '0'
+        )
+
+    def snapshots(self, dataset):
+        return self.get(f'/datasets/{quote(dataset, safe="")}/snapshots/')['snapshots']
+
+    def snapshot_manifest(self, dataset, version='latest'):
+        return self.request(
+            'GET', f'/datasets/{quote(dataset, safe="")}/snapshots/{quote(version, safe="")}/', use_cache=False
+        )
+
+    def releases(self, dataset):
+        return self.get(f'/datasets/{quote(dataset, safe="")}/releases/')['releases']
+
+    def release_manifest(self, dataset, version='latest'):
+        """{'version', 'facts': {fact_id: hash}, ...} of a release"""
+        return self.get(f'/datasets/{quote(dataset, safe="")}/releases/{quote(str(version), safe="")}/')
+
+    def release_delta(self, dataset, since, version='latest'):
+        """Facts added, changed ({fact_id: hash}) and removed since a release"""
+        return self.get(
+            f'/datasets/{quote(dataset, safe="")}/releases/{quote(str(version), safe="")}/delta/', since=since
+        )
+
+    # Iterators over whole datasets
+
+    def iter_questions(self, dataset, fact_ids=None, prefix=None, limit=None):
+        """Yield {'fact_id', 'questions', 'count'} for every fact of the
+        dataset (or the given fact_ids / prefix), using the bulk endpoint"""
+        if prefix:
+            batches = [None]
+        else:
+            if fact_ids is None:
+                fact_ids = [fact['fact_id'] for fact in self.facts(dataset)]
+            fact_ids = list(fact_ids)
+            batches = [fact_ids[start:start + MAX_FACT_IDS] for start in range(0, len(fact_ids), MAX_FACT_IDS)]
+
+        for batch in batches:
+            after = None
+            while True:
+                page = self.questions_bulk(dataset, fact_ids=batch, prefix=prefix, after=after, limit=limit)
+                facts = page['facts']
+                if page.get('partial'):
+                    # A fact too large for the bulk endpoint: read it whole
+                    fact = facts[-1]
+                    questions = self.questions(dataset, fact['fact_id'])
+                    facts[-1] = {**fact, 'questions': questions, 'count': len(questions)}
+                yield from facts
+                if not page['truncated']:
+                    break
+                after = page['next_after']
+
+    def iter_evidence(self, dataset, fact_ids=None, fields=None, include_html=False, collapse_duplicates=False):
+        """Yield (fact_id, evidence bundle for all its fetchable questions),
+        fetched concurrently"""
+        if fact_ids is None:
+            fact_ids = (fact['fact_id'] for fact in self.facts(dataset))
+        fetch = lambda fact_id: self.evidence(  # noqa: E731
+            dataset, fact_id, fields=fields, include_html=include_html, collapse_duplicates=collapse_duplicates
+        )
+        for fact_id, future in self._map(fetch, fact_ids):
+            yield fact_id, future.result()
+
+    def map_serp_content(self, urls, fields=None):
+        """Yield (url, payload or the APIError raised for it) for each URL,
+        in input order, fetched concurrently"""
+        for url, future in self._map(lambda url: self.serp_content(url, fields=fields), urls):
+            try:
+                yield url, future.result()
+            except APIError as e:
+                yield url, e
+
+    def iter_search(self, query, page_size=100, **filters):
+        """Yield every search result, following pages until the last one"""
+        page = 1
+        while True:
+            payload = self.search(query, page=page, page_size=page_size, **filters)
+            yield from payload['results']
+            if not payload['has_next']:
+                break
+            page += 1
+
+    def download_snapshot(self, dataset, directory, version='latest'):
+        """Download a snapshot into directory/<dataset>/<version>/ and return
+        that path; files already present with the right checksum are kept"""
+        manifest = self.snapshot_manifest(dataset, version)
+        target = os.path.join(directory, dataset, manifest['version'])
+        for table in manifest['tables'].values():
+            for entry in table['files']:
+                path = os.path.join(target, *entry['name'].split('/'))
+                if os.path.exists(path) and _sha256(path) == entry['sha256']:
+                    continue
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self._download(entry['url'], path, entry['sha256'])
+
+        manifest.pop('success', None)
+        with open(os.path.join(target, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        return target
+
+    def _download(self, url, path, sha256):
+        for attempt in range(self.max_retries + 1):
+            response = self.pool.request('GET', url, headers={'X-API-Key': self.api_key}, stream=True)
+            if response.status in RETRY_STATUSES and attempt < self.max_retries:
+                response.read()
+                self._backoff(attempt, response.headers.get('Retry-After'))
+                continue
+            if response.status != 200:
+                raise APIError(response.status, response.read().decode('utf-8', 'replace'), url)
+
+            digest = hashlib.sha256()
+            tmp_path = f'{path}.part'
+            with open(tmp_path, 'wb') as f:
+                for chunk in iter(lambda: response.read(1024 * 1024), b''):
+                    digest.update(chunk)
+                    f.write(chunk)
+            if digest.hexdigest() != sha256:
+                os.unlink(tmp_path)
+                raise APIError(response.status, 'Checksum mismatch', url)
+            os.replace(tmp_path, path)
+            return
+
+
+def _html_option(include_html):
+    """include_html query parameter value (None for the server default)"""
+    if include_html == 'structured':
+        return include_html
+    return None if include_html else '0'
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
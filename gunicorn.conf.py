@@ -0,0 +1,34 @@
+"""
+Gunicorn hooks, picked up automatically when gunicorn starts in this
+directory. Command-line options (bind, workers, timeout) still apply.
+
+Set WARM_CACHE_DATASETS to a comma-separated list of dataset names (or "all")
+to run `manage.py warm_cache` in the background once the server is ready, so
+the first requests after a deploy do not hit a cold database.
+WARM_CACHE_BUDGET overrides the command's --budget.
+"""
+
+import os
+import subprocess
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def when_ready(server):
+    datasets = os.environ.get('WARM_CACHE_DATASETS', '').strip()
+    if not datasets:
+        return
+
+    command = [sys.executable, os.path.join(BASE_DIR, 'manage.py'), 'warm_cache']
+    if datasets != 'all':
+        for name in datasets.split(','):
+            if name.strip():
+                command += ['--dataset', name.strip()]
+    if os.environ.get('WARM_CACHE_BUDGET'):
+        command += ['--budget', os.environ['WARM_CACHE_BUDGET']]
+
+    # A separate process, so workers start serving right away and no
+    # database connection is opened in the arbiter before it forks them
+    server.log.info('Warming caches: %s', ' '.join(command[1:]))
+    subprocess.Popen(command, cwd=BASE_DIR)
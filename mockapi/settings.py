@@ -49,6 +49,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'rest_framework',
     'corsheaders',
@@ -59,6 +60,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'api.ratelimit.RateLimitMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -144,6 +147,43 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# Set by the embedded profile (mockapi.settings_embedded): the database is a
+# read-only file, so API key usage and scrape counts are not recorded
+READ_ONLY_DATA = False
+
+# Columnar dataset snapshots written by `manage.py snapshot_dataset`
+SNAPSHOT_ROOT = env('SNAPSHOT_ROOT', default=str(BASE_DIR / 'snapshots'))
+
+# Files written by export jobs (`manage.py run_jobs`)
+EXPORT_ROOT = env('EXPORT_ROOT', default=str(BASE_DIR / 'exports'))
+
+# Segment files holding the bodies of cold documents (api.coldstore), moved
+# there by `manage.py tier_documents`; a segment is closed at this size
+COLD_STORE_ROOT = env('COLD_STORE_ROOT', default=str(BASE_DIR / 'coldstore'))
+COLD_SEGMENT_SIZE = env.int('COLD_SEGMENT_SIZE', default=1024 ** 3)
+
+# Render the question page JSON in Postgres (api.question_page) instead of
+# building it from model instances
+QUESTION_PAGE_JSON_IN_DB = env.bool('QUESTION_PAGE_JSON_IN_DB', default=True)
+
+# Identical concurrent read requests share one rendering (api.coalesce); with
+# COALESCE_ACROSS_WORKERS the workers of a host also wait for each other, which
+# is what coalesces requests under gunicorn's single-threaded workers
+COALESCE_REQUESTS = env.bool('COALESCE_REQUESTS', default=True)
+COALESCE_ACROSS_WORKERS = env.bool('COALESCE_ACROSS_WORKERS', default=False)
+# Seconds a request waits for another one's rendering before doing it itself
+COALESCE_TIMEOUT = env.float('COALESCE_TIMEOUT', default=10.0)
+
+# Seconds a worker keeps its catalog of dataset names and fact ids (api.catalog)
+# when no change was signalled on this host
+CATALOG_TTL = env.float('CATALOG_TTL', default=60.0)
+
+# Bytes of whole SERP documents each worker keeps in memory (api.serp_cache;
+# 0 disables it), and seconds before a cached document is read again
+SERP_CACHE_BYTES = env.int('SERP_CACHE_BYTES', default=64 * 1024 * 1024)
+SERP_CACHE_TTL = env.float('SERP_CACHE_TTL', default=300.0)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -151,3 +191,16 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True
+
+# Per-API-key rate limiting, off unless enabled. RATE (requests/second, 0 for
+# unlimited), BURST and MAX_IN_FLIGHT (0 for unlimited) are defaults that can
+# be overridden per key in the admin. The shared memory
+# backend coordinates the workers of one host; use api.ratelimit.CacheBackend
+# with a networked cache (OPTIONS: {'alias': ...}) when running several hosts.
+RATE_LIMIT = {
+    'BACKEND': env('RATE_LIMIT_BACKEND', default='api.ratelimit.SharedMemoryBackend'),
+    'OPTIONS': {},
+    'RATE': env.float('RATE_LIMIT_RATE', default=0.0),
+    'BURST': env.int('RATE_LIMIT_BURST', default=20),
+    'MAX_IN_FLIGHT': env.int('RATE_LIMIT_MAX_IN_FLIGHT', default=0),
+}
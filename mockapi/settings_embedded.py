@@ -0,0 +1,27 @@
+"""
+Embedded profile: serve the read endpoints from a single SQLite file built by
+`python manage.py build_embedded_db`, without PostgreSQL.
+
+    DJANGO_SETTINGS_MODULE=mockapi.settings_embedded EMBEDDED_DB=mockapi.sqlite3 \
+        gunicorn mockapi.wsgi:application
+
+The file is opened read-only and immutable, so any number of workers can
+share it without locking. Creating API keys, admin edits and usage tracking
+are not available.
+"""
+
+from pathlib import Path
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, env
+
+EMBEDDED_DB = Path(env('EMBEDDED_DB', default=str(BASE_DIR / 'mockapi.sqlite3'))).resolve()
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f'{EMBEDDED_DB.as_uri()}?mode=ro&immutable=1',
+    }
+}
+
+READ_ONLY_DATA = True